@@ -3,10 +3,11 @@ from aiohttp import ClientSession
 from agents.planner import PlannerAgent
 from agents.knowledge import KnowledgeAgent
 from agents.executor import ExecutorAgent
-from memory.episodic_memory import EpisodicMemory, Session
+from memory.episodic_memory import create_episodic_memory, Session, close_shared_connection_pools, task_category
 from memory.semantic_memory import SemanticMemory, KnowledgeEntry
 from memory.procedural_memory import ProceduralMemory, Workflow, WorkflowStep
-from router.model_router import ModelRouter, ModelConfig, TaskConfig
+from memory.write_behind import WriteBehindBuffer
+from router.model_router import get_shared_router, close_shared_routers, ModelConfig, TaskConfig
 import logging
 import asyncio
 from datetime import datetime
@@ -26,18 +27,21 @@ class TaskState:
     result: Optional[Dict[str, Any]] = None
     error: Optional[str] = None
 
+# Task statuses after which a session's full record is written
+TERMINAL_STATUSES = ("completed", "failed")
+
 class CoordinatorAgent:
     """Coordinates interactions between different agent types and manages task flow"""
     
-    def __init__(self):
+    def __init__(self, append_only_sessions: bool = True):
         """Initialize coordinator with agents and memory systems"""
         # Initialize memory systems
-        self.episodic_memory = EpisodicMemory()
+        self.episodic_memory = create_episodic_memory()
         self.semantic_memory = SemanticMemory()
         self.procedural_memory = ProceduralMemory()
         
-        # Initialize model router
-        self.model_router = ModelRouter()
+        # Shared with the other agents in this process
+        self.model_router = get_shared_router()
         self._setup_model_routing()
         
         # Initialize agents
@@ -50,6 +54,22 @@ class CoordinatorAgent:
         self.task_lock = asyncio.Lock()
         self.initialized = False
         
+        # Session persistence: append deltas to an event stream instead of rewriting the session
+        self.append_only_sessions = append_only_sessions
+        self._persisted_states: Dict[str, Dict[str, Any]] = {}
+        
+        # Batched, coalesced persistence so requests don't wait on three databases
+        self.write_buffer = WriteBehindBuffer()
+        self.write_buffer.register_sink("episodic", self.episodic_memory.store_sessions)
+        self.write_buffer.register_sink(
+            "procedural",
+            lambda workflows: asyncio.to_thread(self.procedural_memory.record_workflows, workflows)
+        )
+        self.write_buffer.register_sink(
+            "semantic",
+            lambda entries: asyncio.to_thread(self.semantic_memory.batch_store_knowledge, entries)
+        )
+        
         logging.info("Coordinator agent initialized successfully")
 
     def _setup_model_routing(self):
@@ -58,9 +78,7 @@ class CoordinatorAgent:
         planning_model = ModelConfig(
             model_name="gpt-4",
             provider="openai",
-            api_key="your-api-key",
-            temperature=0.7,
-            parameters={"top_p": 0.9}
+            api_key="your-api-key"
         )
         self.model_router.add_model(planning_model)
         
@@ -69,7 +87,8 @@ class CoordinatorAgent:
             task_type="planning",
             required_capabilities=["reasoning", "planning"],
             priority_models=["gpt-4"],
-            fallback_models=["gpt-3.5-turbo"]
+            fallback_models=["gpt-3.5-turbo"],
+            parameters={"temperature": 0.7, "top_p": 0.9}
         )
         self.model_router.add_task_config(planning_task)
 
@@ -77,22 +96,49 @@ class CoordinatorAgent:
         """Initialize async components after event loop is running"""
         if not self.initialized:
             await self.executor.start(num_workers=3)
+            self.write_buffer.start()
+            # Maintains session rollups and, when configured, retention
+            self.episodic_memory.start_maintenance()
             self.initialized = True
 
+    async def _record_transition(self, task_id: str, task_state: TaskState):
+        """Append the task fields changed since the last write to the session's event stream"""
+        if not self.append_only_sessions:
+            return
+            
+        snapshot = asdict(task_state)
+        previous = self._persisted_states.get(task_id, {})
+        changes = {
+            field: value for field, value in snapshot.items()
+            if field not in previous or previous[field] != value
+        }
+        if changes:
+            await self.episodic_memory.append_session_event(task_id, changes, task_state.updated_at)
+        self._persisted_states[task_id] = snapshot
+
     async def _store_session(self, task_id: str, task_state: TaskState):
-        """Store task session in episodic memory"""
+        """Queue the task session for episodic memory"""
+        if self.append_only_sessions:
+            # Intermediate states live in the event stream; only the final record is indexed
+            await self._record_transition(task_id, task_state)
+            if task_state.status not in TERMINAL_STATUSES:
+                return
+            self._persisted_states.pop(task_id, None)
+            
+        # The task is the user's free-text request; sessions are indexed by its category
+        task = (task_state.plan or {}).get("task", "")
         session = Session(
             session_id=task_id,
             timestamp=datetime.utcnow().isoformat(),
-            context={"task_type": task_state.status},
+            context={"task_type": task_category(task), "task": task},
             actions=[asdict(task_state)],
             outcome=task_state.result or {},
-            metadata={"error": task_state.error} if task_state.error else {}
+            metadata={"status": task_state.status, "error": task_state.error}
         )
-        await asyncio.to_thread(self.episodic_memory.store_session, session)
+        await self.write_buffer.submit("episodic", task_id, session)
 
     async def _store_workflow(self, task_id: str, task_state: TaskState):
-        """Store task workflow in procedural memory"""
+        """Queue the task workflow for procedural memory"""
         if not task_state.plan:
             return
             
@@ -112,10 +158,10 @@ class CoordinatorAgent:
             steps=steps,
             metadata={"status": task_state.status}
         )
-        await asyncio.to_thread(self.procedural_memory.record_workflow, workflow)
+        await self.write_buffer.submit("procedural", task_id, workflow)
 
     async def _store_knowledge(self, task_state: TaskState):
-        """Store task knowledge in semantic memory"""
+        """Queue the task knowledge for semantic memory"""
         if not task_state.knowledge:
             return
             
@@ -123,7 +169,7 @@ class CoordinatorAgent:
             content=json.dumps(task_state.knowledge),
             metadata={"task_id": task_state.task_id}
         )
-        await asyncio.to_thread(self.semantic_memory.store_knowledge, entry)
+        await self.write_buffer.submit("semantic", task_state.task_id, entry)
 
     async def handle_request(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """Handle incoming task requests"""
@@ -149,6 +195,7 @@ class CoordinatorAgent:
             # Update task status
             task_state.status = "planning"
             task_state.updated_at = datetime.utcnow().isoformat()
+            await self._record_transition(task_id, task_state)
             
             # Create execution plan
             plan = await self.planner.create_plan(request_data)
@@ -161,7 +208,7 @@ class CoordinatorAgent:
             knowledge = await self.knowledge.retrieve_knowledge(plan)
             task_state.knowledge = knowledge
             
-            # Store information in memory systems
+            # Queue information for the memory systems
             await asyncio.gather(
                 self._store_session(task_id, task_state),
                 self._store_workflow(task_id, task_state),
@@ -171,6 +218,7 @@ class CoordinatorAgent:
             # Execute plan
             task_state.status = "executing"
             task_state.updated_at = datetime.utcnow().isoformat()
+            await self._record_transition(task_id, task_state)
             
             await self.executor.add_task(plan, knowledge)
             result = await self.executor.execute_plan(plan, knowledge)
@@ -218,10 +266,25 @@ class CoordinatorAgent:
         return None
 
     async def close(self):
-        """Shutdown coordinator and cleanup resources"""
+        """Shutdown this coordinator and release the resources it owns.
+
+        The shared router, HTTP client and Redis pools may still be in use by
+        other agents; the application closes them with close_shared_resources().
+        """
         if self.initialized:
+            # Flush buffered memory writes before the backends go away
+            try:
+                await self.write_buffer.close()
+            except Exception as e:
+                logging.error(f"Failed to persist buffered memory writes: {e}")
             await self.executor.close()
+            await self.episodic_memory.stop_maintenance()
+            await self.episodic_memory.close()
             self.semantic_memory.clear_cache()
-            await self.model_router.shutdown()
             self.initialized = False
             logging.info("Coordinator shutdown complete")
+
+async def close_shared_resources():
+    """Close the process-wide router, HTTP client and Redis pools; call once at application shutdown"""
+    await close_shared_routers()
+    await close_shared_connection_pools()
@@ -5,7 +5,7 @@ import logging
 from dataclasses import dataclass
 from datetime import datetime
 import json
-from memory.episodic_memory import EpisodicMemory, Session
+from memory.episodic_memory import create_episodic_memory, Session
 from memory.semantic_memory import SemanticMemory, KnowledgeEntry
 from memory.procedural_memory import ProceduralMemory
 import traceback
@@ -51,7 +51,7 @@ class ExecutorAgent:
         self.session = None
         
         # Initialize memory systems
-        self.episodic_memory = EpisodicMemory()
+        self.episodic_memory = create_episodic_memory()
         self.semantic_memory = SemanticMemory()
         self.procedural_memory = ProceduralMemory()
         
@@ -84,7 +84,7 @@ class ExecutorAgent:
                     "error": task.error
                 }
             )
-            await asyncio.to_thread(self.episodic_memory.store_session, session)
+            await self.episodic_memory.store_session(session)
             
             # Store execution knowledge in semantic memory
             if task.status == TaskStatus.COMPLETED and task.result:
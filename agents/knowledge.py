@@ -1,8 +1,8 @@
 from typing import Dict, Any, List, Optional, Union
-from memory.episodic_memory import EpisodicMemory
+from memory.episodic_memory import create_episodic_memory, task_category
 from memory.semantic_memory import SemanticMemory
 from memory.procedural_memory import ProceduralMemory
-from router.model_router import ModelRouter, ModelConfig, TaskConfig
+from router.model_router import get_shared_router, ModelConfig, TaskConfig
 import logging
 import asyncio
 from datetime import datetime, timedelta
@@ -12,19 +12,20 @@ import json
 class KnowledgeAgent:
     """Agent responsible for knowledge retrieval and synthesis across memory systems"""
     
-    def __init__(self, cache_size: int = 1000, cache_ttl: int = 3600):
+    def __init__(self, cache_size: int = 1000, cache_ttl: int = 3600, rollup_examples: int = 3):
         """Initialize knowledge agent with memory systems"""
         # Initialize memory systems
-        self.episodic_memory = EpisodicMemory()
+        self.episodic_memory = create_episodic_memory()
         self.semantic_memory = SemanticMemory()
         self.procedural_memory = ProceduralMemory()
         
-        # Initialize model router
-        self.model_router = ModelRouter()
+        # Shared with the other agents in this process
+        self.model_router = get_shared_router()
         self._setup_model_routing()
         
         # Configure caching
         self.cache_ttl = cache_ttl
+        self.rollup_examples = rollup_examples
         self.knowledge_cache = lru_cache(maxsize=cache_size)(self._retrieve_knowledge_uncached)
         self.cache_timestamps: Dict[str, datetime] = {}
         
@@ -36,18 +37,30 @@ class KnowledgeAgent:
         knowledge_model = ModelConfig(
             model_name="gpt-4",
             provider="openai",
-            api_key="your-api-key",
-            temperature=0.3,  # Lower temperature for more focused knowledge retrieval
-            parameters={"top_p": 0.1}
+            api_key="your-api-key"
         )
         self.model_router.add_model(knowledge_model)
+        self.model_router.add_model(ModelConfig(
+            model_name="gpt-3.5-turbo",
+            provider="openai",
+            api_key="your-api-key",
+            capabilities=["knowledge_base", "reasoning"]
+        ))
         
         # Add task configurations
         knowledge_task = TaskConfig(
             task_type="knowledge_synthesis",
             required_capabilities=["knowledge_base", "reasoning"],
             priority_models=["gpt-4"],
-            fallback_models=["gpt-3.5-turbo"]
+            fallback_models=["gpt-3.5-turbo"],
+            # Lower temperature for more focused knowledge retrieval
+            parameters={"temperature": 0.3, "top_p": 0.1},
+            # Past sessions are the bulkiest and least essential context
+            context_priority=["task", "requirements", "procedural_knowledge",
+                              "semantic_knowledge", "episodic_knowledge"],
+            # Most syntheses do not need gpt-4; prefer the cheapest model within the SLO
+            adaptive_routing=True,
+            latency_slo=10.0
         )
         self.model_router.add_task_config(knowledge_task)
 
@@ -74,14 +87,27 @@ class KnowledgeAgent:
             else:
                 start_time = end_time - timedelta(hours=24)  # Default to 24h
                 
-            # Get sessions within timeframe
-            sessions = await asyncio.to_thread(
-                self.episodic_memory.get_sessions_by_timerange,
+            # Sessions are indexed by task category, not the request's exact text
+            task_type = task_category(plan["task"]) if plan.get("task") else None
+            
+            # Prefer precomputed hourly summaries over raw sessions
+            rollups = await self.episodic_memory.get_rollups(
+                start_time.isoformat(),
+                end_time.isoformat(),
+                task_type=task_type
+            )
+            
+            # Get sessions of the same task type within timeframe, most recent first;
+            # with rollups available only a few are needed as concrete examples
+            sessions = await self.episodic_memory.query_sessions(
                 start_time.isoformat(),
-                end_time.isoformat()
+                end_time.isoformat(),
+                task_type=task_type,
+                limit=plan.get("episode_limit", self.rollup_examples if rollups else None),
+                newest_first=True
             )
             
-            return [
+            return rollups + [
                 {
                     "session_id": session.session_id,
                     "context": session.context,
@@ -162,11 +188,11 @@ class KnowledgeAgent:
             }
             
             # Use model router to synthesize knowledge
-            prompt = json.dumps(context, indent=2)
             response = await self.model_router.route_task(
                 "knowledge_synthesis",
-                prompt,
-                parameters={"max_tokens": 1000}
+                "",
+                parameters={"max_tokens": 1000},
+                context=context
             )
             
             if not response:
@@ -1,8 +1,8 @@
 from typing import Dict, Any, List, Optional
-from memory.episodic_memory import EpisodicMemory
+from memory.episodic_memory import create_episodic_memory
 from memory.semantic_memory import SemanticMemory
 from memory.procedural_memory import ProceduralMemory, Workflow, WorkflowStep
-from router.model_router import ModelRouter, ModelConfig, TaskConfig
+from router.model_router import get_shared_router, ModelConfig, TaskConfig
 import logging
 import asyncio
 from datetime import datetime
@@ -38,12 +38,12 @@ class PlannerAgent:
     def __init__(self):
         """Initialize planner with required components"""
         # Initialize memory systems
-        self.episodic_memory = EpisodicMemory()
+        self.episodic_memory = create_episodic_memory()
         self.semantic_memory = SemanticMemory()
         self.procedural_memory = ProceduralMemory()
         
-        # Initialize model router
-        self.model_router = ModelRouter()
+        # Shared with the other agents in this process
+        self.model_router = get_shared_router()
         self._setup_model_routing()
         
         logging.info("Planner agent initialized successfully")
@@ -54,9 +54,7 @@ class PlannerAgent:
         planning_model = ModelConfig(
             model_name="gpt-4",
             provider="openai",
-            api_key="your-api-key",
-            temperature=0.7,
-            parameters={"top_p": 0.9}
+            api_key="your-api-key"
         )
         self.model_router.add_model(planning_model)
         
@@ -65,7 +63,10 @@ class PlannerAgent:
             task_type="task_planning",
             required_capabilities=["planning", "reasoning"],
             priority_models=["gpt-4"],
-            fallback_models=["gpt-3.5-turbo"]
+            fallback_models=["gpt-3.5-turbo"],
+            parameters={"temperature": 0.7, "top_p": 0.9},
+            context_priority=["task", "requirements", "constraints", "analysis",
+                              "similar_workflows", "context"]
         )
         self.model_router.add_task_config(planning_task)
 
@@ -81,11 +82,11 @@ class PlannerAgent:
             }
             
             # Use model router for task analysis
-            prompt = f"Analyze task requirements and constraints:\n{json.dumps(context, indent=2)}"
             response = await self.model_router.route_task(
                 "task_planning",
-                prompt,
-                parameters={"max_tokens": 1000}
+                "Analyze task requirements and constraints:",
+                parameters={"max_tokens": 1000},
+                context=context
             )
             
             if not response:
@@ -118,11 +119,11 @@ class PlannerAgent:
             }
             
             # Use model router to generate steps
-            prompt = f"Generate plan steps based on analysis:\n{json.dumps(context, indent=2)}"
             response = await self.model_router.route_task(
                 "task_planning",
-                prompt,
-                parameters={"max_tokens": 2000}
+                "Generate plan steps based on analysis:",
+                parameters={"max_tokens": 2000},
+                context=context
             )
             
             if not response:
@@ -0,0 +1,482 @@
+from typing import Dict, Any, Optional, List, Tuple, AsyncIterator
+import sqlite3
+import asyncio
+import time
+import logging
+from datetime import datetime
+from memory.episodic_memory import (
+    Session, RetentionPolicy, _EpisodicMemoryBase, _AsyncMaintenanceMixin, task_category
+)
+from memory.session_codec import SessionCodec
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    task_type TEXT,
+    status TEXT,
+    has_error INTEGER NOT NULL DEFAULT 0,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_ts ON sessions (ts, session_id);
+CREATE INDEX IF NOT EXISTS sessions_task_type_ts ON sessions (task_type, ts);
+CREATE INDEX IF NOT EXISTS sessions_status_ts ON sessions (status, ts);
+CREATE INDEX IF NOT EXISTS sessions_error_ts ON sessions (has_error, ts);
+CREATE TABLE IF NOT EXISTS session_events (
+    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    changes BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS session_events_session ON session_events (session_id, event_id);
+CREATE TABLE IF NOT EXISTS session_state (
+    session_id TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value BLOB NOT NULL,
+    PRIMARY KEY (session_id, field)
+);
+CREATE TABLE IF NOT EXISTS session_rollups (
+    hour TEXT NOT NULL,
+    hour_ts REAL NOT NULL,
+    task_type TEXT NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (hour, task_type)
+);
+CREATE INDEX IF NOT EXISTS session_rollups_hour_ts ON session_rollups (hour_ts);
+CREATE TABLE IF NOT EXISTS episodic_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+class EmbeddedEpisodicMemory(_AsyncMaintenanceMixin, _EpisodicMemoryBase):
+    """In-process SQLite (WAL mode) episodic memory with the AsyncEpisodicMemory interface.
+
+    Intended for single-node deployments and CI: there is no server to reach,
+    and queries run inline on the event loop thread since they are local and short.
+    """
+
+    def __init__(self, path: str = "./episodic_memory.db", fetch_chunk_size: int = 500,
+                 codec: Optional[SessionCodec] = None,
+                 retention: Optional[RetentionPolicy] = None):
+        """Open (or create) the SQLite database"""
+        self.path = path
+        self.fetch_chunk_size = max(1, fetch_chunk_size)
+        self.codec = codec or SessionCodec()
+        self._configure_retention(retention)
+        try:
+            self.db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(_SCHEMA)
+            logging.info(f"Opened embedded episodic memory at {path}")
+        except sqlite3.Error as e:
+            logging.error(f"Failed to open embedded episodic memory: {e}")
+            raise
+
+    def _session_row(self, session: Session) -> Tuple[Any, ...]:
+        """Column values for a session row"""
+        return (
+            session.session_id,
+            self._epoch(session.timestamp),
+            None if session.context.get("task_type") is None else task_category(session.context["task_type"]),
+            None if session.metadata.get("status") is None else str(session.metadata["status"]),
+            int(bool(session.metadata.get("error"))),
+            self._serialize_session(session)
+        )
+
+    def _where(self, start_time: str, end_time: str, task_type: Optional[str] = None,
+               status: Optional[str] = None,
+               has_error: Optional[bool] = None) -> Tuple[str, List[Any]]:
+        """WHERE clause and parameters for a filtered time range"""
+        clauses = ["ts >= ?", "ts <= ?"]
+        params: List[Any] = list(self._timerange_scores(start_time, end_time))
+        if task_type is not None:
+            clauses.append("task_type = ?")
+            params.append(task_category(task_type))
+        if status is not None:
+            clauses.append("status = ?")
+            params.append(str(status))
+        if has_error is not None:
+            clauses.append("has_error = ?")
+            params.append(int(has_error))
+        return " AND ".join(clauses), params
+
+    def _select_sessions(self, where: str, params: List[Any], offset: int,
+                         limit: Optional[int], newest_first: bool) -> List[Session]:
+        """Run a paginated session query in time order"""
+        order = "DESC" if newest_first else "ASC"
+        rows = self.db.execute(
+            f"SELECT body FROM sessions WHERE {where} "
+            f"ORDER BY ts {order}, session_id {order} LIMIT ? OFFSET ?",
+            [*params, limit if limit is not None else -1, offset]
+        ).fetchall()
+        return [session for (body,) in rows if (session := self._deserialize_session(body))]
+
+    def _count_sessions(self, where: str, params: List[Any]) -> int:
+        return self.db.execute(f"SELECT COUNT(*) FROM sessions WHERE {where}", params).fetchone()[0]
+
+    async def ping(self) -> bool:
+        """Check that the database is usable"""
+        try:
+            self.db.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error as e:
+            logging.error(f"Embedded episodic memory unavailable: {e}")
+            return False
+
+    async def store_session(self, session: Session) -> bool:
+        """Store or replace a session"""
+        return await self.store_sessions([session])
+
+    async def store_sessions(self, sessions: List[Session]) -> bool:
+        """Store or replace several sessions in one transaction"""
+        try:
+            rows = [self._session_row(session) for session in sessions]
+            with self.db:
+                self.db.execute("BEGIN")
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO sessions "
+                    "(session_id, ts, task_type, status, has_error, body) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            logging.info(f"Successfully stored {len(sessions)} sessions")
+            return True
+
+        except Exception as e:
+            logging.error(f"Failed to store sessions: {e}")
+            return False
+
+    async def retrieve_session(self, session_id: str) -> Optional[Session]:
+        """Retrieve a specific session by ID"""
+        try:
+            row = self.db.execute("SELECT body FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            return self._deserialize_session(row[0]) if row else None
+
+        except Exception as e:
+            logging.error(f"Failed to retrieve session {session_id}: {e}")
+            return None
+
+    async def retrieve_sessions(self, session_ids: List[str]) -> List[Session]:
+        """Retrieve multiple sessions in chunks, preserving order"""
+        sessions = []
+        for chunk in self._chunk_ids(session_ids):
+            try:
+                placeholders = ",".join("?" * len(chunk))
+                bodies = dict(self.db.execute(
+                    f"SELECT session_id, body FROM sessions WHERE session_id IN ({placeholders})", chunk
+                ).fetchall())
+            except Exception as e:
+                logging.error(f"Failed to retrieve session chunk: {e}")
+                continue
+            for sid in chunk:
+                if (body := bodies.get(sid)) and (session := self._deserialize_session(body)):
+                    sessions.append(session)
+        return sessions
+
+    async def get_session_ids_by_timerange(self, start_time: str, end_time: str,
+                                           offset: int = 0, limit: Optional[int] = None,
+                                           newest_first: bool = False) -> List[str]:
+        """Get session IDs within a time range, with optional pagination"""
+        try:
+            where, params = self._where(start_time, end_time)
+            order = "DESC" if newest_first else "ASC"
+            rows = self.db.execute(
+                f"SELECT session_id FROM sessions WHERE {where} "
+                f"ORDER BY ts {order}, session_id {order} LIMIT ? OFFSET ?",
+                [*params, limit if limit is not None else -1, offset]
+            ).fetchall()
+            return [sid for (sid,) in rows]
+        except Exception as e:
+            logging.error(f"Failed to get session IDs by timerange: {e}")
+            return []
+
+    async def get_sessions_by_timerange(self, start_time: str, end_time: str,
+                                        offset: int = 0, limit: Optional[int] = None,
+                                        newest_first: bool = False) -> List[Session]:
+        """Retrieve sessions within a specific time range, including archived ones"""
+        return await self.query_sessions(
+            start_time, end_time, offset=offset, limit=limit, newest_first=newest_first
+        )
+
+    async def iter_sessions(self, start_time: str, end_time: str,
+                            batch: Optional[int] = None) -> AsyncIterator[Session]:
+        """Stream sessions in a time range oldest first, one batch in memory at a time"""
+        batch = max(1, batch or self.fetch_chunk_size)
+        archived = self._archive_batches(start_time, end_time, batch)
+        while True:
+            try:
+                sessions = await asyncio.to_thread(next, archived, None)
+            except Exception as e:
+                logging.error(f"Failed to stream archived sessions: {e}")
+                break
+            if sessions is None:
+                break
+            for session in sessions:
+                yield session
+
+        # Keyset pagination on (ts, session_id) stays cheap however deep the scan goes
+        ts, end_ts = self._timerange_scores(start_time, end_time)
+        last_id = ""
+        while True:
+            try:
+                rows = self.db.execute(
+                    "SELECT ts, session_id, body FROM sessions "
+                    "WHERE (ts > ? OR (ts = ? AND session_id > ?)) AND ts <= ? "
+                    "ORDER BY ts, session_id LIMIT ?",
+                    (ts, ts, last_id, end_ts, batch)
+                ).fetchall()
+            except Exception as e:
+                logging.error(f"Failed to stream sessions by timerange: {e}")
+                return
+            if not rows:
+                return
+            ts, last_id = rows[-1][0], rows[-1][1]
+            for _, _, body in rows:
+                if session := self._deserialize_session(body):
+                    yield session
+            if len(rows) < batch:
+                return
+
+    async def query_sessions(self, start_time: str, end_time: str,
+                             task_type: Optional[str] = None, status: Optional[str] = None,
+                             has_error: Optional[bool] = None, offset: int = 0,
+                             limit: Optional[int] = None, newest_first: bool = False) -> List[Session]:
+        """Retrieve sessions in a time range matching task type, status and error filters"""
+        try:
+            where, params = self._where(start_time, end_time, task_type, status, has_error)
+            live_count = self._count_sessions(where, params) if self.archive and newest_first else 0
+            archive_page, offset, limit = await asyncio.to_thread(
+                self._archive_page, start_time, end_time, offset, limit, newest_first, live_count,
+                (task_type, status, has_error)
+            )
+
+            live = []
+            if limit is None or limit > 0:
+                live = self._select_sessions(where, params, offset, limit, newest_first)
+            return live + archive_page if newest_first else archive_page + live
+
+        except Exception as e:
+            logging.error(f"Failed to query sessions: {e}")
+            return []
+
+    async def append_session_event(self, session_id: str, changes: Dict[str, Any],
+                                   timestamp: Optional[str] = None) -> Optional[str]:
+        """Append changed fields to a session's event log and latest-state view"""
+        try:
+            timestamp = timestamp or datetime.utcnow().isoformat()
+            with self.db:
+                self.db.execute("BEGIN")
+                cursor = self.db.execute(
+                    "INSERT INTO session_events (session_id, timestamp, changes) VALUES (?, ?, ?)",
+                    (session_id, timestamp, self.codec.encode(changes))
+                )
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO session_state (session_id, field, value) VALUES (?, ?, ?)",
+                    [(session_id, field, self.codec.encode(value)) for field, value in changes.items()]
+                    + [(session_id, "_updated_at", timestamp.encode())]
+                )
+                # Keep the log bounded like the Redis stream's MAXLEN
+                self.db.execute(
+                    "DELETE FROM session_events WHERE session_id = ? AND event_id <= ?",
+                    (session_id, cursor.lastrowid - self.max_events_per_session)
+                )
+            return str(cursor.lastrowid)
+
+        except Exception as e:
+            logging.error(f"Failed to append event for session {session_id}: {e}")
+            return None
+
+    async def get_session_state(self, session_id: str) -> Dict[str, Any]:
+        """Get the latest state materialized from a session's events"""
+        try:
+            rows = self.db.execute(
+                "SELECT field, value FROM session_state WHERE session_id = ?", (session_id,)
+            ).fetchall()
+            return self._decode_fields(dict(rows))
+        except Exception as e:
+            logging.error(f"Failed to get state for session {session_id}: {e}")
+            return {}
+
+    async def get_session_events(self, session_id: str, start: str = "-",
+                                 end: str = "+") -> List[Dict[str, Any]]:
+        """Replay a session's state transitions in order"""
+        try:
+            clauses, params = ["session_id = ?"], [session_id]
+            if start != "-":
+                clauses.append("event_id >= ?")
+                params.append(int(start))
+            if end != "+":
+                clauses.append("event_id <= ?")
+                params.append(int(end))
+            rows = self.db.execute(
+                "SELECT event_id, timestamp, changes FROM session_events "
+                f"WHERE {' AND '.join(clauses)} ORDER BY event_id",
+                params
+            ).fetchall()
+            return [
+                {"event_id": str(event_id), "timestamp": timestamp, "changes": self.codec.decode(changes)}
+                for event_id, timestamp, changes in rows
+            ]
+        except Exception as e:
+            logging.error(f"Failed to get events for session {session_id}: {e}")
+            return []
+
+    def _delete_rows(self, session_ids: List[str]):
+        """Delete sessions and their events inside the current transaction"""
+        for chunk in self._chunk_ids(session_ids):
+            placeholders = ",".join("?" * len(chunk))
+            for table in ("sessions", "session_events", "session_state"):
+                self.db.execute(f"DELETE FROM {table} WHERE session_id IN ({placeholders})", chunk)
+
+    async def delete_session(self, session_id: str) -> bool:
+        """Delete a session and its events"""
+        try:
+            with self.db:
+                self.db.execute("BEGIN")
+                deleted = self.db.execute(
+                    "SELECT COUNT(*) FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                self._delete_rows([session_id])
+            if deleted:
+                logging.info(f"Successfully deleted session {session_id}")
+            return bool(deleted)
+
+        except Exception as e:
+            logging.error(f"Failed to delete session {session_id}: {e}")
+            return False
+
+    async def enforce_retention(self) -> int:
+        """Remove sessions beyond the retention policy, archiving them if configured"""
+        if not self.retention.enabled:
+            return 0
+        policy = self.retention
+        batch = max(1, policy.batch_size)
+        removed_total = 0
+        try:
+            while True:
+                victims = []
+                if policy.max_age_seconds is not None:
+                    victims = self.db.execute(
+                        "SELECT session_id, ts, body FROM sessions WHERE ts < ? "
+                        "ORDER BY ts, session_id LIMIT ?",
+                        (time.time() - policy.max_age_seconds, batch)
+                    ).fetchall()
+                if policy.max_sessions is not None and len(victims) < batch:
+                    total = self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+                    excess = min(total - len(victims) - policy.max_sessions, batch - len(victims))
+                    if excess > 0:
+                        victims += self.db.execute(
+                            "SELECT session_id, ts, body FROM sessions "
+                            "ORDER BY ts, session_id LIMIT ? OFFSET ?",
+                            (excess, len(victims))
+                        ).fetchall()
+                if not victims:
+                    break
+
+                # Archive first; a failed write raises before anything is deleted
+                if self.archive:
+                    records = self._expired_records([body for _, _, body in victims])
+                    await asyncio.to_thread(self.archive.append, records)
+
+                with self.db:
+                    self.db.execute("BEGIN IMMEDIATE")
+                    # Skip sessions re-stored since they were selected
+                    unchanged = [
+                        session_id for session_id, ts, _ in victims
+                        if self.db.execute(
+                            "SELECT 1 FROM sessions WHERE session_id = ? AND ts = ?", (session_id, ts)
+                        ).fetchone()
+                    ]
+                    self._delete_rows(unchanged)
+                removed_total += len(unchanged)
+                if len(victims) < batch:
+                    break
+
+            if removed_total:
+                logging.info(f"Retention removed {removed_total} episodic sessions")
+            return removed_total
+
+        except Exception as e:
+            logging.error(f"Failed to enforce retention: {e}")
+            return removed_total
+
+    async def clear_all(self) -> bool:
+        """Clear all embedded episodic memory data (use with caution)"""
+        try:
+            with self.db:
+                self.db.execute("BEGIN")
+                for table in ("sessions", "session_events", "session_state", "session_rollups", "episodic_meta"):
+                    self.db.execute(f"DELETE FROM {table}")
+            logging.info("Successfully cleared all episodic memory data")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to clear episodic memory: {e}")
+            return False
+
+    async def update_rollups(self) -> int:
+        """Recompute the hourly per-task-type rollups of recent sessions"""
+        try:
+            row = self.db.execute("SELECT value FROM episodic_meta WHERE key = 'rollup_watermark'").fetchone()
+            start_time, end_time = self._rollup_window(row[0] if row else None)
+            rollups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            async for session in self.iter_sessions(start_time, end_time):
+                self._add_to_rollup(rollups, session)
+
+            with self.db:
+                self.db.execute("BEGIN")
+                self.db.execute(
+                    "DELETE FROM session_rollups WHERE hour_ts >= ? AND hour_ts <= ?",
+                    self._timerange_scores(start_time, end_time)
+                )
+                self.db.executemany(
+                    "INSERT INTO session_rollups (hour, hour_ts, task_type, body) VALUES (?, ?, ?, ?)",
+                    [
+                        (hour, self._timerange_scores(hour, hour)[0], task_type,
+                         self.codec.encode(self._finish_rollup(rollup)))
+                        for (hour, task_type), rollup in rollups.items()
+                    ]
+                )
+                self.db.execute(
+                    "INSERT OR REPLACE INTO episodic_meta (key, value) VALUES ('rollup_watermark', ?)",
+                    (self._rollup_hour(end_time),)
+                )
+            return len(rollups)
+
+        except Exception as e:
+            logging.error(f"Failed to update session rollups: {e}")
+            return 0
+
+    async def get_rollups(self, start_time: str, end_time: str,
+                          task_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get precomputed hourly rollups overlapping a time range"""
+        try:
+            clauses = ["hour_ts >= ?", "hour_ts <= ?"]
+            params: List[Any] = list(self._timerange_scores(self._rollup_hour(start_time), end_time))
+            if task_type is not None:
+                clauses.append("task_type = ?")
+                params.append(task_category(task_type))
+            rows = self.db.execute(
+                f"SELECT body FROM session_rollups WHERE {' AND '.join(clauses)} ORDER BY hour_ts, task_type",
+                params
+            ).fetchall()
+            return [self.codec.decode(body) for (body,) in rows]
+
+        except Exception as e:
+            logging.error(f"Failed to get session rollups: {e}")
+            return []
+
+    async def get_total_sessions(self) -> int:
+        """Get total number of stored sessions"""
+        try:
+            return self.db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        except Exception as e:
+            logging.error(f"Failed to get total sessions count: {e}")
+            return 0
+
+    async def close(self):
+        """Close the database connection"""
+        try:
+            self.db.close()
+        except Exception as e:
+            logging.error(f"Error closing embedded episodic memory: {e}")
@@ -0,0 +1,187 @@
+from typing import Dict, List, Optional, Any, Callable
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import re
+import threading
+import logging
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # No cross-process locking (Windows); one writer per directory
+
+class CachedEmbeddingFunction:
+    """Embedding function wrapper that caches vectors by model name and content hash.
+
+    Vectors are appended to a float32 file per model and read back through
+    a memory map, so the cache survives restarts without loading it into
+    memory; an in-memory LRU holds the most recently used vectors. A
+    parallel file of 16-byte content hashes maps each row to its text.
+    Only texts missing from both tiers are passed to the wrapped function.
+
+    Several instances and processes may share a directory: appends hold an
+    exclusive file lock and take their row numbers from the files on disk,
+    and a lookup miss re-reads rows other writers appended.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], List[List[float]]], model_name: str,
+                 cache_dir: str, lru_size: int = 10000):
+        """Open (or create) the on-disk cache for model_name under cache_dir"""
+        self.embed = embed
+        self.model_name = model_name
+        self.lru_size = lru_size
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.keys_path = os.path.join(self.directory, "keys.bin")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self.lock_path = os.path.join(self.directory, "append.lock")
+
+        self._lock = threading.Lock()  # Called from SemanticMemory.ingest worker threads
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._rows: Dict[bytes, int] = {}
+        self._count = 0  # Rows on disk indexed so far
+        self._map: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._load()
+
+    def _load(self):
+        """Index the rows already on disk"""
+        self._refresh()
+        if self._count:
+            logging.info(f"Loaded {self._count} cached {self.model_name} embeddings from {self.directory}")
+
+    def _disk_rows(self) -> int:
+        """Complete rows on disk: a key is only written after its vector"""
+        try:
+            keys_size = os.path.getsize(self.keys_path)
+            vectors_size = os.path.getsize(self.vectors_path)
+        except FileNotFoundError:
+            return 0
+        return min(keys_size // 16, vectors_size // (4 * self.dim))
+
+    def _refresh(self) -> bool:
+        """Index rows appended since the last refresh, by this or any other writer"""
+        if self.dim is None:
+            if not os.path.exists(self.meta_path):
+                return False
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        rows = self._disk_rows()
+        if rows <= self._count:
+            return False
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._count * 16)
+            keys = f.read((rows - self._count) * 16)
+        for i in range(rows - self._count):
+            self._rows.setdefault(keys[i * 16:(i + 1) * 16], self._count + i)
+        self._count = rows
+        return True
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+    def _read(self, row: int) -> np.ndarray:
+        if self._map is None or row >= self._map.shape[0]:
+            # Remap to cover rows appended since the last mapping
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                  shape=(self._count, self.dim))
+        return np.array(self._map[row])
+
+    def _remember(self, key: bytes, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        if len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def _append(self, keys: List[bytes], vectors: np.ndarray):
+        """Persist new vectors, then their keys, so an indexed key always has its vector"""
+        with open(self.lock_path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # Released when the lock file is closed
+            self._refresh()  # Index what other writers appended since our last look
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                with open(self.meta_path + ".tmp", "w") as f:
+                    json.dump({"dim": self.dim, "model_name": self.model_name}, f)
+                os.replace(self.meta_path + ".tmp", self.meta_path)
+
+            fresh = [i for i, key in enumerate(keys) if key not in self._rows]
+            if not fresh:
+                return  # Another writer already cached them
+            keys, vectors = [keys[i] for i in fresh], vectors[fresh]
+
+            # Rows are numbered from the files, after cutting back any write torn by a crash
+            rows = self._count
+            try:
+                with open(self.vectors_path, "ab") as f:
+                    f.truncate(rows * 4 * self.dim)
+                    f.write(vectors.astype(np.float32).tobytes())
+                with open(self.keys_path, "ab") as f:
+                    f.truncate(rows * 16)
+                    f.write(b"".join(keys))
+            except Exception:
+                # Roll both files back so rows and keys stay aligned
+                for path, row_bytes in ((self.vectors_path, 4 * self.dim), (self.keys_path, 16)):
+                    with open(path, "ab") as f:
+                        f.truncate(rows * row_bytes)
+                raise
+            for i, key in enumerate(keys):
+                self._rows[key] = rows + i
+            self._count = rows + len(keys)
+
+    def _lookup(self, keys: List[bytes], results: List[Optional[np.ndarray]]):
+        """Fill unresolved results from the LRU, then the disk index"""
+        for i, key in enumerate(keys):
+            if results[i] is not None:
+                continue
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                results[i] = self._lru[key]
+                self.stats["memory_hits"] += 1
+            elif key in self._rows:
+                results[i] = self._read(self._rows[key])
+                self._remember(key, results[i])
+                self.stats["disk_hits"] += 1
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        """Embeddings for a list of texts, computing only the uncached ones"""
+        keys = [self._key(text) for text in input]
+        results: List[Optional[np.ndarray]] = [None] * len(input)
+        with self._lock:
+            self._lookup(keys, results)
+            if any(result is None for result in results) and self._refresh():
+                self._lookup(keys, results)  # Another writer may have cached them
+
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            computed = np.asarray(self.embed([input[i] for i in missing]), dtype=np.float32)
+            with self._lock:
+                new_keys, new_rows = [], []
+                for i, vector in zip(missing, computed):
+                    results[i] = vector
+                    self._remember(keys[i], vector)
+                    if keys[i] not in self._rows and keys[i] not in new_keys:
+                        new_keys.append(keys[i])
+                        new_rows.append(vector)
+                self.stats["misses"] += len(missing)
+                if new_keys:
+                    try:
+                        self._append(new_keys, np.stack(new_rows))
+                    except Exception as e:
+                        logging.error(f"Failed to persist embeddings to {self.directory}: {e}")
+        return [result.tolist() for result in results]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit counters by tier and the number of vectors on disk"""
+        lookups = sum(self.stats.values())
+        return {
+            **self.stats,
+            "hit_rate": (lookups - self.stats["misses"]) / lookups if lookups else 0.0,
+            "memory_entries": len(self._lru),
+            "disk_entries": len(self._rows)
+        }
@@ -1,9 +1,43 @@
-from typing import Dict, Any, Optional, List
-import json
+from typing import Dict, Any, Optional, List, Tuple, Iterator, AsyncIterator
+import os
+import re
+import time
+import uuid
+import asyncio
 import redis
-from datetime import datetime
+import redis.asyncio as aioredis
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from collections import Counter, deque
 import logging
 from dataclasses import dataclass, asdict
+from memory.session_codec import SessionCodec
+from memory.session_archive import SessionArchive
+
+# Categories sessions are indexed and rolled up by. Task types are often free
+# text (the user's request), so they are mapped onto this fixed set to keep the
+# number of index keys and rollup fields bounded.
+TASK_CATEGORIES = ("research", "coding", "file_processing", "data_analysis", "writing", "planning", "other")
+
+_CATEGORY_KEYWORDS = [
+    ("coding", r"code|coding|bug|debug|implement|refactor|function|script|program|compile"),
+    ("file_processing", r"file|csv|pdf|document|spreadsheet|parse|convert|extract"),
+    ("data_analysis", r"analy[sz]|data|statistic|chart|metric|dataset|forecast"),
+    ("research", r"research|investigat|find|search|look up|compare|learn"),
+    ("writing", r"write|writing|draft|summar|email|article|essay|translat"),
+    ("planning", r"plan|schedule|itinerar|roadmap|organi[sz]e|trip"),
+]
+
+def task_category(task_type: Any) -> str:
+    """Map a task type or free-text task description onto TASK_CATEGORIES"""
+    text = str(task_type or "").strip().lower()
+    normalized = re.sub(r"[\s-]+", "_", text)
+    if normalized in TASK_CATEGORIES:
+        return normalized
+    for category, pattern in _CATEGORY_KEYWORDS:
+        if re.search(rf"\b(?:{pattern})", normalized.replace("_", " ")):
+            return category
+    return "other"
 
 @dataclass
 class Session:
@@ -15,70 +49,627 @@ class Session:
     outcome: Dict[str, Any]
     metadata: Dict[str, Any]
 
-class EpisodicMemory:
+@dataclass
+class RetentionPolicy:
+    """Retention limits for episodic sessions; a limit of None is disabled"""
+    max_age_seconds: Optional[int] = None
+    max_sessions: Optional[int] = None
+    archive_dir: Optional[str] = None
+    batch_size: int = 1000
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        """Build a policy from EPISODIC_MAX_AGE_SECONDS, EPISODIC_MAX_SESSIONS and EPISODIC_ARCHIVE_DIR"""
+        max_age = os.getenv("EPISODIC_MAX_AGE_SECONDS")
+        max_sessions = os.getenv("EPISODIC_MAX_SESSIONS")
+        return cls(
+            max_age_seconds=int(max_age) if max_age else None,
+            max_sessions=int(max_sessions) if max_sessions else None,
+            archive_dir=os.getenv("EPISODIC_ARCHIVE_DIR") or None
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_age_seconds is not None or self.max_sessions is not None
+
+    @property
+    def key_ttl(self) -> Optional[int]:
+        """Expiry applied to session keys at write time.
+
+        None when archiving, since a key Redis expires on its own would
+        never reach the archive; enforce_retention removes those instead.
+        """
+        if self.max_age_seconds is None or self.archive_dir:
+            return None
+        return self.max_age_seconds
+
+# Selects sessions past the age cutoff or beyond the count limit (oldest
+# first, at most ARGV[4] per call) without modifying anything, returning a
+# flat id/score/body list. Retention archives these before deleting them.
+_RETENTION_SELECT_SCRIPT = """
+local selected = {}
+local batch = tonumber(ARGV[4])
+if ARGV[1] ~= '' then
+    selected = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1], 'WITHSCORES', 'LIMIT', 0, batch)
+end
+local count = #selected / 2
+local max_sessions = tonumber(ARGV[2])
+if max_sessions >= 0 and count < batch then
+    local excess = redis.call('ZCARD', KEYS[1]) - count - max_sessions
+    if excess > 0 then
+        excess = math.min(excess, batch - count)
+        local extra = redis.call('ZRANGE', KEYS[1], count, count + excess - 1, 'WITHSCORES')
+        for _, value in ipairs(extra) do
+            table.insert(selected, value)
+        end
+    end
+end
+local result = {}
+for i = 1, #selected, 2 do
+    table.insert(result, selected[i])
+    table.insert(result, selected[i + 1])
+    table.insert(result, redis.call('GET', ARGV[3] .. selected[i]) or '')
+end
+return result
+"""
+
+# Deletes selected sessions once they are archived, skipping any whose score
+# changed since selection (re-stored in between). KEYS[1]: sessions zset.
+# ARGV: session, membership, event and state key prefixes, then id/score pairs.
+_RETENTION_DELETE_SCRIPT = """
+local deleted = 0
+for i = 5, #ARGV, 2 do
+    local id = ARGV[i]
+    if redis.call('ZSCORE', KEYS[1], id) == ARGV[i + 1] then
+        local memberships = ARGV[2] .. id
+        redis.call('DEL', ARGV[1] .. id)
+        redis.call('ZREM', KEYS[1], id)
+        for _, index in ipairs(redis.call('SMEMBERS', memberships)) do
+            redis.call('ZREM', index, id)
+        end
+        redis.call('DEL', memberships, ARGV[3] .. id, ARGV[4] .. id)
+        deleted = deleted + 1
+    end
+end
+return deleted
+"""
+
+# Stores a session and moves it between secondary indexes atomically.
+# KEYS: session key, sessions zset, membership set, then the new index zsets.
+# ARGV: body, score, session id, ttl ('' for none).
+_STORE_SCRIPT = """
+for _, index in ipairs(redis.call('SMEMBERS', KEYS[3])) do
+    redis.call('ZREM', index, ARGV[3])
+end
+redis.call('DEL', KEYS[3])
+if ARGV[4] ~= '' then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[4])
+else
+    redis.call('SET', KEYS[1], ARGV[1])
+end
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[3])
+for i = 4, #KEYS do
+    redis.call('ZADD', KEYS[i], ARGV[2], ARGV[3])
+    redis.call('SADD', KEYS[3], KEYS[i])
+end
+if ARGV[4] ~= '' and #KEYS > 3 then
+    redis.call('EXPIRE', KEYS[3], ARGV[4])
+end
+return 1
+"""
+
+# Appends a state-transition event and merges it into the latest-state hash.
+# KEYS: event stream, state hash. ARGV: ttl ('' for none), max stream length,
+# event timestamp, then alternating field names and encoded values.
+_APPEND_EVENT_SCRIPT = """
+local event = {'_timestamp', ARGV[3]}
+local fields = {}
+for i = 4, #ARGV, 2 do
+    table.insert(event, ARGV[i])
+    table.insert(event, ARGV[i + 1])
+    table.insert(fields, ARGV[i])
+    table.insert(fields, ARGV[i + 1])
+end
+local event_id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[2], '*', unpack(event))
+if #fields > 0 then
+    redis.call('HSET', KEYS[2], unpack(fields))
+end
+redis.call('HSET', KEYS[2], '_updated_at', ARGV[3])
+if ARGV[1] ~= '' then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+end
+return event_id
+"""
+
+# Key patterns owned by episodic memory, used to clear it without FLUSHDB
+_EPISODIC_KEY_PATTERNS = [
+    "session:*", "session_indexes:*", "session_events:*", "session_state:*", "idx:*", "timestamp:*",
+    "rollups:*"
+]
+_EPISODIC_KEYS = ["sessions", "rollup_hours", "rollup_watermark"]
+
+# Process-wide async connection pools, keyed by event loop and connection parameters.
+# An asyncio connection only works on the loop that opened it, so each loop gets its own pool.
+_shared_pools: Dict[Tuple[Any, ...], aioredis.ConnectionPool] = {}
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None  # Created outside a loop; bound to the first loop that uses it
+
+def get_shared_connection_pool(host: str = 'localhost', port: int = 6379, db: int = 0,
+                               max_connections: int = 50,
+                               health_check_interval: int = 30,
+                               socket_timeout: float = 5) -> aioredis.ConnectionPool:
+    """Get (or create) the async Redis connection pool shared by all agents on this event loop"""
+    # Pools of finished loops can never be used again
+    for stale in [key for key in _shared_pools if key[0] is not None and key[0].is_closed()]:
+        del _shared_pools[stale]
+
+    loop = _running_loop()
+    key = (loop, host, port, db, max_connections, health_check_interval, socket_timeout)
+    pool = _shared_pools.get(key)
+    if pool is None:
+        pool = aioredis.ConnectionPool(
+            host=host,
+            port=port,
+            db=db,
+            socket_timeout=socket_timeout,
+            max_connections=max_connections,
+            health_check_interval=health_check_interval
+        )
+        _shared_pools[key] = pool
+        logging.info(f"Created shared Redis connection pool for {host}:{port}/{db}")
+    return pool
+
+async def close_shared_connection_pools():
+    """Disconnect and drop the shared pools of the running loop; forget those of closed loops"""
+    loop = asyncio.get_running_loop()
+    for key in list(_shared_pools):
+        if key[0] is not None and key[0] is not loop:
+            if key[0].is_closed():
+                del _shared_pools[key]
+            continue
+        pool = _shared_pools.pop(key)
+        try:
+            await pool.disconnect()
+        except Exception as e:
+            logging.error(f"Failed to disconnect Redis connection pool: {e}")
+
+class _EpisodicMemoryBase:
+    """Serialization and query helpers shared by the sync and async episodic memories"""
+
+    fetch_chunk_size: int = 500
+    max_events_per_session: int = 1000
+    rollup_lookback_hours: int = 24  # Window rolled up on the first run
+    rollup_recompute_hours: int = 2  # Closed hours re-rolled to catch late writes
+    rollup_top_errors: int = 5
+    rollup_sample_size: int = 5
+    codec: SessionCodec
+    retention: RetentionPolicy
+    archive: Optional[SessionArchive] = None
+
+    def _configure_retention(self, retention: Optional[RetentionPolicy]):
+        """Apply a retention policy, defaulting to the environment configuration"""
+        self.retention = retention if retention is not None else RetentionPolicy.from_env()
+        self.archive = SessionArchive(self.retention.archive_dir) if self.retention.archive_dir else None
+
+    def _serialize_session(self, session: Session) -> bytes:
+        """Serialize session data to a tagged binary record"""
+        try:
+            return self.codec.encode(asdict(session))
+        except Exception as e:
+            logging.error(f"Failed to serialize session: {e}")
+            raise
+
+    def _deserialize_session(self, data: bytes) -> Optional[Session]:
+        """Deserialize a stored record (tagged binary or legacy JSON) to a Session"""
+        try:
+            if not data:
+                return None
+            session_dict = self.codec.decode(data)
+            return Session(**session_dict)
+        except Exception as e:
+            logging.error(f"Failed to deserialize session: {e}")
+            return None
+
+    @staticmethod
+    def _decode_ids(values: List[Any]) -> List[str]:
+        """Decode raw sorted-set members into session IDs"""
+        return [v.decode() if isinstance(v, bytes) else v for v in values]
+
+    def _chunk_ids(self, session_ids: List[str]) -> List[List[str]]:
+        """Split session IDs into MGET-sized chunks"""
+        return [
+            session_ids[start:start + self.fetch_chunk_size]
+            for start in range(0, len(session_ids), self.fetch_chunk_size)
+        ]
+
+    @staticmethod
+    def _epoch(timestamp: str) -> float:
+        """Sorted-set score of an ISO timestamp; naive timestamps are UTC, as written by utcnow()"""
+        moment = datetime.fromisoformat(timestamp)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        return moment.timestamp()
+
+    @classmethod
+    def _timerange_scores(cls, start_time: str, end_time: str) -> Tuple[float, float]:
+        """Convert an ISO time range into sorted-set scores"""
+        return cls._epoch(start_time), cls._epoch(end_time)
+
+    def _timerange_query(self, start_time: str, end_time: str, offset: int,
+                         limit: Optional[int], newest_first: bool,
+                         key: str = "sessions") -> Tuple[str, tuple, Dict[str, Any]]:
+        """Build the sorted-set command, arguments and LIMIT clause for a time range"""
+        start_ts, end_ts = self._timerange_scores(start_time, end_time)
+
+        # Redis only accepts LIMIT when both offset and count are given
+        page = {}
+        if offset or limit is not None:
+            page = {"start": offset, "num": limit if limit is not None else -1}
+
+        if newest_first:
+            return "zrevrangebyscore", (key, end_ts, start_ts), page
+        return "zrangebyscore", (key, start_ts, end_ts), page
+
+    @staticmethod
+    def _index_keys(session: Session) -> List[str]:
+        """Secondary index sorted sets a session belongs to"""
+        keys = [f"idx:error:{int(bool(session.metadata.get('error')))}"]
+        if (task_type := session.context.get("task_type")) is not None:
+            keys.append(f"idx:task_type:{task_category(task_type)}")
+        if (status := session.metadata.get("status")) is not None:
+            keys.append(f"idx:status:{status}")
+        return keys
+
+    @staticmethod
+    def _filter_keys(task_type: Optional[str], status: Optional[str],
+                     has_error: Optional[bool]) -> List[str]:
+        """Index sorted sets to intersect for a query"""
+        keys = []
+        if task_type is not None:
+            keys.append(f"idx:task_type:{task_category(task_type)}")
+        if status is not None:
+            keys.append(f"idx:status:{status}")
+        if has_error is not None:
+            keys.append(f"idx:error:{int(has_error)}")
+        return keys
+
+    @staticmethod
+    def _matches_filters(session: Session, task_type: Optional[str], status: Optional[str],
+                         has_error: Optional[bool]) -> bool:
+        """Client-side equivalent of the index filters, used for archived sessions"""
+        return ((task_type is None or (session.context.get("task_type") is not None
+                                       and task_category(session.context["task_type"]) == task_category(task_type)))
+                and (status is None or str(session.metadata.get("status")) == str(status))
+                and (has_error is None or bool(session.metadata.get("error")) == has_error))
+
+    def _store_script_call(self, session: Session) -> Dict[str, List[Any]]:
+        """Keys and arguments for the store script"""
+        ttl = self.retention.key_ttl
+        return {
+            "keys": [
+                f"session:{session.session_id}",
+                "sessions",
+                f"session_indexes:{session.session_id}",
+                *self._index_keys(session)
+            ],
+            "args": [
+                self._serialize_session(session),
+                self._epoch(session.timestamp),
+                session.session_id,
+                ttl if ttl is not None else ""
+            ]
+        }
+
+    def _queue_delete(self, pipe, session: Session, index_keys: List[Any]):
+        """Queue the commands that delete a session and its indices on a pipeline"""
+        # Remove main session data
+        pipe.delete(f"session:{session.session_id}")
+
+        # Remove legacy timestamp index
+        pipe.delete(f"timestamp:{session.timestamp}")
+
+        # Remove from session list and secondary indexes
+        pipe.zrem("sessions", session.session_id)
+        for index_key in index_keys:
+            pipe.zrem(index_key, session.session_id)
+        pipe.delete(f"session_indexes:{session.session_id}")
+
+        # Remove the event stream and its materialized state
+        pipe.delete(f"session_events:{session.session_id}", f"session_state:{session.session_id}")
+
+    def _queue_indexed_range(self, pipe, filter_keys: List[str], start_time: str, end_time: str,
+                             offset: int, limit: Optional[int], newest_first: bool) -> bool:
+        """Queue a time-range read over the intersection of index sorted sets.
+
+        The last results of the pipeline are the page of IDs and the total
+        count in range; an intersection scratch key is deleted afterwards.
+        Returns True when a scratch key (and so a trailing DEL result) was used.
+        """
+        source = filter_keys[0]
+        scratch = len(filter_keys) > 1
+        if scratch:
+            source = f"idx:tmp:{uuid.uuid4().hex}"
+            # All index scores are the session timestamp; weight the rest at 0 to keep it
+            pipe.zinterstore(source, {key: 1 if i == 0 else 0 for i, key in enumerate(filter_keys)})
+
+        command, args, page = self._timerange_query(start_time, end_time, offset, limit, newest_first, key=source)
+        getattr(pipe, command)(*args, **page)
+        pipe.zcount(source, *self._timerange_scores(start_time, end_time))
+        if scratch:
+            pipe.delete(source)
+        return scratch
+
+    def _append_event_call(self, session_id: str, changes: Dict[str, Any],
+                           timestamp: Optional[str]) -> Dict[str, List[Any]]:
+        """Keys and arguments for the append-event script; each field value is encoded separately"""
+        ttl = self.retention.key_ttl
+        args = [
+            ttl if ttl is not None else "",
+            self.max_events_per_session,
+            timestamp or datetime.utcnow().isoformat()
+        ]
+        for field, value in changes.items():
+            args.extend([field, self.codec.encode(value)])
+        return {
+            "keys": [f"session_events:{session_id}", f"session_state:{session_id}"],
+            "args": args
+        }
+
+    @staticmethod
+    def _decode_text(value: Any) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _decode_fields(self, fields: Dict[Any, Any]) -> Dict[str, Any]:
+        """Decode a hash or stream entry written by the append-event script"""
+        decoded = {}
+        for field, value in fields.items():
+            field = self._decode_text(field)
+            if field.startswith("_"):
+                decoded[field] = self._decode_text(value)
+            else:
+                decoded[field] = self.codec.decode(value)
+        return decoded
+
+    def _decode_events(self, entries: List[Tuple[Any, Dict[Any, Any]]]) -> List[Dict[str, Any]]:
+        """Decode XRANGE entries into an ordered event timeline"""
+        events = []
+        for event_id, fields in entries:
+            changes = self._decode_fields(fields)
+            events.append({
+                "event_id": self._decode_text(event_id),
+                "timestamp": changes.pop("_timestamp", None),
+                "changes": changes
+            })
+        return events
+
+    def _retention_args(self) -> List[Any]:
+        """Arguments for one invocation of the retention select script"""
+        policy = self.retention
+        cutoff = ""
+        if policy.max_age_seconds is not None:
+            cutoff = repr(time.time() - policy.max_age_seconds)
+        max_sessions = policy.max_sessions if policy.max_sessions is not None else -1
+        return [cutoff, max_sessions, "session:", max(1, policy.batch_size)]
+
+    @staticmethod
+    def _retention_delete_args(selected: List[Any]) -> List[Any]:
+        """Arguments for the delete script: key prefixes, then the selected id/score pairs"""
+        args: List[Any] = ["session:", "session_indexes:", "session_events:", "session_state:"]
+        for i in range(0, len(selected), 3):
+            args.extend([selected[i], selected[i + 1]])
+        return args
+
+    def _expired_records(self, bodies: List[Any]) -> List[Dict[str, Any]]:
+        """Decode the bodies of sessions selected for expiry"""
+        records = []
+        for body in bodies:
+            if not body:
+                continue  # Key missing (e.g. expired by an earlier TTL); nothing to archive
+            try:
+                records.append(self.codec.decode(body))
+            except Exception as e:
+                logging.error(f"Failed to decode expired session: {e}")
+        return records
+
+    def _archive_page(self, start_time: str, end_time: str, offset: int, limit: Optional[int],
+                      newest_first: bool, live_count: int,
+                      filters: Tuple[Any, ...] = (None, None, None)) -> Tuple[List[Session], int, Optional[int]]:
+        """Split a page across the live and archive tiers.
+
+        Archived sessions are always older than live ones, so oldest-first pages
+        read the archive before the live tier and newest-first pages read it
+        after, and only when live_count sessions do not fill the page. The
+        archive scan stops once its part of the page is full. Returns the
+        archive slice plus the offset/limit left for the live tier.
+        """
+        if not self.archive:
+            return [], offset, limit
+        predicate = None
+        if any(value is not None for value in filters):
+            predicate = lambda record: self._matches_filters(Session(**record), *filters)
+        try:
+            if newest_first:
+                live_taken = max(0, live_count - offset)
+                if limit is not None:
+                    if live_taken >= limit:
+                        return [], offset, limit
+                    live_taken = min(live_taken, limit)
+                records, _ = self.archive.read_page(
+                    start_time, end_time, max(0, offset - live_count),
+                    None if limit is None else limit - live_taken, True, predicate
+                )
+                return [Session(**record) for record in records], offset, limit
+
+            records, seen = self.archive.read_page(start_time, end_time, offset, limit, False, predicate)
+        except Exception as e:
+            logging.error(f"Failed to read session archive: {e}")
+            return [], offset, limit
+        page = [Session(**record) for record in records]
+        if limit is not None and len(page) == limit:
+            return page, 0, 0  # Filled from the archive alone
+        # A short page means the scan saw every archived match
+        return page, max(0, offset - seen), None if limit is None else limit - len(page)
+
+    def _archive_batches(self, start_time: str, end_time: str, batch: int) -> Iterator[List[Session]]:
+        """Stream archived sessions in batches without loading whole segments"""
+        if not self.archive:
+            return
+        records = self.archive.iter_range(start_time, end_time)
+        while chunk := list(islice(records, batch)):
+            yield [Session(**record) for record in chunk]
+
+    def _advance_cursor(self, entries: List[Tuple[Any, float]], score: float,
+                        ties: int) -> Tuple[List[str], float, int]:
+        """Move a (score, members-seen-at-score) cursor past a WITHSCORES page.
+
+        Members sharing a score are ordered lexicographically, so the next page
+        resumes at the last score with the ties already yielded as the offset.
+        """
+        for _, entry_score in entries:
+            if entry_score == score:
+                ties += 1
+            else:
+                score, ties = entry_score, 1
+        return self._decode_ids([member for member, _ in entries]), score, ties
+
+    @staticmethod
+    def _rollup_hour(timestamp: str) -> str:
+        """Start of the hour bucket containing an ISO timestamp"""
+        return datetime.fromisoformat(timestamp).replace(minute=0, second=0, microsecond=0).isoformat()
+
+    def _rollup_window(self, watermark: Optional[str]) -> Tuple[str, str]:
+        """Time range to roll up: from before the last run's hour up to now"""
+        end_time = datetime.utcnow().isoformat()
+        if watermark:
+            start = datetime.fromisoformat(watermark) - timedelta(hours=self.rollup_recompute_hours)
+        else:
+            start = datetime.fromisoformat(end_time) - timedelta(hours=self.rollup_lookback_hours)
+        return self._rollup_hour(start.isoformat()), end_time
+
+    @staticmethod
+    def _rollup_hours(start_time: str, end_time: str) -> List[str]:
+        """Every hour bucket in a time range"""
+        hour, end = datetime.fromisoformat(start_time), datetime.fromisoformat(end_time)
+        hours = []
+        while hour <= end:
+            hours.append(hour.isoformat())
+            hour += timedelta(hours=1)
+        return hours
+
+    def _add_to_rollup(self, rollups: Dict[Tuple[str, str], Dict[str, Any]], session: Session):
+        """Fold one session into its hour/task-type rollup"""
+        hour = self._rollup_hour(session.timestamp)
+        task_type = task_category(session.context.get("task_type"))
+        rollup = rollups.setdefault((hour, task_type), {
+            "hour": hour, "task_type": task_type, "count": 0, "succeeded": 0, "failed": 0,
+            "errors": Counter(), "error_samples": {}, "recent_ids": deque(maxlen=self.rollup_sample_size)
+        })
+
+        status, error = session.metadata.get("status"), session.metadata.get("error")
+        rollup["count"] += 1
+        if error or status == "failed":
+            rollup["failed"] += 1
+            error = str(error or "unknown error")[:200]
+            rollup["errors"][error] += 1
+            rollup["error_samples"].setdefault(error, session.session_id)
+        else:
+            if status == "completed":
+                rollup["succeeded"] += 1
+            rollup["recent_ids"].append(session.session_id)
+
+    def _finish_rollup(self, rollup: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn an accumulated rollup into its stored form"""
+        top_errors = rollup["errors"].most_common(self.rollup_top_errors)
+        # One failing session per common error, then the latest other sessions
+        samples = [rollup["error_samples"][error] for error, _ in top_errors] + list(rollup["recent_ids"])[::-1]
+        return {
+            "hour": rollup["hour"],
+            "task_type": rollup["task_type"],
+            "count": rollup["count"],
+            "succeeded": rollup["succeeded"],
+            "failed": rollup["failed"],
+            "success_rate": round(rollup["succeeded"] / rollup["count"], 4),
+            "top_errors": [{"error": error, "count": count} for error, count in top_errors],
+            "sample_session_ids": samples[:self.rollup_sample_size]
+        }
+
+    def _queue_rollups(self, pipe, rollups: Dict[Tuple[str, str], Dict[str, Any]],
+                       start_time: str, end_time: str):
+        """Queue the commands that replace the rollups of a time range on a pipeline"""
+        pipe.delete(*[f"rollups:{hour}" for hour in self._rollup_hours(start_time, end_time)])
+        pipe.zremrangebyscore("rollup_hours", *self._timerange_scores(start_time, end_time))
+        for (hour, task_type), rollup in rollups.items():
+            pipe.hset(f"rollups:{hour}", task_type, self.codec.encode(self._finish_rollup(rollup)))
+            pipe.zadd("rollup_hours", {hour: self._timerange_scores(hour, hour)[0]})
+        pipe.set("rollup_watermark", self._rollup_hour(end_time))
+
+    def _decode_rollups(self, hours: List[str], bodies: List[Dict[Any, Any]],
+                        task_type: Optional[str]) -> List[Dict[str, Any]]:
+        """Decode per-hour rollup hashes, optionally keeping one task category"""
+        task_type = None if task_type is None else task_category(task_type)
+        rollups = []
+        for hour, fields in zip(hours, bodies):
+            for field, body in sorted(fields.items()):
+                if task_type is None or self._decode_text(field) == task_type:
+                    rollups.append(self.codec.decode(body))
+        return rollups
+
+class EpisodicMemory(_EpisodicMemoryBase):
     """Redis-based episodic memory implementation for storing agent interaction sessions"""
-    
-    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0):
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0,
+                 fetch_chunk_size: int = 500, codec: Optional[SessionCodec] = None,
+                 retention: Optional[RetentionPolicy] = None):
         """Initialize Redis connection for episodic memory"""
+        self.fetch_chunk_size = max(1, fetch_chunk_size)
+        self.codec = codec or SessionCodec()
+        self._configure_retention(retention)
         try:
             self.redis = redis.Redis(
                 host=host,
                 port=port,
                 db=db,
-                decode_responses=True,
                 socket_timeout=5
             )
             self.redis.ping()  # Test connection
+            self._retention_select = self.redis.register_script(_RETENTION_SELECT_SCRIPT)
+            self._retention_delete = self.redis.register_script(_RETENTION_DELETE_SCRIPT)
+            self._store_script = self.redis.register_script(_STORE_SCRIPT)
+            self._append_event_script = self.redis.register_script(_APPEND_EVENT_SCRIPT)
             logging.info("Successfully connected to Redis for episodic memory")
         except redis.ConnectionError as e:
             logging.error(f"Failed to connect to Redis: {e}")
             raise
 
-    def _serialize_session(self, session: Session) -> str:
-        """Serialize session data to JSON string"""
+    def store_session(self, session: Session) -> bool:
+        """Store a session in Redis with time and secondary indexing"""
         try:
-            return json.dumps(asdict(session))
-        except Exception as e:
-            logging.error(f"Failed to serialize session: {e}")
-            raise
+            # Stored by script so index moves are atomic with the write
+            self._store_script(**self._store_script_call(session))
+            logging.info(f"Successfully stored session {session.session_id}")
+            return True
 
-    def _deserialize_session(self, data: str) -> Optional[Session]:
-        """Deserialize JSON string to Session object"""
-        try:
-            if not data:
-                return None
-            session_dict = json.loads(data)
-            return Session(**session_dict)
         except Exception as e:
-            logging.error(f"Failed to deserialize session: {e}")
-            return None
+            logging.error(f"Failed to store session: {e}")
+            return False
 
-    def store_session(self, session: Session) -> bool:
-        """Store a session in Redis with timestamp indexing"""
-        try:
-            # Store the main session data
-            key = f"session:{session.session_id}"
-            session_data = self._serialize_session(session)
-            
-            # Use Redis pipeline for atomic operations
-            pipe = self.redis.pipeline()
-            
-            # Store session data
-            pipe.set(key, session_data)
-            
-            # Store timestamp index
-            timestamp_key = f"timestamp:{session.timestamp}"
-            pipe.set(timestamp_key, session.session_id)
-            
-            # Add to session list
-            pipe.zadd("sessions", {session.session_id: float(datetime.fromisoformat(session.timestamp).timestamp())})
-            
+    def store_sessions(self, sessions: List[Session]) -> bool:
+        """Store several sessions in one pipelined round trip"""
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for session in sessions:
+                self._store_script(**self._store_script_call(session), client=pipe)
             pipe.execute()
-            logging.info(f"Successfully stored session {session.session_id}")
+            logging.info(f"Successfully stored {len(sessions)} sessions")
             return True
-            
+
         except Exception as e:
-            logging.error(f"Failed to store session: {e}")
+            logging.error(f"Failed to store sessions: {e}")
             return False
 
     def retrieve_session(self, session_id: str) -> Optional[Session]:
@@ -87,72 +678,252 @@ class EpisodicMemory:
             key = f"session:{session_id}"
             data = self.redis.get(key)
             return self._deserialize_session(data) if data else None
-            
+
         except Exception as e:
             logging.error(f"Failed to retrieve session {session_id}: {e}")
             return None
 
-    def get_sessions_by_timerange(self, start_time: str, end_time: str) -> List[Session]:
-        """Retrieve sessions within a specific time range"""
-        try:
-            start_ts = float(datetime.fromisoformat(start_time).timestamp())
-            end_ts = float(datetime.fromisoformat(end_time).timestamp())
-            
-            # Get session IDs within time range
-            session_ids = self.redis.zrangebyscore("sessions", start_ts, end_ts)
-            
-            # Retrieve each session
-            sessions = []
-            for sid in session_ids:
-                if session := self.retrieve_session(sid):
+    def retrieve_sessions(self, session_ids: List[str]) -> List[Session]:
+        """Retrieve multiple sessions using chunked MGET calls, preserving order"""
+        sessions = []
+        for chunk in self._chunk_ids(session_ids):
+            try:
+                values = self.redis.mget([f"session:{sid}" for sid in chunk])
+            except Exception as e:
+                logging.error(f"Failed to retrieve session chunk: {e}")
+                continue
+            for data in values:
+                if data and (session := self._deserialize_session(data)):
                     sessions.append(session)
-            
-            return sessions
-            
+        return sessions
+
+    def get_session_ids_by_timerange(self, start_time: str, end_time: str,
+                                     offset: int = 0, limit: Optional[int] = None,
+                                     newest_first: bool = False) -> List[str]:
+        """Get session IDs within a time range, with optional pagination"""
+        command, args, page = self._timerange_query(start_time, end_time, offset, limit, newest_first)
+        return self._decode_ids(getattr(self.redis, command)(*args, **page))
+
+    def get_sessions_by_timerange(self, start_time: str, end_time: str,
+                                  offset: int = 0, limit: Optional[int] = None,
+                                  newest_first: bool = False) -> List[Session]:
+        """Retrieve sessions within a specific time range, including archived ones"""
+        try:
+            live_count = 0
+            if self.archive and newest_first:
+                live_count = self.redis.zcount("sessions", *self._timerange_scores(start_time, end_time))
+            archive_page, offset, limit = self._archive_page(
+                start_time, end_time, offset, limit, newest_first, live_count
+            )
+
+            live = []
+            if limit is None or limit > 0:
+                session_ids = self.get_session_ids_by_timerange(
+                    start_time, end_time,
+                    offset=offset, limit=limit, newest_first=newest_first
+                )
+                live = self.retrieve_sessions(session_ids)
+            return live + archive_page if newest_first else archive_page + live
+
         except Exception as e:
             logging.error(f"Failed to retrieve sessions by timerange: {e}")
             return []
 
+    def iter_sessions(self, start_time: str, end_time: str,
+                      batch: Optional[int] = None) -> Iterator[Session]:
+        """Stream sessions in a time range oldest first, one batch in memory at a time"""
+        batch = max(1, batch or self.fetch_chunk_size)
+        try:
+            for sessions in self._archive_batches(start_time, end_time, batch):
+                yield from sessions
+        except Exception as e:
+            logging.error(f"Failed to stream archived sessions: {e}")
+
+        score, end_ts = self._timerange_scores(start_time, end_time)
+        ties = 0
+        while True:
+            try:
+                entries = self.redis.zrangebyscore(
+                    "sessions", score, end_ts, start=ties, num=batch, withscores=True
+                )
+            except Exception as e:
+                logging.error(f"Failed to stream sessions by timerange: {e}")
+                return
+            if not entries:
+                return
+            session_ids, score, ties = self._advance_cursor(entries, score, ties)
+            yield from self.retrieve_sessions(session_ids)
+            if len(entries) < batch:
+                return
+
+    def append_session_event(self, session_id: str, changes: Dict[str, Any],
+                             timestamp: Optional[str] = None) -> Optional[str]:
+        """Append changed fields to a session's event stream and latest-state view"""
+        try:
+            event_id = self._append_event_script(**self._append_event_call(session_id, changes, timestamp))
+            return self._decode_text(event_id)
+        except Exception as e:
+            logging.error(f"Failed to append event for session {session_id}: {e}")
+            return None
+
+    def get_session_state(self, session_id: str) -> Dict[str, Any]:
+        """Get the latest state materialized from a session's events"""
+        try:
+            return self._decode_fields(self.redis.hgetall(f"session_state:{session_id}"))
+        except Exception as e:
+            logging.error(f"Failed to get state for session {session_id}: {e}")
+            return {}
+
+    def get_session_events(self, session_id: str, start: str = "-", end: str = "+") -> List[Dict[str, Any]]:
+        """Replay a session's state transitions in order"""
+        try:
+            return self._decode_events(self.redis.xrange(f"session_events:{session_id}", start, end))
+        except Exception as e:
+            logging.error(f"Failed to get events for session {session_id}: {e}")
+            return []
+
+    def _indexed_range(self, filter_keys: List[str], start_time: str, end_time: str,
+                       offset: int, limit: Optional[int], newest_first: bool) -> Tuple[List[str], int]:
+        """Run an intersected index range query, returning a page of IDs and the total in range"""
+        pipe = self.redis.pipeline(transaction=True)
+        scratch = self._queue_indexed_range(pipe, filter_keys, start_time, end_time, offset, limit, newest_first)
+        results = pipe.execute()
+        ids, count = results[-3:-1] if scratch else results[-2:]
+        return self._decode_ids(ids), count
+
+    def query_sessions(self, start_time: str, end_time: str,
+                       task_type: Optional[str] = None, status: Optional[str] = None,
+                       has_error: Optional[bool] = None, offset: int = 0,
+                       limit: Optional[int] = None, newest_first: bool = False) -> List[Session]:
+        """Retrieve sessions in a time range matching task type, status and error filters"""
+        filter_keys = self._filter_keys(task_type, status, has_error)
+        if not filter_keys:
+            return self.get_sessions_by_timerange(
+                start_time, end_time, offset=offset, limit=limit, newest_first=newest_first
+            )
+        try:
+            filters = (task_type, status, has_error)
+            if newest_first:
+                session_ids, live_count = self._indexed_range(
+                    filter_keys, start_time, end_time, offset, limit, True
+                )
+                archive_page, _, _ = self._archive_page(
+                    start_time, end_time, offset, limit, True, live_count, filters
+                )
+                return self.retrieve_sessions(session_ids) + archive_page
+
+            archive_page, offset, limit = self._archive_page(
+                start_time, end_time, offset, limit, False, 0, filters
+            )
+            live = []
+            if limit is None or limit > 0:
+                session_ids, _ = self._indexed_range(filter_keys, start_time, end_time, offset, limit, False)
+                live = self.retrieve_sessions(session_ids)
+            return archive_page + live
+
+        except Exception as e:
+            logging.error(f"Failed to query sessions: {e}")
+            return []
+
     def delete_session(self, session_id: str) -> bool:
         """Delete a session and its associated indices"""
         try:
             key = f"session:{session_id}"
-            
+
             # Get session data first to remove timestamp index
             if session_data := self.redis.get(key):
                 session = self._deserialize_session(session_data)
                 if session:
+                    index_keys = self.redis.smembers(f"session_indexes:{session_id}")
                     pipe = self.redis.pipeline()
-                    
-                    # Remove main session data
-                    pipe.delete(key)
-                    
-                    # Remove timestamp index
-                    pipe.delete(f"timestamp:{session.timestamp}")
-                    
-                    # Remove from session list
-                    pipe.zrem("sessions", session_id)
-                    
+                    self._queue_delete(pipe, session, index_keys)
                     pipe.execute()
                     logging.info(f"Successfully deleted session {session_id}")
                     return True
-            
+
             return False
-            
+
         except Exception as e:
             logging.error(f"Failed to delete session {session_id}: {e}")
             return False
 
+    def enforce_retention(self) -> int:
+        """Expire sessions beyond the retention policy, archiving them if configured"""
+        if not self.retention.enabled:
+            return 0
+        removed_total = 0
+        try:
+            while True:
+                selected = self._retention_select(keys=["sessions"], args=self._retention_args())
+                if not selected:
+                    break
+                records = self._expired_records(selected[2::3])
+                # Archive first; a failed write raises before anything is deleted
+                if records and self.archive:
+                    self.archive.append(records)
+                removed_total += self._retention_delete(
+                    keys=["sessions"], args=self._retention_delete_args(selected)
+                )
+                if records:
+                    self.redis.delete(*[f"timestamp:{record['timestamp']}" for record in records])
+                if len(selected) // 3 < self.retention.batch_size:
+                    break
+
+            if removed_total:
+                logging.info(f"Retention removed {removed_total} episodic sessions")
+            return removed_total
+
+        except Exception as e:
+            logging.error(f"Failed to enforce retention: {e}")
+            return removed_total
+
     def clear_all(self) -> bool:
-        """Clear all episodic memory data (use with caution)"""
+        """Clear all Redis-resident episodic memory data (use with caution)"""
         try:
-            self.redis.flushdb()
+            for pattern in _EPISODIC_KEY_PATTERNS:
+                keys = list(self.redis.scan_iter(match=pattern, count=1000))
+                for chunk in self._chunk_ids(keys):
+                    self.redis.delete(*chunk)
+            self.redis.delete(*_EPISODIC_KEYS)
             logging.info("Successfully cleared all episodic memory data")
             return True
         except Exception as e:
             logging.error(f"Failed to clear episodic memory: {e}")
             return False
 
+    def update_rollups(self) -> int:
+        """Recompute the hourly per-task-type rollups of recent sessions"""
+        try:
+            start_time, end_time = self._rollup_window(self._decode_text(self.redis.get("rollup_watermark")))
+            rollups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            for session in self.iter_sessions(start_time, end_time):
+                self._add_to_rollup(rollups, session)
+
+            pipe = self.redis.pipeline(transaction=True)
+            self._queue_rollups(pipe, rollups, start_time, end_time)
+            pipe.execute()
+            return len(rollups)
+
+        except Exception as e:
+            logging.error(f"Failed to update session rollups: {e}")
+            return 0
+
+    def get_rollups(self, start_time: str, end_time: str,
+                    task_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get precomputed hourly rollups overlapping a time range"""
+        try:
+            hours = self._decode_ids(self.redis.zrangebyscore(
+                "rollup_hours", *self._timerange_scores(self._rollup_hour(start_time), end_time)
+            ))
+            pipe = self.redis.pipeline(transaction=False)
+            for hour in hours:
+                pipe.hgetall(f"rollups:{hour}")
+            return self._decode_rollups(hours, pipe.execute(), task_type)
+
+        except Exception as e:
+            logging.error(f"Failed to get session rollups: {e}")
+            return []
+
     def get_total_sessions(self) -> int:
         """Get total number of stored sessions"""
         try:
@@ -160,3 +931,381 @@ class EpisodicMemory:
         except Exception as e:
             logging.error(f"Failed to get total sessions count: {e}")
             return 0
+
+class _AsyncMaintenanceMixin:
+    """Background maintenance loop shared by the async episodic backends"""
+
+    _maintenance_task: Optional[asyncio.Task] = None
+
+    async def _run_maintenance(self, interval: float):
+        """Periodically run background maintenance until cancelled"""
+        while True:
+            # Roll up before trimming so expiring sessions are still counted
+            await self.update_rollups()
+            await self.enforce_retention()
+            await asyncio.sleep(interval)
+
+    def start_maintenance(self, interval: float = 300):
+        """Start the background maintenance task if it is not already running"""
+        if self._maintenance_task is None or self._maintenance_task.done():
+            self._maintenance_task = asyncio.create_task(self._run_maintenance(interval))
+            logging.info(f"Started episodic memory maintenance every {interval}s")
+
+    async def stop_maintenance(self):
+        """Cancel the background maintenance task"""
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            try:
+                await self._maintenance_task
+            except asyncio.CancelledError:
+                pass
+            self._maintenance_task = None
+
+class AsyncEpisodicMemory(_AsyncMaintenanceMixin, _EpisodicMemoryBase):
+    """Async Redis-based episodic memory sharing one process-wide connection pool"""
+
+    def __init__(self, host: str = 'localhost', port: int = 6379, db: int = 0,
+                 fetch_chunk_size: int = 500, max_connections: int = 50,
+                 health_check_interval: int = 30, socket_timeout: float = 5,
+                 codec: Optional[SessionCodec] = None,
+                 retention: Optional[RetentionPolicy] = None):
+        """Attach to the shared connection pool; connections are opened lazily"""
+        self.fetch_chunk_size = max(1, fetch_chunk_size)
+        self.codec = codec or SessionCodec()
+        self._configure_retention(retention)
+        self.pool = get_shared_connection_pool(
+            host=host,
+            port=port,
+            db=db,
+            max_connections=max_connections,
+            health_check_interval=health_check_interval,
+            socket_timeout=socket_timeout
+        )
+        self.redis = aioredis.Redis(connection_pool=self.pool)
+        self._retention_select = self.redis.register_script(_RETENTION_SELECT_SCRIPT)
+        self._retention_delete = self.redis.register_script(_RETENTION_DELETE_SCRIPT)
+        self._store_script = self.redis.register_script(_STORE_SCRIPT)
+        self._append_event_script = self.redis.register_script(_APPEND_EVENT_SCRIPT)
+
+    async def ping(self) -> bool:
+        """Check that Redis is reachable"""
+        try:
+            return bool(await self.redis.ping())
+        except Exception as e:
+            logging.error(f"Failed to connect to Redis: {e}")
+            return False
+
+    async def store_session(self, session: Session) -> bool:
+        """Store a session in Redis with time and secondary indexing"""
+        try:
+            await self._store_script(**self._store_script_call(session))
+            logging.info(f"Successfully stored session {session.session_id}")
+            return True
+
+        except Exception as e:
+            logging.error(f"Failed to store session: {e}")
+            return False
+
+    async def store_sessions(self, sessions: List[Session]) -> bool:
+        """Store several sessions in one pipelined round trip"""
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for session in sessions:
+                # Queues EVALSHA on the pipeline; no I/O until execute()
+                await self._store_script(**self._store_script_call(session), client=pipe)
+            await pipe.execute()
+            logging.info(f"Successfully stored {len(sessions)} sessions")
+            return True
+
+        except Exception as e:
+            logging.error(f"Failed to store sessions: {e}")
+            return False
+
+    async def retrieve_session(self, session_id: str) -> Optional[Session]:
+        """Retrieve a specific session by ID"""
+        try:
+            data = await self.redis.get(f"session:{session_id}")
+            return self._deserialize_session(data) if data else None
+
+        except Exception as e:
+            logging.error(f"Failed to retrieve session {session_id}: {e}")
+            return None
+
+    async def retrieve_sessions(self, session_ids: List[str]) -> List[Session]:
+        """Retrieve multiple sessions using chunked MGET calls, preserving order"""
+        sessions = []
+        for chunk in self._chunk_ids(session_ids):
+            try:
+                values = await self.redis.mget([f"session:{sid}" for sid in chunk])
+            except Exception as e:
+                logging.error(f"Failed to retrieve session chunk: {e}")
+                continue
+            for data in values:
+                if data and (session := self._deserialize_session(data)):
+                    sessions.append(session)
+        return sessions
+
+    async def get_session_ids_by_timerange(self, start_time: str, end_time: str,
+                                           offset: int = 0, limit: Optional[int] = None,
+                                           newest_first: bool = False) -> List[str]:
+        """Get session IDs within a time range, with optional pagination"""
+        command, args, page = self._timerange_query(start_time, end_time, offset, limit, newest_first)
+        return self._decode_ids(await getattr(self.redis, command)(*args, **page))
+
+    async def get_sessions_by_timerange(self, start_time: str, end_time: str,
+                                        offset: int = 0, limit: Optional[int] = None,
+                                        newest_first: bool = False) -> List[Session]:
+        """Retrieve sessions within a specific time range, including archived ones"""
+        try:
+            live_count = 0
+            if self.archive and newest_first:
+                live_count = await self.redis.zcount("sessions", *self._timerange_scores(start_time, end_time))
+            archive_page, offset, limit = await asyncio.to_thread(
+                self._archive_page, start_time, end_time, offset, limit, newest_first, live_count
+            )
+
+            live = []
+            if limit is None or limit > 0:
+                session_ids = await self.get_session_ids_by_timerange(
+                    start_time, end_time,
+                    offset=offset, limit=limit, newest_first=newest_first
+                )
+                live = await self.retrieve_sessions(session_ids)
+            return live + archive_page if newest_first else archive_page + live
+
+        except Exception as e:
+            logging.error(f"Failed to retrieve sessions by timerange: {e}")
+            return []
+
+    async def iter_sessions(self, start_time: str, end_time: str,
+                            batch: Optional[int] = None) -> AsyncIterator[Session]:
+        """Stream sessions in a time range oldest first, one batch in memory at a time"""
+        batch = max(1, batch or self.fetch_chunk_size)
+        archived = self._archive_batches(start_time, end_time, batch)
+        while True:
+            try:
+                sessions = await asyncio.to_thread(next, archived, None)
+            except Exception as e:
+                logging.error(f"Failed to stream archived sessions: {e}")
+                break
+            if sessions is None:
+                break
+            for session in sessions:
+                yield session
+
+        score, end_ts = self._timerange_scores(start_time, end_time)
+        ties = 0
+        while True:
+            try:
+                entries = await self.redis.zrangebyscore(
+                    "sessions", score, end_ts, start=ties, num=batch, withscores=True
+                )
+            except Exception as e:
+                logging.error(f"Failed to stream sessions by timerange: {e}")
+                return
+            if not entries:
+                return
+            session_ids, score, ties = self._advance_cursor(entries, score, ties)
+            for session in await self.retrieve_sessions(session_ids):
+                yield session
+            if len(entries) < batch:
+                return
+
+    async def append_session_event(self, session_id: str, changes: Dict[str, Any],
+                                   timestamp: Optional[str] = None) -> Optional[str]:
+        """Append changed fields to a session's event stream and latest-state view"""
+        try:
+            event_id = await self._append_event_script(**self._append_event_call(session_id, changes, timestamp))
+            return self._decode_text(event_id)
+        except Exception as e:
+            logging.error(f"Failed to append event for session {session_id}: {e}")
+            return None
+
+    async def get_session_state(self, session_id: str) -> Dict[str, Any]:
+        """Get the latest state materialized from a session's events"""
+        try:
+            return self._decode_fields(await self.redis.hgetall(f"session_state:{session_id}"))
+        except Exception as e:
+            logging.error(f"Failed to get state for session {session_id}: {e}")
+            return {}
+
+    async def get_session_events(self, session_id: str, start: str = "-",
+                                 end: str = "+") -> List[Dict[str, Any]]:
+        """Replay a session's state transitions in order"""
+        try:
+            return self._decode_events(await self.redis.xrange(f"session_events:{session_id}", start, end))
+        except Exception as e:
+            logging.error(f"Failed to get events for session {session_id}: {e}")
+            return []
+
+    async def _indexed_range(self, filter_keys: List[str], start_time: str, end_time: str,
+                             offset: int, limit: Optional[int], newest_first: bool) -> Tuple[List[str], int]:
+        """Run an intersected index range query, returning a page of IDs and the total in range"""
+        pipe = self.redis.pipeline(transaction=True)
+        scratch = self._queue_indexed_range(pipe, filter_keys, start_time, end_time, offset, limit, newest_first)
+        results = await pipe.execute()
+        ids, count = results[-3:-1] if scratch else results[-2:]
+        return self._decode_ids(ids), count
+
+    async def query_sessions(self, start_time: str, end_time: str,
+                             task_type: Optional[str] = None, status: Optional[str] = None,
+                             has_error: Optional[bool] = None, offset: int = 0,
+                             limit: Optional[int] = None, newest_first: bool = False) -> List[Session]:
+        """Retrieve sessions in a time range matching task type, status and error filters"""
+        filter_keys = self._filter_keys(task_type, status, has_error)
+        if not filter_keys:
+            return await self.get_sessions_by_timerange(
+                start_time, end_time, offset=offset, limit=limit, newest_first=newest_first
+            )
+        try:
+            filters = (task_type, status, has_error)
+            if newest_first:
+                session_ids, live_count = await self._indexed_range(
+                    filter_keys, start_time, end_time, offset, limit, True
+                )
+                archive_page, _, _ = await asyncio.to_thread(
+                    self._archive_page, start_time, end_time, offset, limit, True, live_count, filters
+                )
+                return await self.retrieve_sessions(session_ids) + archive_page
+
+            archive_page, offset, limit = await asyncio.to_thread(
+                self._archive_page, start_time, end_time, offset, limit, False, 0, filters
+            )
+            live = []
+            if limit is None or limit > 0:
+                session_ids, _ = await self._indexed_range(filter_keys, start_time, end_time, offset, limit, False)
+                live = await self.retrieve_sessions(session_ids)
+            return archive_page + live
+
+        except Exception as e:
+            logging.error(f"Failed to query sessions: {e}")
+            return []
+
+    async def delete_session(self, session_id: str) -> bool:
+        """Delete a session and its associated indices"""
+        try:
+            if session_data := await self.redis.get(f"session:{session_id}"):
+                if session := self._deserialize_session(session_data):
+                    index_keys = await self.redis.smembers(f"session_indexes:{session_id}")
+                    pipe = self.redis.pipeline()
+                    self._queue_delete(pipe, session, index_keys)
+                    await pipe.execute()
+                    logging.info(f"Successfully deleted session {session_id}")
+                    return True
+
+            return False
+
+        except Exception as e:
+            logging.error(f"Failed to delete session {session_id}: {e}")
+            return False
+
+    async def enforce_retention(self) -> int:
+        """Expire sessions beyond the retention policy, archiving them if configured"""
+        if not self.retention.enabled:
+            return 0
+        removed_total = 0
+        try:
+            while True:
+                selected = await self._retention_select(keys=["sessions"], args=self._retention_args())
+                if not selected:
+                    break
+                records = self._expired_records(selected[2::3])
+                # Archive first; a failed write raises before anything is deleted
+                if records and self.archive:
+                    await asyncio.to_thread(self.archive.append, records)
+                removed_total += await self._retention_delete(
+                    keys=["sessions"], args=self._retention_delete_args(selected)
+                )
+                if records:
+                    await self.redis.delete(*[f"timestamp:{record['timestamp']}" for record in records])
+                if len(selected) // 3 < self.retention.batch_size:
+                    break
+
+            if removed_total:
+                logging.info(f"Retention removed {removed_total} episodic sessions")
+            return removed_total
+
+        except Exception as e:
+            logging.error(f"Failed to enforce retention: {e}")
+            return removed_total
+
+    async def clear_all(self) -> bool:
+        """Clear all Redis-resident episodic memory data (use with caution)"""
+        try:
+            for pattern in _EPISODIC_KEY_PATTERNS:
+                keys = [key async for key in self.redis.scan_iter(match=pattern, count=1000)]
+                for chunk in self._chunk_ids(keys):
+                    await self.redis.delete(*chunk)
+            await self.redis.delete(*_EPISODIC_KEYS)
+            logging.info("Successfully cleared all episodic memory data")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to clear episodic memory: {e}")
+            return False
+
+    async def update_rollups(self) -> int:
+        """Recompute the hourly per-task-type rollups of recent sessions"""
+        try:
+            watermark = self._decode_text(await self.redis.get("rollup_watermark"))
+            start_time, end_time = self._rollup_window(watermark)
+            rollups: Dict[Tuple[str, str], Dict[str, Any]] = {}
+            async for session in self.iter_sessions(start_time, end_time):
+                self._add_to_rollup(rollups, session)
+
+            pipe = self.redis.pipeline(transaction=True)
+            self._queue_rollups(pipe, rollups, start_time, end_time)
+            await pipe.execute()
+            return len(rollups)
+
+        except Exception as e:
+            logging.error(f"Failed to update session rollups: {e}")
+            return 0
+
+    async def get_rollups(self, start_time: str, end_time: str,
+                          task_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get precomputed hourly rollups overlapping a time range"""
+        try:
+            hours = self._decode_ids(await self.redis.zrangebyscore(
+                "rollup_hours", *self._timerange_scores(self._rollup_hour(start_time), end_time)
+            ))
+            pipe = self.redis.pipeline(transaction=False)
+            for hour in hours:
+                pipe.hgetall(f"rollups:{hour}")
+            return self._decode_rollups(hours, await pipe.execute(), task_type)
+
+        except Exception as e:
+            logging.error(f"Failed to get session rollups: {e}")
+            return []
+
+    async def get_total_sessions(self) -> int:
+        """Get total number of stored sessions"""
+        try:
+            return await self.redis.zcard("sessions")
+        except Exception as e:
+            logging.error(f"Failed to get total sessions count: {e}")
+            return 0
+
+    async def close(self):
+        """Release this client; the shared pool stays open for other agents"""
+        try:
+            await self.redis.aclose(close_connection_pool=False)
+        except Exception as e:
+            logging.error(f"Error closing episodic memory client: {e}")
+
+def create_episodic_memory(backend: Optional[str] = None, **kwargs):
+    """Create the async episodic memory backend selected by EPISODIC_BACKEND.
+
+    "redis" (the default) returns an AsyncEpisodicMemory on the shared pool,
+    configured from REDIS_HOST/REDIS_PORT; "sqlite" returns an
+    EmbeddedEpisodicMemory stored at EPISODIC_SQLITE_PATH.
+    """
+    backend = (backend or os.getenv("EPISODIC_BACKEND", "redis")).lower()
+    if backend == "redis":
+        kwargs.setdefault("host", os.getenv("REDIS_HOST", "localhost"))
+        kwargs.setdefault("port", int(os.getenv("REDIS_PORT", 6379)))
+        return AsyncEpisodicMemory(**kwargs)
+    if backend == "sqlite":
+        from memory.embedded_episodic_memory import EmbeddedEpisodicMemory
+        kwargs.setdefault("path", os.getenv("EPISODIC_SQLITE_PATH", "./episodic_memory.db"))
+        return EmbeddedEpisodicMemory(**kwargs)
+    raise ValueError(f"Unknown episodic memory backend: {backend}")
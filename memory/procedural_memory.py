@@ -75,6 +75,22 @@ class ProceduralMemory:
             logging.error(f"Failed to record workflow: {e}")
             return False
             
+    def record_workflows(self, workflows: List[Workflow]) -> bool:
+        """Record several workflows in a single transaction"""
+        try:
+            for workflow in workflows:
+                if not workflow.timestamp:
+                    workflow.timestamp = datetime.utcnow().isoformat()
+                    
+            with self.driver.session() as session:
+                return session.execute_write(
+                    lambda tx: all([self._create_workflow_tx(tx, workflow) for workflow in workflows])
+                )
+                
+        except Exception as e:
+            logging.error(f"Failed to record workflows: {e}")
+            return False
+
     def _create_workflow_tx(self, tx: Transaction, workflow: Workflow) -> bool:
         """Transaction function to create workflow and steps"""
         try:
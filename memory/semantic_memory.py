@@ -1,13 +1,18 @@
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Iterable, Callable
 from chromadb.config import Settings
+from chromadb.utils import embedding_functions
 import chromadb
 import logging
 from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import json
 from datetime import datetime
 import os
 import sys
+import time
 import uuid
+from memory.embedding_cache import CachedEmbeddingFunction
 
 # Add path to chromadb
 os.environ["PATH"] = f"{os.environ.get('PATH', '')}:/usr/local/lib/python3.10/site-packages/chromadb"
@@ -18,14 +23,37 @@ class KnowledgeEntry:
     content: str
     metadata: Dict[str, Any]
     embedding_model: str = "all-MiniLM-L6-v2"  # Default embedding model
+    entry_id: Optional[str] = None  # Stable id so re-ingesting upserts instead of duplicating
 
 class SemanticMemory:
     """ChromaDB-based semantic memory implementation for storing and retrieving knowledge"""
     
     def __init__(self, persist_directory: str = "./semantic_memory_data",
-                 collection_name: str = "knowledge_base"):
-        """Initialize ChromaDB client and collection"""
+                 collection_name: str = "knowledge_base",
+                 embedding_function: Optional[Callable[[List[str]], List[List[float]]]] = None,
+                 embedding_model_name: Optional[str] = None,
+                 embedding_cache_dir: Optional[str] = None,
+                 embedding_cache_size: int = 10000):
+        """Initialize ChromaDB client and collection.
+
+        Embeddings are cached on disk by model name and content hash; a
+        custom embedding_function is only cached when embedding_model_name
+        identifies it. embedding_cache_size=0 disables the cache.
+        """
         try:
+            # Local MiniLM model by default; ingest() calls it directly from worker threads
+            if embedding_function is None:
+                embedding_function = embedding_functions.DefaultEmbeddingFunction()
+                embedding_model_name = embedding_model_name or KnowledgeEntry.embedding_model
+            self.embedding_cache: Optional[CachedEmbeddingFunction] = None
+            if embedding_model_name and embedding_cache_size > 0:
+                self.embedding_cache = CachedEmbeddingFunction(
+                    embedding_function, embedding_model_name,
+                    embedding_cache_dir or os.path.join(persist_directory, "embedding_cache"),
+                    lru_size=embedding_cache_size
+                )
+            self.embedding_function = self.embedding_cache or embedding_function
+            
             # Initialize ChromaDB with persistence
             self.client = chromadb.Client(Settings(
                 persist_directory=persist_directory,
@@ -35,7 +63,8 @@ class SemanticMemory:
             # Get or create collection
             self.collection = self.client.get_or_create_collection(
                 name=collection_name,
-                metadata={"description": "Main knowledge base for semantic memory"}
+                metadata={"description": "Main knowledge base for semantic memory"},
+                embedding_function=self.embedding_function
             )
             
             logging.info(f"Successfully initialized semantic memory with collection: {collection_name}")
@@ -127,6 +156,84 @@ class SemanticMemory:
             logging.error(f"Failed to batch store knowledge: {e}")
             return False
 
+    def _max_batch_size(self, batch_size: int) -> int:
+        """Cap a batch size at the largest single write the ChromaDB client accepts"""
+        try:
+            return min(batch_size, self.client.get_max_batch_size())
+        except Exception:
+            return batch_size  # Older clients have no limit to report
+
+    def _upsert_batch(self, batch: List[KnowledgeEntry], embeddings: List[List[float]]):
+        timestamp = datetime.utcnow().isoformat()
+        for entry in batch:
+            entry.metadata["timestamp"] = timestamp
+        self.collection.upsert(
+            ids=[entry.entry_id or str(uuid.uuid4()) for entry in batch],
+            embeddings=[list(map(float, embedding)) for embedding in embeddings],
+            documents=[entry.content for entry in batch],
+            metadatas=[entry.metadata for entry in batch]
+        )
+
+    def ingest(self, entries: Iterable[KnowledgeEntry], batch_size: int = 256,
+               max_batch_chars: int = 500_000, workers: Optional[int] = None,
+               progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+               log_every: int = 10_000) -> Dict[str, Any]:
+        """Stream entries into the collection, embedding batches in parallel worker threads.
+
+        Entries are read lazily and grouped into batches of up to batch_size
+        entries or max_batch_chars characters. At most two batches per
+        worker are held in memory; batches are upserted in order from the
+        calling thread as their embeddings complete. progress is called
+        after every batch with running totals.
+        """
+        workers = workers or min(8, os.cpu_count() or 1)
+        batch_size = self._max_batch_size(batch_size)
+        stats = {"processed": 0, "failed": 0, "batches": 0, "elapsed_seconds": 0.0, "docs_per_second": 0.0}
+        started = time.monotonic()
+        next_log = log_every
+
+        def finish(batch: List[KnowledgeEntry], future):
+            nonlocal next_log
+            try:
+                self._upsert_batch(batch, future.result())
+                stats["processed"] += len(batch)
+            except Exception as e:
+                stats["failed"] += len(batch)
+                logging.error(f"Failed to ingest batch of {len(batch)} knowledge entries: {e}")
+            stats["batches"] += 1
+            stats["elapsed_seconds"] = time.monotonic() - started
+            stats["docs_per_second"] = stats["processed"] / stats["elapsed_seconds"] if stats["elapsed_seconds"] else 0.0
+            if progress:
+                progress(dict(stats))
+            if stats["processed"] >= next_log:
+                logging.info(f"Ingested {stats['processed']} knowledge entries "
+                             f"({stats['docs_per_second']:.0f} docs/s)")
+                next_log += log_every
+
+        pending: deque = deque()  # (batch, embedding future) in submission order
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="semantic-ingest") as executor:
+            def submit(batch: List[KnowledgeEntry]):
+                pending.append((batch, executor.submit(self.embedding_function, [e.content for e in batch])))
+                while len(pending) >= 2 * workers:
+                    finish(*pending.popleft())
+
+            batch: List[KnowledgeEntry] = []
+            batch_chars = 0
+            for entry in entries:
+                if batch and (len(batch) >= batch_size or batch_chars + len(entry.content) > max_batch_chars):
+                    submit(batch)
+                    batch, batch_chars = [], 0
+                batch.append(entry)
+                batch_chars += len(entry.content)
+            if batch:
+                submit(batch)
+            while pending:
+                finish(*pending.popleft())
+
+        logging.info(f"Ingested {stats['processed']} knowledge entries in {stats['batches']} batches "
+                     f"({stats['docs_per_second']:.0f} docs/s, {stats['failed']} failed)")
+        return stats
+
     def delete_knowledge(self, entry_ids: Union[str, List[str]]) -> bool:
         """Delete knowledge entries by their IDs"""
         try:
@@ -167,7 +274,8 @@ class SemanticMemory:
             return {
                 "total_entries": count,
                 "collection_name": self.collection.name,
-                "metadata": self.collection.metadata
+                "metadata": self.collection.metadata,
+                "embedding_cache": self.embedding_cache.get_stats() if self.embedding_cache else None
             }
         except Exception as e:
             logging.error(f"Failed to get collection stats: {e}")
@@ -176,7 +284,9 @@ class SemanticMemory:
     def clear_cache(self):
         """Clear the semantic memory cache"""
         try:
-            self.collection = self.client.get_collection(self.collection.name)
+            self.collection = self.client.get_collection(
+                self.collection.name, embedding_function=self.embedding_function
+            )
             logging.info("Successfully cleared semantic memory cache")
         except Exception as e:
             logging.error(f"Failed to clear cache: {e}")
@@ -188,7 +298,8 @@ class SemanticMemory:
             # Recreate empty collection
             self.collection = self.client.create_collection(
                 name=self.collection.name,
-                metadata={"description": "Main knowledge base for semantic memory"}
+                metadata={"description": "Main knowledge base for semantic memory"},
+                embedding_function=self.embedding_function
             )
             logging.info("Successfully cleared all semantic memory data")
             return True
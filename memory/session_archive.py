@@ -0,0 +1,154 @@
+from typing import Dict, Any, List, Iterator, Optional, Callable, Tuple
+from collections import deque
+import gzip
+import io
+import json
+import os
+import re
+import threading
+import logging
+from datetime import datetime, timezone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Records are written compactly, so the timestamp can be read without parsing the line
+_TIMESTAMP = re.compile(rb'"timestamp":"([^"]+)"')
+
+def _epoch(timestamp: str) -> float:
+    """POSIX time of an ISO timestamp; naive timestamps are UTC"""
+    moment = datetime.fromisoformat(timestamp)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+class SessionArchive:
+    """Daily segment files of newline-delimited JSON sessions expired from Redis.
+
+    Each append writes one compressed frame (zstd, or gzip when zstandard is not
+    installed); concatenated frames decode as a single stream, so segments are
+    append-only and never rewritten.
+    """
+
+    def __init__(self, directory: str):
+        """Create the archive directory if needed"""
+        self.directory = directory
+        self.extension = ".ndjson.zst" if zstandard is not None else ".ndjson.gz"
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _segment_path(self, day: str) -> str:
+        """Path of the segment file holding sessions from a given day"""
+        return os.path.join(self.directory, f"sessions-{day}{self.extension}")
+
+    def _compress(self, payload: bytes) -> bytes:
+        """Compress one frame with the archive's codec"""
+        if zstandard is not None:
+            return zstandard.ZstdCompressor(level=10).compress(payload)
+        return gzip.compress(payload)
+
+    def _read_segment(self, path: str) -> Iterator[bytes]:
+        """Stream the raw record lines of a single segment file"""
+        with open(path, "rb") as raw:
+            if path.endswith(".zst"):
+                if zstandard is None:
+                    raise RuntimeError(f"zstandard is required to read {path}")
+                stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            else:
+                stream = gzip.GzipFile(fileobj=raw)
+            with io.BufferedReader(stream) as lines:
+                for line in lines:
+                    if line.strip():
+                        yield line
+
+    def append(self, records: List[Dict[str, Any]]) -> int:
+        """Append session records to the segments for their days"""
+        by_day: Dict[str, List[str]] = {}
+        for record in records:
+            day = datetime.fromisoformat(record["timestamp"]).strftime("%Y%m%d")
+            by_day.setdefault(day, []).append(json.dumps(record, separators=(",", ":")))
+
+        with self._lock:
+            for day, lines in by_day.items():
+                frame = self._compress(("\n".join(lines) + "\n").encode("utf-8"))
+                with open(self._segment_path(day), "ab") as segment:
+                    segment.write(frame)
+
+        logging.info(f"Archived {len(records)} sessions to {self.directory}")
+        return len(records)
+
+    def _segments(self, start_time: str, end_time: str, newest_first: bool = False) -> List[str]:
+        """Paths of the segments covering a time range, in day order"""
+        first_day = datetime.fromisoformat(start_time).strftime("%Y%m%d")
+        last_day = datetime.fromisoformat(end_time).strftime("%Y%m%d")
+        names = sorted(
+            (name for name in os.listdir(self.directory)
+             if name.startswith("sessions-") and name.endswith((".ndjson.zst", ".ndjson.gz"))
+             and first_day <= name[len("sessions-"):].split(".", 1)[0] <= last_day),
+            reverse=newest_first
+        )
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _lines_in_range(self, path: str, start: float, end: float) -> Iterator[bytes]:
+        """Raw lines of a segment within [start, end], judged on their raw timestamp"""
+        for line in self._read_segment(path):
+            match = _TIMESTAMP.search(line)
+            if match is None:
+                # Not written by append(); check it the slow way
+                if start <= _epoch(json.loads(line)["timestamp"]) <= end:
+                    yield line
+            elif start <= _epoch(match.group(1).decode()) <= end:
+                yield line
+
+    def iter_range(self, start_time: str, end_time: str) -> Iterator[Dict[str, Any]]:
+        """Stream archived records within a time range, oldest segment first.
+
+        Lines outside the range are skipped on their raw timestamp, so only
+        matching records are decoded.
+        """
+        start, end = _epoch(start_time), _epoch(end_time)
+        for path in self._segments(start_time, end_time):
+            for line in self._lines_in_range(path, start, end):
+                yield json.loads(line)
+
+    def read_page(self, start_time: str, end_time: str, offset: int = 0, limit: Optional[int] = None,
+                  newest_first: bool = False,
+                  predicate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """One page of archived records in a time range, optionally filtered by predicate.
+
+        The scan stops once the page is full. Segments are appended in expiry
+        order, oldest first, so records are taken in file order. Returns the
+        page and the number of matching records scanned, which is the total
+        in range whenever the page comes back short.
+        """
+        start, end = _epoch(start_time), _epoch(end_time)
+        wanted = None if limit is None else offset + limit
+        page: List[Dict[str, Any]] = []
+        seen = 0
+        if wanted == 0:
+            return page, seen
+        for path in self._segments(start_time, end_time, newest_first):
+            remaining = None if wanted is None else wanted - seen
+            lines = self._lines_in_range(path, start, end)
+            if predicate is None:
+                if newest_first:
+                    # Segments only read forwards; keep just the newest lines the page can use
+                    lines = reversed(deque(lines, maxlen=remaining))
+                records = map(json.loads, lines)
+            else:
+                records = filter(predicate, map(json.loads, lines))
+                if newest_first:
+                    records = reversed(deque(records, maxlen=remaining))
+            for record in records:
+                seen += 1
+                if seen > offset:
+                    page.append(record)
+                if seen == wanted:
+                    return page, seen
+        return page, seen
+
+    def read_range(self, start_time: str, end_time: str) -> List[Dict[str, Any]]:
+        """Archived records within a time range, oldest first"""
+        return self.read_page(start_time, end_time)[0]
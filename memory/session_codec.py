@@ -0,0 +1,117 @@
+from typing import Dict, Any, Callable, Optional, Tuple, Union
+import json
+import zlib
+import logging
+
+# Optional fast serializers and compressors
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# Tagged records start with this byte; legacy records are plain JSON text
+FORMAT_MAGIC = b"\x01"
+
+_serializers: Dict[str, Tuple[bytes, Callable[[Any], bytes], Callable[[bytes], Any]]] = {}
+_compressors: Dict[str, Tuple[bytes, Callable[[bytes], bytes], Callable[[bytes], bytes]]] = {}
+
+def register_serializer(name: str, tag: bytes, dumps: Callable[[Any], bytes],
+                        loads: Callable[[bytes], Any]):
+    """Register a serializer under a one-byte format tag"""
+    if len(tag) != 1:
+        raise ValueError("Serializer tag must be a single byte")
+    _serializers[name] = (tag, dumps, loads)
+
+def register_compressor(name: str, tag: bytes, compress: Callable[[bytes], bytes],
+                        decompress: Callable[[bytes], bytes]):
+    """Register a compressor under a one-byte format tag"""
+    if len(tag) != 1:
+        raise ValueError("Compressor tag must be a single byte")
+    _compressors[name] = (tag, compress, decompress)
+
+register_serializer(
+    "json", b"j",
+    lambda data: json.dumps(data, separators=(",", ":")).encode(),
+    json.loads
+)
+if orjson is not None:
+    register_serializer("orjson", b"o", orjson.dumps, orjson.loads)
+if msgpack is not None:
+    register_serializer(
+        "msgpack", b"m",
+        lambda data: msgpack.packb(data, use_bin_type=True),
+        lambda payload: msgpack.unpackb(payload, raw=False)
+    )
+
+register_compressor("none", b"-", bytes, bytes)
+register_compressor("zlib", b"g", zlib.compress, zlib.decompress)
+if zstandard is not None:
+    register_compressor(
+        "zstd", b"z",
+        lambda payload: zstandard.ZstdCompressor(level=3).compress(payload),
+        lambda payload: zstandard.ZstdDecompressor().decompress(payload)
+    )
+if lz4_frame is not None:
+    register_compressor("lz4", b"l", lz4_frame.compress, lz4_frame.decompress)
+
+DEFAULT_SERIALIZER = next(name for name in ("msgpack", "orjson", "json") if name in _serializers)
+DEFAULT_COMPRESSION = next(name for name in ("zstd", "lz4", "zlib") if name in _compressors)
+
+class SessionCodec:
+    """Encodes session records as tagged, optionally compressed binary payloads"""
+
+    def __init__(self, serializer: str = DEFAULT_SERIALIZER,
+                 compression: Optional[str] = DEFAULT_COMPRESSION,
+                 compress_threshold: int = 1024):
+        """Select a registered serializer and compressor"""
+        compression = compression or "none"
+        if serializer not in _serializers:
+            raise ValueError(f"Unknown or unavailable serializer: {serializer}")
+        if compression not in _compressors:
+            raise ValueError(f"Unknown or unavailable compression: {compression}")
+
+        self.serializer = serializer
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        logging.info(f"Session codec using {serializer} with {compression} compression")
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        """Serialize a record, compressing it when it exceeds the size threshold"""
+        serializer_tag, dumps, _ = _serializers[self.serializer]
+        payload = dumps(data)
+
+        compressor_tag, compress, _ = _compressors["none"]
+        if self.compression != "none" and len(payload) >= self.compress_threshold:
+            compressor_tag, compress, _ = _compressors[self.compression]
+
+        return FORMAT_MAGIC + serializer_tag + compressor_tag + compress(payload)
+
+    def decode(self, payload: Union[bytes, str]) -> Dict[str, Any]:
+        """Deserialize a tagged record, falling back to legacy JSON"""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        if not payload.startswith(FORMAT_MAGIC):
+            return json.loads(payload)
+
+        serializer_tag, compressor_tag = payload[1:2], payload[2:3]
+        loads = next((entry[2] for entry in _serializers.values() if entry[0] == serializer_tag), None)
+        decompress = next((entry[2] for entry in _compressors.values() if entry[0] == compressor_tag), None)
+        if loads is None or decompress is None:
+            raise ValueError(f"Unsupported session record format: {payload[:3]!r}")
+
+        return loads(decompress(payload[3:]))
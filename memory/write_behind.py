@@ -0,0 +1,189 @@
+from typing import Dict, Any, List, Callable, Awaitable, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import logging
+
+class WriteBehindBuffer:
+    """Coalesces memory writes across tasks and flushes them to each backend in batches.
+
+    Writes are keyed per sink so a newer write for the same key replaces the
+    pending one. Flushes happen when a sink reaches batch_size or every
+    flush_interval seconds. Once max_pending writes are buffered, submit()
+    waits for a flush to free space.
+
+    A failed batch is requeued ahead of newer writes and retried with
+    exponential backoff. Writes still failing after max_retries are dropped,
+    counted in stats["failed"] and passed to on_failure, and the next
+    flush() or close() raises RuntimeError.
+    """
+
+    def __init__(self, max_pending: int = 1000, batch_size: int = 100,
+                 flush_interval: float = 0.5, max_retries: int = 3, retry_backoff: float = 0.5,
+                 on_failure: Optional[Callable[[str, List[Any], Exception], Any]] = None):
+        """Initialize an empty buffer; call start() to begin background flushing"""
+        self.max_pending = max(1, max_pending)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        self.on_failure = on_failure
+
+        self._sinks: Dict[str, Callable[[List[Any]], Awaitable[Any]]] = {}
+        self._pending: Dict[str, "OrderedDict[str, Any]"] = {}
+        self._space = asyncio.Condition()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+        self._attempts: Dict[Tuple[str, str], int] = {}  # (sink, key) -> failed flushes
+        self._retry_at: Dict[str, float] = {}  # sink -> loop time its backoff ends
+        self._errors: List[str] = []  # Dropped batches not yet raised by flush()/close()
+        self.stats = {"submitted": 0, "coalesced": 0, "flushed": 0, "retried": 0, "failed": 0, "batches": 0}
+
+    def register_sink(self, name: str, flush: Callable[[List[Any]], Awaitable[Any]]):
+        """Register a batch writer for a backend"""
+        self._sinks[name] = flush
+        self._pending.setdefault(name, OrderedDict())
+
+    @property
+    def pending_count(self) -> int:
+        return sum(len(items) for items in self._pending.values())
+
+    async def submit(self, sink: str, key: str, item: Any):
+        """Buffer a write, replacing any pending write with the same key"""
+        if sink not in self._sinks:
+            raise ValueError(f"Unknown write-behind sink: {sink}")
+
+        async with self._space:
+            pending = self._pending[sink]
+            if key in pending:
+                pending[key] = item
+                self.stats["coalesced"] += 1
+                return
+
+            # Backpressure: wait for a flush to make room
+            while self.pending_count >= self.max_pending:
+                self._wakeup.set()
+                await self._space.wait()
+
+            pending[key] = item
+            self.stats["submitted"] += 1
+            if len(pending) >= self.batch_size:
+                self._wakeup.set()
+
+    async def _flush_sink(self, name: str, entries: List[Tuple[str, Any]]):
+        """Write one sink's (key, item) entries in batch_size chunks"""
+        for start in range(0, len(entries), self.batch_size):
+            batch = entries[start:start + self.batch_size]
+            try:
+                if await self._sinks[name]([item for _, item in batch]) is False:
+                    raise RuntimeError("sink reported failure")
+                self.stats["flushed"] += len(batch)
+                self.stats["batches"] += 1
+                for key, _ in batch:
+                    self._attempts.pop((name, key), None)
+            except Exception as e:
+                await self._requeue(name, batch, e)
+
+    async def _requeue(self, name: str, batch: List[Tuple[str, Any]], error: Exception):
+        """Put a failed batch back at the head of its sink, dropping writes out of retries"""
+        retry, dropped, attempts = [], [], 0
+        for key, item in batch:
+            key_attempts = self._attempts.pop((name, key), 0) + 1
+            if key_attempts > self.max_retries:
+                dropped.append(item)
+            else:
+                retry.append((key, item, key_attempts))
+                attempts = max(attempts, key_attempts)
+
+        async with self._space:
+            pending = self._pending[name]
+            for key, item, key_attempts in reversed(retry):
+                if key in pending:
+                    continue  # A newer write for the key supersedes the failed one
+                pending[key] = item
+                pending.move_to_end(key, last=False)
+                self._attempts[(name, key)] = key_attempts
+        if retry:
+            self.stats["retried"] += len(retry)
+            self._retry_at[name] = asyncio.get_running_loop().time() + self.retry_backoff * 2 ** (attempts - 1)
+            logging.warning(f"Write-behind flush to {name} failed, retrying {len(retry)} items: {error}")
+        if not dropped:
+            return
+
+        self.stats["failed"] += len(dropped)
+        self._errors.append(f"{len(dropped)} writes to {name} after {self.max_retries} retries: {error}")
+        logging.error(f"Write-behind dropped {len(dropped)} items for {name} after {self.max_retries} retries: {error}")
+        if self.on_failure is not None:
+            try:
+                result = self.on_failure(name, dropped, error)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logging.error(f"Write-behind failure callback for {name} failed: {e}")
+
+    async def _flush(self, respect_backoff: bool = False):
+        """Flush pending writes, optionally skipping sinks still backing off from a failure"""
+        async with self._flush_lock:
+            now = asyncio.get_running_loop().time()
+            async with self._space:
+                drained = {}
+                for name, items in self._pending.items():
+                    if not items or (respect_backoff and self._retry_at.get(name, 0) > now):
+                        continue
+                    drained[name] = list(items.items())
+                    items.clear()
+                if drained:
+                    self._space.notify_all()
+
+            if drained:
+                await asyncio.gather(*(self._flush_sink(name, entries) for name, entries in drained.items()))
+
+    def _raise_failures(self):
+        """Raise for writes dropped since the last flush()/close()"""
+        if self._errors:
+            errors, self._errors = self._errors, []
+            raise RuntimeError(f"Write-behind dropped {'; '.join(errors)}")
+
+    async def flush(self):
+        """Flush all pending writes now; raises RuntimeError if any writes were dropped"""
+        await self._flush()
+        self._raise_failures()
+
+    async def _run(self):
+        """Background flush loop; exits after a final flush once closing"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush(respect_backoff=True)
+
+    def start(self):
+        """Start the background flusher if it is not already running"""
+        if self._flusher is None or self._flusher.done():
+            self._closing = False
+            self._flusher = asyncio.create_task(self._run())
+            logging.info("Started write-behind buffer")
+
+    async def close(self):
+        """Stop the background flusher and flush everything still pending.
+
+        Failed writes keep being retried until they succeed or run out of
+        retries; raises RuntimeError if any were dropped.
+        """
+        # Let the flusher finish its current batch rather than cancelling it mid-write
+        self._closing = True
+        self._wakeup.set()
+        if self._flusher is not None:
+            await self._flusher
+            self._flusher = None
+        loop = asyncio.get_running_loop()
+        await self._flush()
+        while self.pending_count:
+            backoff = min(self._retry_at.get(name, 0) for name, items in self._pending.items() if items)
+            await asyncio.sleep(max(0.0, backoff - loop.time()))
+            await self._flush()
+        logging.info(f"Write-behind buffer closed: {self.stats}")
+        self._raise_failures()
@@ -0,0 +1,114 @@
+from typing import Dict, Any, Optional, List
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import litellm
+from router.model_router import ModelRouter, TaskConfig
+
+def _percentile(samples: List[float], percentile: float) -> Optional[float]:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(percentile * len(samples)))]
+
+async def run_load_test(router: ModelRouter, task_type: str, qps: float, duration: float,
+                        unique_prompts: int = 100, prompt_template: str = "Summarize item {index}",
+                        poisson: bool = True, seed: Optional[int] = None) -> Dict[str, Any]:
+    """Drive route_task at a target rate and report throughput, latency and cache effectiveness.
+
+    Arrivals are open-loop (a slow router does not lower the offered load),
+    Poisson-spaced by default. Prompts are drawn uniformly from a pool of
+    unique_prompts, so a smaller pool means more cache hits.
+    """
+    rng = random.Random(seed)
+    cache_before = router.get_cache_stats()
+    hedged_before = router.hedged_requests
+    latencies: List[float] = []
+    failures = 0
+
+    async def one_request(prompt: str):
+        nonlocal failures
+        started = time.monotonic()
+        response = await router.route_task(task_type, prompt)
+        if response is None:
+            failures += 1
+        else:
+            latencies.append(time.monotonic() - started)
+
+    requests = []
+    started = time.monotonic()
+    next_at = started
+    while next_at < started + duration:
+        await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+        prompt = prompt_template.format(index=rng.randrange(unique_prompts))
+        requests.append(asyncio.ensure_future(one_request(prompt)))
+        next_at += rng.expovariate(qps) if poisson else 1 / qps
+    await asyncio.gather(*requests)
+    elapsed = time.monotonic() - started
+
+    cache_after = router.get_cache_stats()
+    hits = cache_after["hits"] - cache_before["hits"]
+    misses = cache_after["misses"] - cache_before["misses"]
+    return {
+        "offered_qps": qps,
+        "requests": len(requests),
+        "succeeded": len(latencies),
+        "failed": failures,
+        "elapsed_seconds": elapsed,
+        "throughput_qps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_p50": _percentile(latencies, 0.5),
+        "latency_p95": _percentile(latencies, 0.95),
+        "latency_p99": _percentile(latencies, 0.99),
+        "response_cache_hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "coalesced": cache_after["coalesced"] - cache_before["coalesced"],
+        "hedged": router.hedged_requests - hedged_before,
+        "usage": router.get_usage_stats()["by_task_type"].get(task_type),
+        "rate_limits": router.get_rate_limit_stats()
+    }
+
+async def _main(args: argparse.Namespace):
+    from router.stub_provider import StubProvider, StubProfile
+    provider = StubProvider({
+        "stub-primary": StubProfile(latency_ms=args.latency_ms, error_rate=args.error_rate,
+                                    tokens_per_second=args.tokens_per_second),
+        "stub-fallback": StubProfile(latency_ms=args.latency_ms, tokens_per_second=args.tokens_per_second)
+    }, seed=args.seed)
+    await provider.start()
+    router = ModelRouter()
+    litellm.set_verbose = False  # Per-request debug output would swamp the report
+    try:
+        router.add_model(provider.model_config("stub-primary", max_concurrency=args.max_concurrency))
+        router.add_model(provider.model_config("stub-fallback"))
+        router.add_task_config(TaskConfig(
+            task_type="load_test",
+            required_capabilities=[],
+            priority_models=["openai/stub-primary"],
+            fallback_models=["openai/stub-fallback"],
+            cache_ttl=None if args.cache else 0,
+            hedge_percentile=args.hedge_percentile
+        ))
+        report = await run_load_test(router, "load_test", args.qps, args.duration,
+                                     unique_prompts=args.unique_prompts, seed=args.seed)
+        report["provider"] = provider.stats
+        print(json.dumps(report, indent=2))
+    finally:
+        await router.shutdown()
+        await provider.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test ModelRouter against the local stub provider")
+    parser.add_argument("--qps", type=float, default=20)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--unique-prompts", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--tokens-per-second", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--hedge-percentile", type=float, default=None)
+    parser.add_argument("--no-cache", dest="cache", action="store_false")
+    parser.add_argument("--seed", type=int, default=None)
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,86 @@
+from typing import Dict, Any, List, Callable, Awaitable, Tuple
+import json
+import asyncio
+import logging
+
+class MicroBatcher:
+    """Collects concurrent prompts for one model and sends them as one batched request.
+
+    A batch is dispatched when it reaches max_batch_size or max_wait_ms after
+    its first prompt arrived, whichever comes first. Only prompts with
+    identical parameters share a batch. The dispatch callable takes the
+    prompts and parameters and returns one result per prompt, in order.
+    """
+
+    def __init__(self, dispatch: Callable[[List[str], Dict[str, Any]], Awaitable[List[Any]]],
+                 max_batch_size: int = 16, max_wait_ms: float = 5):
+        """Initialize an empty batcher"""
+        self.dispatch = dispatch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+
+        self._pending: Dict[str, List[Tuple[str, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._running: set = set()
+        self.stats = {"requests": 0, "batches": 0, "failed_batches": 0}
+
+    async def submit(self, prompt: str, parameters: Dict[str, Any]) -> Any:
+        """Queue a prompt for the next batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        key = json.dumps(parameters, sort_keys=True)
+        future = loop.create_future()
+
+        batch = self._pending.setdefault(key, [])
+        batch.append((prompt, future))
+        self.stats["requests"] += 1
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+
+        return await future
+
+    def _flush(self, key: str):
+        """Dispatch the pending batch for a parameter set"""
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = [(prompt, future) for prompt, future in self._pending.pop(key, []) if not future.done()]
+        if batch:
+            task = asyncio.ensure_future(self._run(batch, json.loads(key)))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]], parameters: Dict[str, Any]):
+        """Send one batch and hand each waiter its own result"""
+        self.stats["batches"] += 1
+        try:
+            results = await self.dispatch([prompt for prompt, _ in batch], parameters)
+            if len(results) != len(batch):
+                raise ValueError(f"Batch returned {len(results)} results for {len(batch)} prompts")
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            logging.error(f"Batched request of {len(batch)} prompts failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Request and batch counters with the average batch size"""
+        return {
+            **self.stats,
+            "avg_batch_size": self.stats["requests"] / self.stats["batches"] if self.stats["batches"] else 0.0,
+            "pending": sum(len(batch) for batch in self._pending.values())
+        }
+
+    async def close(self):
+        """Dispatch everything still pending and wait for in-flight batches"""
+        for key in list(self._pending):
+            self._flush(key)
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
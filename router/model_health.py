@@ -0,0 +1,132 @@
+from typing import Dict, Any, Optional
+from collections import deque
+import time
+import logging
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a model whose circuit breaker is open"""
+
+class ModelHealth:
+    """Rolling error rate and latency for one model, with a circuit breaker.
+
+    The breaker opens when the error rate over the last window_seconds
+    reaches failure_rate (given at least min_requests calls) or after
+    max_consecutive_failures in a row. After cooldown_seconds it lets a
+    single probe through; the probe's outcome closes or re-opens it.
+    """
+
+    def __init__(self, model_name: str, window_seconds: float = 60, failure_rate: float = 0.5,
+                 min_requests: int = 5, max_consecutive_failures: int = 5,
+                 cooldown_seconds: float = 30, latency_window: int = 200):
+        """Start closed with an empty history"""
+        self.model_name = model_name
+        self.window_seconds = window_seconds
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.max_consecutive_failures = max_consecutive_failures
+        self.cooldown_seconds = cooldown_seconds
+
+        self.outcomes: deque = deque()  # (monotonic time, succeeded)
+        self.latencies: deque = deque(maxlen=latency_window)
+        self.first_token_latencies: deque = deque(maxlen=latency_window)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.times_opened = 0
+        self._probing = False
+
+    def _trim(self):
+        cutoff = time.monotonic() - self.window_seconds
+        while self.outcomes and self.outcomes[0][0] < cutoff:
+            self.outcomes.popleft()
+
+    @property
+    def error_rate(self) -> float:
+        self._trim()
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for _, ok in self.outcomes if not ok) / len(self.outcomes)
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        self._probing = False
+
+    def allow_request(self) -> bool:
+        """Whether a call may go to the model now; in half-open state only one probe at a time"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown_seconds:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def release(self):
+        """Give back a probe slot whose call ended without an outcome (e.g. cancelled)"""
+        self._probing = False
+
+    def record_success(self, latency: float):
+        self.outcomes.append((time.monotonic(), True))
+        self.latencies.append(latency)
+        self.consecutive_failures = 0
+        if self.state == "half_open":
+            self.state = "closed"
+            self._probing = False
+
+    def record_first_token(self, latency: float):
+        """Time to first token of a streamed call"""
+        self.first_token_latencies.append(latency)
+
+    def record_failure(self):
+        self.outcomes.append((time.monotonic(), False))
+        self.consecutive_failures += 1
+        if self.state == "half_open":
+            self._open()
+        elif self.state == "closed":
+            self._trim()
+            if (self.consecutive_failures >= self.max_consecutive_failures
+                    or (len(self.outcomes) >= self.min_requests and self.error_rate >= self.failure_rate)):
+                self._open()
+                logging.warning(f"Circuit opened for {self.model_name} after {self.consecutive_failures} "
+                                f"consecutive failures ({self.error_rate:.0%} recent error rate)")
+
+    @staticmethod
+    def _percentile(values: deque, percentile: float) -> Optional[float]:
+        samples = sorted(values)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(percentile * len(samples)))]
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Latency at a percentile of recent successful calls; None without samples"""
+        return self._percentile(self.latencies, percentile)
+
+    @property
+    def available(self) -> bool:
+        """Whether the breaker would currently let a request through (without taking a probe slot)"""
+        if self.state == "open":
+            return time.monotonic() - self.opened_at >= self.cooldown_seconds
+        return not (self.state == "half_open" and self._probing)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Breaker state, rolling error rate and latency percentiles"""
+        self._trim()
+        retry_in = None
+        if self.state == "open":
+            retry_in = max(0.0, self.cooldown_seconds - (time.monotonic() - self.opened_at))
+        return {
+            "circuit": self.state,
+            "error_rate": self.error_rate,
+            "recent_requests": len(self.outcomes),
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "retry_in_seconds": retry_in,
+            "latency_p50": self.latency_percentile(0.5),
+            "latency_p95": self.latency_percentile(0.95),
+            "first_token_p50": self._percentile(self.first_token_latencies, 0.5),
+            "first_token_p95": self._percentile(self.first_token_latencies, 0.95)
+        }
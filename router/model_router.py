@@ -1,14 +1,31 @@
-from typing import Dict, Any, Optional, List, Union
+from typing import Dict, Any, Optional, List, Union, AsyncIterator, Tuple
 import litellm
-from litellm import completion, ModelResponse
+from litellm import acompletion, ModelResponse
 import logging
 from dataclasses import dataclass
 import json
+import os
 from datetime import datetime
 import hashlib
 import asyncio
-from functools import lru_cache
+import time
+import copy
+from contextlib import nullcontext
+from functools import partial
 import backoff
+from router.response_cache import ResponseCache
+from router.rate_limiter import ModelRateLimiter
+from router.model_health import ModelHealth, CircuitOpenError
+from router.micro_batcher import MicroBatcher
+from router.semantic_cache import SemanticCache
+from router.usage_metrics import UsageTracker
+from router.prompt_budget import PromptBudgeter
+from router.model_selector import AdaptiveSelector
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 @dataclass
 class ModelConfig:
@@ -21,6 +38,15 @@ class ModelConfig:
     parameters: Dict[str, Any] = None
     retry_count: int = 3
     timeout: int = 30
+    max_concurrency: Optional[int] = None  # Rate limits; None leaves a limit off
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    batch_size: int = 1  # >1 sends concurrent prompts as one batched text completion (vLLM / OpenAI-compatible)
+    batch_wait_ms: float = 5
+    input_cost_per_1k: Optional[float] = None  # USD; None uses LiteLLM's price list
+    output_cost_per_1k: Optional[float] = None
+    capabilities: Optional[List[str]] = None  # None matches any required capability
+    stream_usage: bool = False  # Provider accepts stream_options to report token usage at the end of a stream
 
 @dataclass
 class TaskConfig:
@@ -30,15 +56,51 @@ class TaskConfig:
     priority_models: List[str]
     fallback_models: List[str]
     parameters: Dict[str, Any] = None
+    cache_ttl: Optional[int] = None  # Seconds; None uses the router default, 0 disables caching
+    hedge_percentile: Optional[float] = None  # e.g. 0.95: start the next model once a call outlasts this latency percentile
+    semantic_cache_threshold: Optional[float] = None  # e.g. 0.95: reuse responses to prompts this cosine-similar
+    prompt_token_budget: Optional[int] = None  # Caps context prompts; the model's context window always applies
+    context_priority: Optional[List[str]] = None  # Context sections, most important first; the rest are trimmed first
+    adaptive_routing: bool = False  # Order candidates by capability, SLO, cost and latency instead of statically
+    latency_slo: Optional[float] = None  # Seconds at slo_percentile a model must stay within
+    slo_percentile: float = 0.95
+    max_error_rate: float = 0.2
+    exploration_rate: float = 0.05
 
 class ModelRouter:
     """LiteLLM-based model router for managing model selection and interaction"""
     
-    def __init__(self, cache_size: int = 1000):
+    def __init__(self, cache_size: int = 1000, cache_ttl: int = 3600,
+                 cache_max_bytes: int = 64 * 1024 * 1024, cache_redis_url: Optional[str] = None):
         """Initialize the model router with configurations"""
         self.models: Dict[str, ModelConfig] = {}
         self.task_configs: Dict[str, TaskConfig] = {}
-        self.response_cache = lru_cache(maxsize=cache_size)(self._generate_completion)
+        self.response_cache = ResponseCache(
+            max_entries=cache_size,
+            max_bytes=cache_max_bytes,
+            default_ttl=cache_ttl,
+            redis_url=cache_redis_url or os.getenv("RESPONSE_CACHE_REDIS_URL")
+        )
+        # Similarity-matched responses; created when a task enables it
+        self.semantic_cache: Optional[SemanticCache] = None
+        # Concurrent identical requests share one in-flight provider call
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._inflight_waiters: Dict[asyncio.Task, int] = {}  # Callers awaiting each in-flight task
+        self.coalesced_requests = 0
+        self.rate_limiters: Dict[str, ModelRateLimiter] = {}
+        self.batchers: Dict[str, MicroBatcher] = {}
+        self.rate_limit_pause = 2.0  # Seconds to hold a model's queue after a provider 429
+        
+        # Rolling error rate, latency and circuit breaker per model
+        self.health: Dict[str, ModelHealth] = {}
+        self.hedge_min_samples = 20
+        self.hedge_default_delay = 2.0  # Used until a model has enough latency samples
+        self.hedged_requests = 0
+        
+        # Tokens, latency, cache hits and cost per task type and model
+        self.usage = UsageTracker()
+        self.prompt_budgeter = PromptBudgeter()
+        self.selector = AdaptiveSelector()
         
         # Initialize LiteLLM with default settings
         litellm.set_verbose = True
@@ -47,7 +109,25 @@ class ModelRouter:
     def add_model(self, model_config: ModelConfig) -> bool:
         """Add or update a model configuration"""
         try:
+            if self.models.get(model_config.model_name) == model_config:
+                return True  # Already registered (e.g. by another agent); keep its live state
             self.models[model_config.model_name] = model_config
+            self.health.setdefault(model_config.model_name, ModelHealth(model_config.model_name))
+            self.rate_limiters.pop(model_config.model_name, None)
+            if model_config.max_concurrency or model_config.requests_per_minute or model_config.tokens_per_minute:
+                self.rate_limiters[model_config.model_name] = ModelRateLimiter(
+                    model_config.model_name,
+                    max_concurrency=model_config.max_concurrency,
+                    requests_per_minute=model_config.requests_per_minute,
+                    tokens_per_minute=model_config.tokens_per_minute
+                )
+            self.batchers.pop(model_config.model_name, None)
+            if model_config.batch_size > 1:
+                self.batchers[model_config.model_name] = MicroBatcher(
+                    partial(self._dispatch_batch, model_config.model_name),
+                    max_batch_size=model_config.batch_size,
+                    max_wait_ms=model_config.batch_wait_ms
+                )
             logging.info(f"Added model configuration: {model_config.model_name}")
             return True
         except Exception as e:
@@ -58,43 +138,112 @@ class ModelRouter:
         """Add or update a task configuration"""
         try:
             self.task_configs[task_config.task_type] = task_config
+            if task_config.semantic_cache_threshold is not None and self.semantic_cache is None:
+                self.enable_semantic_cache()
             logging.info(f"Added task configuration: {task_config.task_type}")
             return True
         except Exception as e:
             logging.error(f"Failed to add task configuration: {e}")
             return False
 
+    def enable_semantic_cache(self, embed=None, max_entries: int = 1000) -> bool:
+        """Turn on the semantic cache tier, by default with SemanticMemory's local embedding model"""
+        try:
+            self.semantic_cache = SemanticCache(embed=embed, max_entries=max_entries)
+            logging.info("Enabled semantic response cache")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to enable semantic cache: {e}")
+            return False
+
     def _get_cache_key(self, prompt: str, model_name: str, parameters: Dict[str, Any]) -> str:
         """Generate a cache key for a specific request"""
         key_content = f"{prompt}:{model_name}:{json.dumps(parameters, sort_keys=True)}"
         return hashlib.sha256(key_content.encode()).hexdigest()
 
+    @staticmethod
+    def _estimate_tokens(prompt: Any, max_tokens: int) -> int:
+        """Rough prompt plus completion token count used for tokens-per-minute admission"""
+        return len(str(prompt)) // 4 + max_tokens
+
+    def _estimate_cost(self, model_name: str, prompt_tokens: int, completion_tokens: int,
+                       response: Any) -> float:
+        """Estimated USD cost of a response from configured prices or LiteLLM's price list"""
+        model_config = self.models.get(model_name)
+        if model_config and (model_config.input_cost_per_1k is not None
+                             or model_config.output_cost_per_1k is not None):
+            return (prompt_tokens * (model_config.input_cost_per_1k or 0.0)
+                    + completion_tokens * (model_config.output_cost_per_1k or 0.0)) / 1000
+        try:
+            return float(litellm.completion_cost(completion_response=response) or 0.0)
+        except Exception:
+            return 0.0  # Model missing from the price list
+
+    def _record_usage(self, task_type: str, model_name: str, prompt: Any, response: Any,
+                      source: str, latency: float):
+        """Account a served response, estimating usage the provider did not report (batches, some streams)"""
+        try:
+            usage = getattr(response, "usage", None)
+            prompt_tokens = getattr(usage, "prompt_tokens", None)
+            completion_tokens = getattr(usage, "completion_tokens", None)
+            if prompt_tokens is None or completion_tokens is None or not (prompt_tokens or completion_tokens):
+                prompt_tokens = len(str(prompt)) // 4
+                completion_tokens = len(response.choices[0].message.content or "") // 4
+            cost = self._estimate_cost(model_name, prompt_tokens, completion_tokens, response)
+            self.usage.record(task_type, model_name, source, latency,
+                              prompt_tokens, completion_tokens, cost)
+        except Exception as e:
+            logging.error(f"Failed to record model usage: {e}")
+
+    def _build_request(self, prompt: str, model_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Build LiteLLM completion arguments for a model"""
+        model_config = self.models[model_name]
+        
+        # Merge model config parameters with request parameters
+        # Merge base parameters
+        merged_params = {}
+        if model_config.parameters:
+            merged_params.update(model_config.parameters)
+        if parameters:
+            merged_params.update(parameters)
+            
+        # Add default parameters if not specified
+        merged_params["temperature"] = merged_params.get("temperature", model_config.temperature)
+        merged_params["max_tokens"] = merged_params.get("max_tokens", model_config.max_tokens)
+        
+        return dict(
+            model=model_config.model_name,
+            messages=[{"role": "user", "content": prompt}],
+            api_key=model_config.api_key,
+            timeout=model_config.timeout,
+            **merged_params
+        )
+
     @backoff.on_exception(backoff.expo, Exception, max_tries=3)
     async def _generate_completion(self, prompt: str, model_name: str, 
-                                 parameters: Dict[str, Any]) -> ModelResponse:
+                                 parameters: Dict[str, Any], task_type: str = "default") -> ModelResponse:
         """Generate completion with retry logic"""
         try:
-            model_config = self.models[model_name]
+            batcher = self.batchers.get(model_name)
+            if batcher is not None and isinstance(prompt, str):
+                return await batcher.submit(prompt, parameters or {})
             
-            # Merge model config parameters with request parameters
-            # Merge base parameters
-            merged_params = {}
-            if model_config.parameters:
-                merged_params.update(model_config.parameters)
-            if parameters:
-                merged_params.update(parameters)
-                
-            # Add default parameters if not specified
-            merged_params["temperature"] = parameters.get("temperature", model_config.temperature)
-            merged_params["max_tokens"] = parameters.get("max_tokens", model_config.max_tokens)
+            request = self._build_request(prompt, model_name, parameters)
             
-            response = await completion(
-                model=model_config.model_name,
-                messages=[{"role": "user", "content": prompt}],
-                api_key=model_config.api_key,
-                timeout=model_config.timeout,
-                **merged_params
-            )
+            limiter = self.rate_limiters.get(model_name)
+            if limiter is None:
+                return await acompletion(**request)
+            
+            # Each retry queues again, so backoff cannot exceed the model's limits
+            estimated_tokens = self._estimate_tokens(prompt, request["max_tokens"])
+            async with limiter.slot(task_type, estimated_tokens):
+                try:
+                    response = await acompletion(**request)
+                except litellm.RateLimitError:
+                    limiter.pause(self.rate_limit_pause)
+                    raise
+            usage = getattr(response, "usage", None)
+            limiter.settle(estimated_tokens, getattr(usage, "total_tokens", None))
             
             return response
             
@@ -102,42 +251,258 @@ class ModelRouter:
             logging.error(f"Model completion failed for {model_name}: {e}")
             raise
 
+    async def _dispatch_batch(self, model_name: str, prompts: List[str],
+                              parameters: Dict[str, Any]) -> List[ModelResponse]:
+        """Send a batch of prompts as one multi-prompt text completion and split the choices"""
+        request = self._build_request(prompts[0], model_name, parameters)
+        request.pop("messages")
+        limiter = self.rate_limiters.get(model_name)
+        estimated_tokens = sum(self._estimate_tokens(prompt, request["max_tokens"]) for prompt in prompts)
+        
+        async with limiter.slot("batch", estimated_tokens) if limiter else nullcontext():
+            try:
+                batch_response = await litellm.atext_completion(prompt=prompts, **request)
+            except litellm.RateLimitError:
+                if limiter:
+                    limiter.pause(self.rate_limit_pause)
+                raise
+        if limiter:
+            usage = getattr(batch_response, "usage", None)
+            limiter.settle(estimated_tokens, getattr(usage, "total_tokens", None))
+        
+        # Choices carry the index of the prompt they answer; present each as a chat response
+        responses: List[Optional[ModelResponse]] = [None] * len(prompts)
+        for position, choice in enumerate(batch_response.choices):
+            index = getattr(choice, "index", None)
+            index = position if index is None else index
+            responses[index] = ModelResponse(
+                model=getattr(batch_response, "model", model_name),
+                choices=[{
+                    "index": 0,
+                    "finish_reason": getattr(choice, "finish_reason", None),
+                    "message": {"role": "assistant", "content": choice.text}
+                }]
+            )
+        if any(response is None for response in responses):
+            raise ValueError(f"Batched completion from {model_name} is missing choices")
+        return responses
+
+    def _prepare_prompt(self, task_config: TaskConfig, model_name: str, prompt: str,
+                        context: Optional[Dict[str, Any]], parameters: Dict[str, Any]) -> str:
+        """Render the prompt for one model, fitting the context into the task's token budget"""
+        if context is None:
+            return prompt
+        budget = task_config.prompt_token_budget
+        max_tokens = parameters.get("max_tokens", self.models[model_name].max_tokens)
+        window = self.prompt_budgeter.model_input_limit(model_name, max_tokens)
+        if window is not None:
+            budget = min(budget, window) if budget else window
+        return self.prompt_budgeter.build(prompt, context, model_name, budget, task_config.context_priority)
+
+    def _candidate_models(self, task_config: TaskConfig) -> List[str]:
+        """Registered models to try for a task, in order"""
+        candidates = [
+            m for m in task_config.priority_models + task_config.fallback_models
+            if m in self.models
+        ]
+        if task_config.adaptive_routing and candidates:
+            return self.selector.rank(task_config, candidates, self.models, self.health)
+        return candidates
+
+    async def _generate_and_cache(self, cache_key: str, prompt: str, model_name: str,
+                                  parameters: Dict[str, Any], ttl: Optional[int],
+                                  task_type: str, embedding: Any = None) -> ModelResponse:
+        """Generate a completion and store it in the response cache"""
+        health = self.health.setdefault(model_name, ModelHealth(model_name))
+        if not health.allow_request():
+            raise CircuitOpenError(f"Circuit open for model {model_name}")
+        
+        started = time.monotonic()
+        try:
+            response = await self._generate_completion(prompt, model_name, parameters, task_type=task_type)
+        except asyncio.CancelledError:
+            health.release()
+            raise
+        except Exception:
+            health.record_failure()
+            raise
+        health.record_success(time.monotonic() - started)
+        if ttl != 0:
+            await self.response_cache.set(cache_key, response, ttl)
+        if embedding is not None:
+            self.semantic_cache.add(
+                self._get_cache_key("", model_name, parameters), cache_key, embedding, response,
+                self.response_cache.default_ttl if ttl is None else ttl
+            )
+        return response
+
+    def _finish_inflight(self, cache_key: str, task: asyncio.Task):
+        """Forget a finished in-flight request"""
+        if self._inflight.get(cache_key) is task:
+            del self._inflight[cache_key]
+        if not task.cancelled():
+            task.exception()  # Retrieved here in case every waiter was cancelled
+
+    def _latency_percentile(self, model_name: str, percentile: float) -> float:
+        """Latency at a percentile of a model's recent calls, or the default hedge delay"""
+        health = self.health.get(model_name)
+        if health is None or len(health.latencies) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return health.latency_percentile(percentile)
+
+    async def _semantic_lookup(self, prompt: str, model_name: str, parameters: Dict[str, Any],
+                               threshold: float) -> Tuple[Optional[ModelResponse], Any]:
+        """Find a cached response to a similar prompt; returns it (or None) with the prompt embedding"""
+        try:
+            embedding = await asyncio.to_thread(self.semantic_cache.embed_prompt, prompt)
+            match = self.semantic_cache.lookup(self._get_cache_key("", model_name, parameters), embedding, threshold)
+        except Exception as e:
+            logging.error(f"Semantic cache lookup failed: {e}")
+            return None, None
+        if match is None:
+            return None, embedding
+        
+        # Copy so the matched key is recorded without touching the cached object
+        matched_key, cached, similarity = match
+        response = copy.copy(cached)
+        response._hidden_params = {
+            **(getattr(cached, "_hidden_params", None) or {}),
+            "semantic_cache_key": matched_key,
+            "semantic_similarity": similarity
+        }
+        return response, embedding
+
+    async def _cached_completion(self, prompt: str, model_name: str, parameters: Dict[str, Any],
+                                 ttl: Optional[int], task_type: str = "default") -> ModelResponse:
+        """Serve a completion from the cache or an identical in-flight request, generating it otherwise"""
+        started = time.monotonic()
+        cache_key = self._get_cache_key(prompt, model_name, parameters)
+        if ttl != 0:
+            response = await self.response_cache.get(cache_key)
+            if response is not None:
+                self._record_usage(task_type, model_name, prompt, response, "exact", time.monotonic() - started)
+                return response
+        
+        embedding = None
+        task_config = self.task_configs.get(task_type)
+        if ttl != 0 and self.semantic_cache and task_config and task_config.semantic_cache_threshold is not None:
+            response, embedding = await self._semantic_lookup(
+                prompt, model_name, parameters, task_config.semantic_cache_threshold
+            )
+            if response is not None:
+                self._record_usage(task_type, model_name, prompt, response, "semantic", time.monotonic() - started)
+                return response
+        
+        source = "miss"
+        task = self._inflight.get(cache_key)
+        if task is not None:
+            self.coalesced_requests += 1
+            source = "coalesced"
+        else:
+            task = asyncio.ensure_future(
+                self._generate_and_cache(cache_key, prompt, model_name, parameters, ttl, task_type, embedding)
+            )
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda done: self._finish_inflight(cache_key, done))
+        
+        # Shielded so one caller's cancellation does not fail the others;
+        # the provider call itself is cancelled once nobody is waiting for it
+        self._inflight_waiters[task] = self._inflight_waiters.get(task, 0) + 1
+        try:
+            response = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._inflight_waiters[task] == 1 and not task.done():
+                task.cancel()
+            raise
+        except Exception:
+            self.usage.record_error(task_type, model_name, time.monotonic() - started)
+            raise
+        finally:
+            self._inflight_waiters[task] -= 1
+            if not self._inflight_waiters[task]:
+                del self._inflight_waiters[task]
+        self._record_usage(task_type, model_name, prompt, response, source, time.monotonic() - started)
+        return response
+
+    async def _route_hedged(self, task_type: str, task_config: TaskConfig, candidates: List[str],
+                            prompt: str, parameters: Dict[str, Any],
+                            context: Optional[Dict[str, Any]] = None) -> ModelResponse:
+        """Race candidates in order, starting the next once the latest outlasts its latency percentile.
+
+        A failed attempt starts the next candidate immediately. The first
+        success wins and the remaining attempts are cancelled.
+        """
+        remaining = list(candidates)
+        pending: Dict[asyncio.Task, str] = {}
+        
+        def launch():
+            model_name = remaining.pop(0)
+            attempt = asyncio.ensure_future(self._cached_completion(
+                self._prepare_prompt(task_config, model_name, prompt, context, parameters),
+                model_name, parameters, task_config.cache_ttl, task_type
+            ))
+            pending[attempt] = model_name
+            return model_name
+        
+        latest = launch()
+        try:
+            while pending:
+                timeout = None
+                if remaining:
+                    timeout = self._latency_percentile(latest, task_config.hedge_percentile)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedged_requests += 1
+                    logging.info(f"Model {latest} exceeded {timeout:.2f}s; hedging with {remaining[0]}")
+                    latest = launch()
+                    continue
+                
+                for attempt in done:
+                    model_name = pending.pop(attempt)
+                    if attempt.exception() is None:
+                        logging.info(f"Successfully routed task to model: {model_name}")
+                        return attempt.result()
+                    logging.warning(f"Model {model_name} failed: {attempt.exception()}")
+                if not pending and remaining:
+                    latest = launch()
+        finally:
+            for attempt in pending:
+                attempt.cancel()
+        
+        raise Exception("All models failed for the task")
+
     async def route_task(self, task_type: str, prompt: str, 
-                        parameters: Optional[Dict[str, Any]] = None) -> Optional[ModelResponse]:
-        """Route a task to appropriate model and get response"""
+                        parameters: Optional[Dict[str, Any]] = None,
+                        context: Optional[Dict[str, Any]] = None) -> Optional[ModelResponse]:
+        """Route a task to appropriate model and get response.
+
+        With a context dict, the prompt is an instruction and the context is
+        appended as compact JSON fitted to each model's token budget.
+        """
         try:
             if task_type not in self.task_configs:
                 raise ValueError(f"Unknown task type: {task_type}")
                 
             task_config = self.task_configs[task_type]
-            parameters = parameters or {}
+            # Task-level defaults (e.g. sampling settings) under per-request overrides
+            parameters = {**(task_config.parameters or {}), **(parameters or {})}
             
-            # Try priority models first
-            for model_name in task_config.priority_models:
-                if model_name not in self.models:
-                    continue
-                    
-                try:
-                    cache_key = self._get_cache_key(prompt, model_name, parameters)
-                    response = await self.response_cache(prompt, model_name, parameters)
-                    logging.info(f"Successfully routed task to model: {model_name}")
-                    return response
-                except Exception as e:
-                    logging.warning(f"Priority model {model_name} failed: {e}")
-                    continue
+            # Priority then fallback models, or as ranked by the adaptive selector
+            candidates = self._candidate_models(task_config)
+            if task_config.hedge_percentile is not None and candidates:
+                return await self._route_hedged(task_type, task_config, candidates, prompt, parameters, context)
             
-            # Try fallback models
-            for model_name in task_config.fallback_models:
-                if model_name not in self.models:
-                    continue
-                    
+            for model_name in candidates:
+                role = "fallback model" if model_name in task_config.fallback_models else "model"
                 try:
-                    cache_key = self._get_cache_key(prompt, model_name, parameters)
-                    response = await self.response_cache(prompt, model_name, parameters)
-                    logging.info(f"Successfully routed task to fallback model: {model_name}")
+                    response = await self._cached_completion(
+                        self._prepare_prompt(task_config, model_name, prompt, context, parameters),
+                        model_name, parameters, task_config.cache_ttl, task_type
+                    )
+                    logging.info(f"Successfully routed task to {role}: {model_name}")
                     return response
                 except Exception as e:
-                    logging.warning(f"Fallback model {model_name} failed: {e}")
+                    logging.warning(f"{role.capitalize()} {model_name} failed: {e}")
                     continue
             
             raise Exception("All models failed for the task")
@@ -146,6 +511,160 @@ class ModelRouter:
             logging.error(f"Task routing failed: {e}")
             return None
 
+    @staticmethod
+    def _assemble_stream(chunks: List[Any], prompt: str) -> Optional[ModelResponse]:
+        """Rebuild the complete response, including usage, from streamed chunks"""
+        try:
+            return litellm.stream_chunk_builder(chunks, messages=[{"role": "user", "content": prompt}])
+        except Exception as e:
+            logging.error(f"Failed to assemble streamed response: {e}")
+            return None
+
+    async def _stream_completion(self, prompt: str, model_name: str, parameters: Dict[str, Any],
+                                 task_type: str, result: Dict[str, Any]) -> AsyncIterator[Any]:
+        """Stream raw completion chunks from one model, holding its rate-limit slot throughout.
+
+        Once the stream completes, the assembled response is stored in
+        result["response"] and the rate limiter is settled with the usage the
+        provider reported, or an estimate from the streamed text without it.
+        """
+        request = self._build_request(prompt, model_name, parameters)
+        limiter = self.rate_limiters.get(model_name)
+        estimated_tokens = self._estimate_tokens(prompt, request["max_tokens"])
+        chunks = []
+        async with limiter.slot(task_type, estimated_tokens) if limiter else nullcontext():
+            try:
+                if self.models[model_name].stream_usage:
+                    # Ask for the provider's own token counts in a final usage chunk
+                    request.setdefault("stream_options", {"include_usage": True})
+                stream = await acompletion(stream=True, **request)
+            except litellm.RateLimitError:
+                if limiter:
+                    limiter.pause(self.rate_limit_pause)
+                raise
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        
+        response = self._assemble_stream(chunks, prompt) if chunks else None
+        result["response"] = response
+        if limiter:
+            actual_tokens = self._reported_stream_tokens(chunks)
+            if actual_tokens is None:
+                text = "".join(self._chunk_text(chunk) for chunk in chunks)
+                actual_tokens = len(str(prompt)) // 4 + len(text) // 4
+            limiter.settle(estimated_tokens, actual_tokens)
+
+    @staticmethod
+    def _reported_stream_tokens(chunks: List[Any]) -> Optional[int]:
+        """Total tokens from a provider usage chunk, or None if the stream carried none"""
+        for chunk in reversed(chunks):
+            usage = chunk.get("usage") if isinstance(chunk, dict) else getattr(chunk, "usage", None)
+            total = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+            if total:
+                return total
+        return None
+
+    @staticmethod
+    def _chunk_text(chunk: Any) -> str:
+        """Text delta carried by a streamed chunk; deltas may be objects or plain dicts"""
+        choices = chunk.get("choices") if isinstance(chunk, dict) else getattr(chunk, "choices", None)
+        if choices is not None and not choices:
+            return ""  # e.g. the trailing usage-only chunk
+        if choices:
+            choice = choices[0]
+            delta = choice.get("delta") if isinstance(choice, dict) else getattr(choice, "delta", None)
+            if isinstance(delta, dict):
+                return delta.get("content") or ""
+            if delta is not None and hasattr(delta, "content"):
+                return delta.content or ""
+        logging.warning(f"Unrecognized stream chunk shape, no text delta: {type(chunk).__name__} {chunk!r:.200}")
+        return ""
+
+    async def route_task_stream(self, task_type: str, prompt: str,
+                                parameters: Optional[Dict[str, Any]] = None,
+                                context: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Route a task and yield response text deltas as the model generates them.
+
+        Models are tried in routing order, but only until one produces its
+        first token; a failure after that is raised to the caller. Cached
+        responses are yielded whole, and a completed stream is assembled and
+        cached for later calls. A context dict is budgeted as in route_task.
+        """
+        if task_type not in self.task_configs:
+            raise ValueError(f"Unknown task type: {task_type}")
+        task_config = self.task_configs[task_type]
+        parameters = {**(task_config.parameters or {}), **(parameters or {})}
+        
+        instruction = prompt
+        for model_name in self._candidate_models(task_config):
+            started = time.monotonic()
+            prompt = self._prepare_prompt(task_config, model_name, instruction, context, parameters)
+            cache_key = self._get_cache_key(prompt, model_name, parameters)
+            if task_config.cache_ttl != 0:
+                cached = await self.response_cache.get(cache_key)
+                if cached is not None:
+                    self._record_usage(task_type, model_name, prompt, cached, "exact", time.monotonic() - started)
+                    yield cached.choices[0].message.content or ""
+                    return
+            
+            health = self.health.setdefault(model_name, ModelHealth(model_name))
+            if not health.allow_request():
+                logging.warning(f"Skipping model {model_name}: circuit open")
+                continue
+            
+            streamed: Dict[str, Any] = {}
+            stream = self._stream_completion(prompt, model_name, parameters, task_type, streamed)
+            chunks = []
+            try:
+                try:
+                    chunks.append(await stream.__anext__())
+                except StopAsyncIteration:
+                    pass
+                except asyncio.CancelledError:
+                    health.release()
+                    raise
+                except Exception as e:
+                    health.record_failure()
+                    self.usage.record_error(task_type, model_name, time.monotonic() - started)
+                    logging.warning(f"Model {model_name} failed before streaming: {e}")
+                    continue
+                health.record_first_token(time.monotonic() - started)
+                
+                # Committed to this model from the first token on
+                try:
+                    if chunks and (delta := self._chunk_text(chunks[0])):
+                        yield delta
+                    async for chunk in stream:
+                        chunks.append(chunk)
+                        if delta := self._chunk_text(chunk):
+                            yield delta
+                except Exception:
+                    health.record_failure()
+                    self.usage.record_error(task_type, model_name, time.monotonic() - started)
+                    raise
+                except BaseException:
+                    health.release()  # Cancelled, or the consumer stopped early
+                    raise
+            finally:
+                await stream.aclose()
+            
+            latency = time.monotonic() - started
+            health.record_success(latency)
+            logging.info(f"Successfully streamed task from model: {model_name}")
+            response = streamed.get("response")
+            if response is not None:
+                try:
+                    self._record_usage(task_type, model_name, prompt, response, "miss", latency)
+                    if task_config.cache_ttl != 0:
+                        await self.response_cache.set(cache_key, response, task_config.cache_ttl)
+                except Exception as e:
+                    logging.error(f"Failed to record or cache streamed response: {e}")
+            return
+        
+        logging.error(f"Task routing failed: all models failed for streamed task {task_type}")
+        raise Exception("All models failed for the task")
+
     def get_model_status(self, model_name: str) -> Dict[str, Any]:
         """Get current status and metadata for a specific model"""
         try:
@@ -153,14 +672,26 @@ class ModelRouter:
             return {
                 "name": model_config.model_name,
                 "provider": model_config.provider,
-                "available": True,  # Add actual availability check if possible
+                "available": self.health[model_name].available,
+                "health": self.health[model_name].get_stats(),
                 "parameters": model_config.parameters,
+                "rate_limits": self.rate_limiters[model_name].get_stats() if model_name in self.rate_limiters else None,
                 "last_checked": datetime.utcnow().isoformat()
             }
         except Exception as e:
             logging.error(f"Failed to get model status: {e}")
             return {}
 
+    def _routing_status(self, model_name: str) -> Dict[str, Any]:
+        """Availability of a routing candidate, including its circuit breaker"""
+        health = self.health.get(model_name)
+        return {
+            "name": model_name,
+            "available": model_name in self.models and health is not None and health.available,
+            "circuit": health.state if health else None,
+            "error_rate": health.error_rate if health else None
+        }
+
     def get_task_routing_info(self, task_type: str) -> Dict[str, Any]:
         """Get routing information for a specific task type"""
         try:
@@ -168,23 +699,51 @@ class ModelRouter:
             return {
                 "task_type": task_config.task_type,
                 "capabilities": task_config.required_capabilities,
-                "priority_models": [
-                    {"name": m, "available": m in self.models}
-                    for m in task_config.priority_models
-                ],
-                "fallback_models": [
-                    {"name": m, "available": m in self.models}
-                    for m in task_config.fallback_models
-                ]
+                "priority_models": [self._routing_status(m) for m in task_config.priority_models],
+                "fallback_models": [self._routing_status(m) for m in task_config.fallback_models],
+                "hedge_percentile": task_config.hedge_percentile,
+                "adaptive_routing": task_config.adaptive_routing,
+                "latency_slo": task_config.latency_slo
             }
         except Exception as e:
             logging.error(f"Failed to get task routing info: {e}")
             return {}
 
+    def get_rate_limit_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get queue depth, in-flight and admission counters for each rate-limited model"""
+        return {model_name: limiter.get_stats() for model_name, limiter in self.rate_limiters.items()}
+
+    def get_batch_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get request, batch and average batch size counters for each micro-batched model"""
+        return {model_name: batcher.get_stats() for model_name, batcher in self.batchers.items()}
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get response cache hit/miss counters, occupancy and request coalescing"""
+        return {
+            **self.response_cache.get_stats(),
+            "coalesced": self.coalesced_requests,
+            "in_flight": len(self._inflight),
+            "semantic": self.semantic_cache.get_stats() if self.semantic_cache else None
+        }
+
+    def get_selection_stats(self) -> Dict[str, Any]:
+        """Get how often adaptive routing chose each model first, per task type"""
+        return self.selector.get_stats()
+
+    def get_usage_stats(self) -> Dict[str, Any]:
+        """Get token, latency, cache-hit and estimated cost totals by task type and model"""
+        return self.usage.get_stats()
+
+    def get_prompt_stats(self) -> Dict[str, Any]:
+        """Get token counts before and after prompt compaction and budgeting"""
+        return self.prompt_budgeter.get_stats()
+
     def clear_cache(self):
         """Clear the response cache"""
         try:
-            self.response_cache.cache_clear()
+            self.response_cache.clear()
+            if self.semantic_cache:
+                self.semantic_cache.clear()
             logging.info("Successfully cleared model response cache")
         except Exception as e:
             logging.error(f"Failed to clear cache: {e}")
@@ -192,8 +751,43 @@ class ModelRouter:
     async def shutdown(self):
         """Clean shutdown of the model router"""
         try:
+            for batcher in self.batchers.values():
+                await batcher.close()
             self.clear_cache()
-            # Add any additional cleanup needed
+            await self.response_cache.close()
             logging.info("Successfully shut down model router")
         except Exception as e:
             logging.error(f"Error during shutdown: {e}")
+
+# Process-wide routers so agents share one response cache, rate limiters and health state
+_shared_routers: Dict[str, ModelRouter] = {}
+_http_client = None
+
+def _ensure_http_pool(max_connections: int = 100, max_keepalive_connections: int = 20):
+    """Give LiteLLM one keep-alive HTTP client; httpx pools connections per provider host"""
+    global _http_client
+    if _http_client is None and httpx is not None:
+        _http_client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        ))
+        litellm.aclient_session = _http_client
+
+def get_shared_router(name: str = "default", **kwargs) -> ModelRouter:
+    """Get or create a process-wide ModelRouter; kwargs only apply when it is first created"""
+    if name not in _shared_routers:
+        _ensure_http_pool()
+        _shared_routers[name] = ModelRouter(**kwargs)
+    return _shared_routers[name]
+
+async def close_shared_routers():
+    """Shut down every shared router and close the pooled HTTP client"""
+    global _http_client
+    for router in _shared_routers.values():
+        await router.shutdown()
+    _shared_routers.clear()
+    if _http_client is not None:
+        if litellm.aclient_session is _http_client:
+            litellm.aclient_session = None
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,79 @@
+from typing import Dict, Any, Optional, List
+import random
+import logging
+import litellm
+
+class AdaptiveSelector:
+    """Orders a task's candidate models by observed performance instead of static priority.
+
+    Models lacking a required capability are skipped. The rest are ranked
+    with those meeting the task's SLO (latency at slo_percentile and error
+    rate) first, then by price per token, then by latency, with the static
+    priority/fallback order breaking ties. With probability
+    exploration_rate a random other candidate goes first, favouring the
+    least observed, so rankings keep being re-checked.
+    """
+
+    def __init__(self, min_samples: int = 10, seed: Optional[int] = None):
+        """Initialize; models with fewer than min_samples latencies count as unmeasured"""
+        self.min_samples = min_samples
+        self.random = random.Random(seed)
+        self.stats: Dict[str, Dict[str, int]] = {}  # task type -> model -> times ranked first
+        self.explorations = 0
+
+    @staticmethod
+    def capable(model_config, required: List[str]) -> bool:
+        """Whether a model declares every required capability; undeclared capabilities match anything"""
+        if model_config.capabilities is None:
+            return True
+        return set(required) <= set(model_config.capabilities)
+
+    @staticmethod
+    def unit_cost(model_config) -> Optional[float]:
+        """USD per 1k prompt plus 1k completion tokens, from configured or LiteLLM prices"""
+        if model_config.input_cost_per_1k is not None or model_config.output_cost_per_1k is not None:
+            return (model_config.input_cost_per_1k or 0.0) + (model_config.output_cost_per_1k or 0.0)
+        prices = getattr(litellm, "model_cost", {}).get(model_config.model_name)
+        if not prices:
+            return None  # Unknown cost ranks after priced models
+        return 1000 * (prices.get("input_cost_per_token", 0.0) + prices.get("output_cost_per_token", 0.0))
+
+    def rank(self, task_config, candidates: List[str], models: Dict[str, Any],
+             health: Dict[str, Any]) -> List[str]:
+        """Candidates in the order they should be tried"""
+        eligible = [m for m in candidates if self.capable(models[m], task_config.required_capabilities)]
+        if not eligible:
+            logging.warning(f"No model declares capabilities {task_config.required_capabilities} "
+                            f"for {task_config.task_type}; using static order")
+            eligible = list(candidates)
+
+        def score(position: int, model_name: str):
+            model_health = health.get(model_name)
+            measured = model_health is not None and len(model_health.latencies) >= self.min_samples
+            latency = model_health.latency_percentile(task_config.slo_percentile) if measured else None
+            error_rate = model_health.error_rate if model_health is not None else 0.0
+            meets_slo = error_rate <= task_config.max_error_rate and (
+                task_config.latency_slo is None or latency is None or latency <= task_config.latency_slo
+            )
+            cost = self.unit_cost(models[model_name])
+            return (not meets_slo, cost is None, cost or 0.0, latency is None, latency or 0.0, position)
+
+        ranked = [m for _, m in sorted((score(i, m), m) for i, m in enumerate(eligible))]
+
+        if len(ranked) > 1 and self.random.random() < task_config.exploration_rate:
+            others = ranked[1:]
+            fewest = min(len(health[m].latencies) if m in health else 0 for m in others)
+            explore = self.random.choice(
+                [m for m in others if (len(health[m].latencies) if m in health else 0) == fewest]
+            )
+            ranked.remove(explore)
+            ranked.insert(0, explore)
+            self.explorations += 1
+
+        task_stats = self.stats.setdefault(task_config.task_type, {})
+        task_stats[ranked[0]] = task_stats.get(ranked[0], 0) + 1
+        return ranked
+
+    def get_stats(self) -> Dict[str, Any]:
+        """How often each model was chosen first per task type, and exploration count"""
+        return {"selections": self.stats, "explorations": self.explorations}
@@ -0,0 +1,142 @@
+from typing import Dict, Any, Optional, List
+import json
+import logging
+import litellm
+
+def compact_json(value: Any) -> str:
+    """JSON without indentation or spaces after separators"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+class PromptBudgeter:
+    """Renders a prompt from an instruction and a context dict within a token budget.
+
+    The context is serialized as compact JSON. Repeated sub-objects are
+    replaced by a {"$ref": path} to their first occurrence, walking sections
+    from most to least important so references point into the sections that
+    are trimmed last. If the prompt is still over budget, the lowest
+    priority sections are shrunk (long strings cut, lists truncated with a
+    count of omitted items) or replaced by a one-line summary.
+    """
+
+    def __init__(self, dedupe_min_chars: int = 64):
+        """Initialize; sub-objects shorter than dedupe_min_chars are never replaced by references"""
+        self.dedupe_min_chars = dedupe_min_chars
+        self.stats = {"prompts": 0, "trimmed": 0, "tokens_in": 0, "tokens_out": 0}
+
+    @staticmethod
+    def count_tokens(model_name: str, text: str) -> int:
+        """Token count with the model's tokenizer, or a characters/4 estimate if LiteLLM has none"""
+        try:
+            return litellm.token_counter(model=model_name, text=text)
+        except Exception:
+            return len(text) // 4 + 1
+
+    @staticmethod
+    def model_input_limit(model_name: str, max_tokens: int) -> Optional[int]:
+        """Prompt tokens that fit the model's context window next to max_tokens of completion"""
+        try:
+            window = litellm.get_model_info(model_name).get("max_input_tokens")
+            return max(1, window - max_tokens) if window else None
+        except Exception:
+            return None  # Unknown model
+
+    def _dedupe(self, value: Any, path: str, seen: Dict[str, str], serialized: Optional[str] = None) -> Any:
+        if not isinstance(value, (dict, list)):
+            return value
+        serialized = serialized if serialized is not None else compact_json(value)
+        if len(serialized) >= self.dedupe_min_chars:
+            if serialized in seen:
+                return {"$ref": seen[serialized]}
+            seen[serialized] = path
+        if isinstance(value, dict):
+            return {key: self._dedupe(item, f"{path}.{key}", seen) for key, item in value.items()}
+        return [self._dedupe(item, f"{path}[{index}]", seen) for index, item in enumerate(value)]
+
+    @staticmethod
+    def _summary(value: Any) -> str:
+        if isinstance(value, list):
+            return f"[{len(value)} items omitted]"
+        if isinstance(value, dict):
+            return f"[{len(value)} fields omitted]"
+        return "[omitted]"
+
+    def _shrink(self, value: Any, max_chars: int) -> Any:
+        """Cut a value down to roughly max_chars of compact JSON"""
+        serialized = compact_json(value)
+        if len(serialized) <= max_chars:
+            return value
+        if isinstance(value, str):
+            return value[:max(0, max_chars - 16)] + "...[truncated]"
+        if isinstance(value, list):
+            kept, used = [], 32  # Room for the omission marker
+            for item in value:
+                used += len(compact_json(item)) + 1
+                if used > max_chars:
+                    break
+                kept.append(item)
+            if not kept:
+                return [self._summary(value)]
+            return kept + [f"[{len(value) - len(kept)} more items omitted]"]
+        if isinstance(value, dict):
+            ratio = max_chars / len(serialized)
+            return {key: self._shrink(item, int(len(compact_json(item)) * ratio)) for key, item in value.items()}
+        return value
+
+    def build(self, instruction: str, context: Dict[str, Any], model_name: str,
+              budget: Optional[int] = None, priority: Optional[List[str]] = None) -> str:
+        """Render instruction plus context for a model, fitting budget tokens if given.
+
+        priority lists context keys from most to least important; keys not
+        listed rank below those listed, later keys lowest.
+        """
+        listed = [key for key in (priority or []) if key in context]
+        order = listed + [key for key in context if key not in listed]
+
+        raw = {key: compact_json(context[key]) for key in order}
+        seen: Dict[str, str] = {}
+        deduped = {key: self._dedupe(context[key], key, seen, raw[key]) for key in order}
+        sections = {key: deduped[key] for key in context}  # Original key order for rendering
+
+        def render() -> str:
+            body = compact_json(sections)
+            return f"{instruction}\n{body}" if instruction else body
+
+        text = render()
+        tokens = self.count_tokens(model_name, text)
+        self.stats["prompts"] += 1
+        # The undeduplicated context is estimated at the rendered prompt's characters per token
+        raw_chars = len(instruction) + 2 + sum(len(key) + len(raw[key]) + 4 for key in order)
+        self.stats["tokens_in"] += tokens * raw_chars // max(1, len(text))
+        if budget is None or tokens <= budget:
+            self.stats["tokens_out"] += tokens
+            return text
+
+        self.stats["trimmed"] += 1
+        for key in reversed(order):
+            section_text = compact_json(sections[key])
+            section_tokens = self.count_tokens(model_name, section_text)
+            keep = section_tokens - (tokens - budget)
+            if keep <= 0:
+                sections[key] = self._summary(sections[key])
+            else:
+                sections[key] = self._shrink(sections[key], len(section_text) * keep // section_tokens)
+            text = render()
+            tokens = self.count_tokens(model_name, text)
+            if tokens <= budget:
+                break
+
+        if tokens > budget:
+            # Shrinking is approximate (or the instruction alone is over); cut the text as a last resort
+            text = text[:len(text) * budget // tokens]
+            tokens = self.count_tokens(model_name, text)
+            logging.warning(f"Prompt for {model_name} truncated to fit {budget} tokens")
+        self.stats["tokens_out"] += tokens
+        return text
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Prompt counts and token totals before (estimated, without deduplication) and after budgeting"""
+        tokens_in = self.stats["tokens_in"]
+        return {
+            **self.stats,
+            "reduction": 1 - self.stats["tokens_out"] / tokens_in if tokens_in else 0.0
+        }
@@ -0,0 +1,158 @@
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+import time
+import asyncio
+import logging
+
+class TokenBucket:
+    """Refills continuously up to a per-minute capacity; the balance may go negative to record debt"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until amount can be taken; requests larger than capacity wait for a full bucket"""
+        self._refill()
+        needed = min(amount, self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+class ModelRateLimiter:
+    """Per-model admission control: in-flight cap, requests/minute and tokens/minute.
+
+    Waiters queue per task type and are admitted round-robin across task
+    types by a single dispatcher, so one busy task type cannot starve the
+    others. Token usage is estimated at admission and settled against the
+    provider-reported usage afterwards.
+    """
+
+    def __init__(self, model_name: str, max_concurrency: Optional[int] = None,
+                 requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None):
+        """Create the limiter; a limit of None is disabled"""
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._released = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._resume_at = 0.0
+        self.in_flight = 0
+        self.stats = {"admitted": 0, "throttled": 0, "paused": 0, "wait_seconds": 0.0}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _next_waiter(self) -> Optional[Tuple[asyncio.Future, float]]:
+        """Pop the head waiter of the next task type in round-robin order"""
+        while self._queues:
+            task_type, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            # Rotate this task type to the back so the others get the next turn
+            del self._queues[task_type]
+            if queue:
+                self._queues[task_type] = queue
+            if not waiter[0].done():
+                return waiter
+        return None
+
+    async def _admit(self, estimated_tokens: float):
+        """Wait until one more request fits every limit, then reserve it"""
+        while True:
+            delay = max(0.0, self._resume_at - time.monotonic())
+            if self.requests:
+                delay = max(delay, self.requests.delay(1))
+            if self.tokens:
+                delay = max(delay, self.tokens.delay(estimated_tokens))
+            if self.max_concurrency and self.in_flight >= self.max_concurrency:
+                self._released.clear()
+                await self._released.wait()
+                continue
+            if delay <= 0:
+                break
+            self.stats["throttled"] += 1
+            await asyncio.sleep(delay)
+
+        self.in_flight += 1
+        if self.requests:
+            self.requests.take(1)
+        if self.tokens:
+            self.tokens.take(estimated_tokens)
+
+    async def _dispatch(self):
+        """Admit queued requests one at a time until the queues drain"""
+        while (waiter := self._next_waiter()) is not None:
+            future, estimated_tokens = waiter
+            await self._admit(estimated_tokens)
+            if future.done():
+                self._release()  # Waiter was cancelled while we were admitting it
+            else:
+                future.set_result(None)
+        self._dispatcher = None
+
+    def _release(self):
+        self.in_flight -= 1
+        self._released.set()
+
+    def settle(self, estimated_tokens: float, actual_tokens: Optional[float]):
+        """Correct the token bucket once the provider reports actual usage"""
+        if self.tokens and actual_tokens is not None:
+            self.tokens.take(actual_tokens - estimated_tokens)
+
+    def pause(self, seconds: float):
+        """Stop admitting requests for a while, e.g. after a provider 429"""
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+        self.stats["paused"] += 1
+        logging.warning(f"Rate limited by provider; pausing {self.model_name} for {seconds:.1f}s")
+
+    @asynccontextmanager
+    async def slot(self, task_type: str, estimated_tokens: float = 0):
+        """Hold an admitted request slot for the duration of a provider call"""
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(task_type, deque()).append((future, estimated_tokens))
+        if self._dispatcher is None:
+            self._dispatcher = asyncio.create_task(self._dispatch())
+
+        queued_at = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # Admitted just as the caller was cancelled
+            raise
+        self.stats["admitted"] += 1
+        self.stats["wait_seconds"] += time.monotonic() - queued_at
+        try:
+            yield
+        finally:
+            self._release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth per task type, in-flight count and admission counters"""
+        admitted = self.stats["admitted"]
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "queued_by_task": {task_type: len(queue) for task_type, queue in self._queues.items()},
+            "admitted": admitted,
+            "throttled": self.stats["throttled"],
+            "paused": self.stats["paused"],
+            "avg_wait_ms": 1000 * self.stats["wait_seconds"] / admitted if admitted else 0.0,
+            "requests_available": self.requests.tokens if self.requests else None,
+            "tokens_available": self.tokens.tokens if self.tokens else None
+        }
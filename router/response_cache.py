@@ -0,0 +1,149 @@
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import json
+import time
+import asyncio
+import logging
+from litellm import ModelResponse
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:
+    aioredis = None
+
+class ResponseCache:
+    """Async model response cache: an in-memory LRU in front of an optional Redis tier.
+
+    Entries carry their own TTL. The memory tier evicts least recently used
+    entries once either max_entries or max_bytes is exceeded; the Redis tier
+    lets responses survive restarts and be shared between processes.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 default_ttl: int = 3600, redis_url: Optional[str] = None,
+                 key_prefix: str = "llm_cache:"):
+        """Initialize the memory tier and, if a URL is given, the Redis tier"""
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.key_prefix = key_prefix
+
+        # key -> (expires_at, size, response)
+        self._entries: "OrderedDict[str, Tuple[float, int, ModelResponse]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = asyncio.Lock()
+        self.stats = {"hits": 0, "misses": 0, "memory_hits": 0, "redis_hits": 0,
+                      "sets": 0, "evictions": 0, "expirations": 0, "errors": 0}
+
+        self.redis = None
+        if redis_url:
+            if aioredis is None:
+                logging.error("redis is not installed; response cache Redis tier disabled")
+            else:
+                self.redis = aioredis.from_url(redis_url)
+
+    @staticmethod
+    def _dumps(response: ModelResponse) -> bytes:
+        """Serialize a response for size accounting and the Redis tier"""
+        data = response.model_dump() if hasattr(response, "model_dump") else dict(response)
+        return json.dumps(data, separators=(",", ":"), default=str).encode()
+
+    @staticmethod
+    def _loads(payload: bytes) -> ModelResponse:
+        return ModelResponse(**json.loads(payload))
+
+    def _evict(self):
+        """Drop least recently used entries until the memory tier fits its limits"""
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.stats["evictions"] += 1
+
+    def _remember(self, key: str, response: ModelResponse, size: int, expires_at: float):
+        """Insert or refresh an entry in the memory tier"""
+        if key in self._entries:
+            self._bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (expires_at, size, response)
+        self._bytes += size
+        self._evict()
+
+    async def get(self, key: str) -> Optional[ModelResponse]:
+        """Look a response up in memory, then Redis; None on a miss"""
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, size, response = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return response
+                del self._entries[key]
+                self._bytes -= size
+                self.stats["expirations"] += 1
+
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.get(self.key_prefix + key)
+                pipe.ttl(self.key_prefix + key)
+                payload, ttl = await pipe.execute()
+                if payload is not None:
+                    response = self._loads(payload)
+                    async with self._lock:
+                        self._remember(key, response, len(payload), time.time() + max(ttl, 1))
+                    self.stats["hits"] += 1
+                    self.stats["redis_hits"] += 1
+                    return response
+            except Exception as e:
+                self.stats["errors"] += 1
+                logging.error(f"Response cache Redis lookup failed: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, key: str, response: ModelResponse, ttl: Optional[int] = None):
+        """Cache a response for ttl seconds (the default TTL when None)"""
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        try:
+            payload = self._dumps(response)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logging.error(f"Failed to serialize response for caching: {e}")
+            return
+
+        async with self._lock:
+            self._remember(key, response, len(payload), time.time() + ttl)
+            self.stats["sets"] += 1
+
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.key_prefix + key, payload, ex=ttl)
+            except Exception as e:
+                self.stats["errors"] += 1
+                logging.error(f"Response cache Redis write failed: {e}")
+
+    def clear(self):
+        """Clear the memory tier; Redis entries expire on their own"""
+        self._entries.clear()
+        self._bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus current memory-tier occupancy"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes
+        }
+
+    async def close(self):
+        """Close the Redis tier connection"""
+        if self.redis is not None:
+            try:
+                await self.redis.aclose()
+            except Exception as e:
+                logging.error(f"Error closing response cache: {e}")
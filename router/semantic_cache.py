@@ -0,0 +1,109 @@
+from typing import Dict, Any, Optional, List, Callable, Tuple
+from collections import OrderedDict
+import re
+import time
+import hashlib
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def default_embedding_function() -> Callable[[List[str]], List[List[float]]]:
+    """The local MiniLM embedder ChromaDB (and so SemanticMemory) uses by default"""
+    from chromadb.utils import embedding_functions
+    return embedding_functions.DefaultEmbeddingFunction()
+
+class SemanticCache:
+    """Response cache matched by prompt embedding similarity rather than exact hash.
+
+    Entries are partitioned by scope (model and request parameters), so a
+    match never crosses models or sampling settings. Prompts are
+    whitespace-normalized before embedding and recent embeddings are
+    memoized, so trying several models for one prompt embeds it once.
+    """
+
+    def __init__(self, embed: Optional[Callable[[List[str]], List[List[float]]]] = None,
+                 max_entries: int = 1000, embedding_cache_size: int = 256):
+        """Initialize with an embedding function (defaults to ChromaDB's local model)"""
+        if np is None:
+            raise ImportError("numpy is required for the semantic cache")
+        self.embed = embed or default_embedding_function()
+        self.max_entries = max(1, max_entries)
+        self.embedding_cache_size = embedding_cache_size
+
+        # scope -> cache key -> (unit vector, response, expires_at)
+        self._scopes: Dict[str, "OrderedDict[str, Tuple[Any, Any, float]]"] = {}
+        self._embeddings: "OrderedDict[str, Any]" = OrderedDict()
+        self._embeddings_lock = threading.Lock()  # embed_prompt runs in worker threads
+        self._size = 0
+        self.stats = {"hits": 0, "misses": 0, "sets": 0, "evictions": 0}
+
+    @staticmethod
+    def _normalize(prompt: Any) -> str:
+        return re.sub(r"\s+", " ", str(prompt)).strip()
+
+    def embed_prompt(self, prompt: Any):
+        """Unit-length embedding of a prompt, memoized by normalized text"""
+        text = self._normalize(prompt)
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        with self._embeddings_lock:
+            if digest in self._embeddings:
+                self._embeddings.move_to_end(digest)
+                return self._embeddings[digest]
+
+        vector = np.asarray(self.embed([text])[0], dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self._embeddings_lock:
+            self._embeddings[digest] = vector
+            if len(self._embeddings) > self.embedding_cache_size:
+                self._embeddings.popitem(last=False)
+        return vector
+
+    def lookup(self, scope: str, vector, threshold: float) -> Optional[Tuple[str, Any, float]]:
+        """Most similar live entry in a scope at or above threshold, as (key, response, similarity)"""
+        entries = self._scopes.get(scope)
+        if entries:
+            now = time.time()
+            for key in [key for key, (_, _, expires_at) in entries.items() if expires_at <= now]:
+                del entries[key]
+                self._size -= 1
+        if not entries:
+            self.stats["misses"] += 1
+            return None
+
+        keys = list(entries)
+        similarities = np.stack([entries[key][0] for key in keys]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            self.stats["misses"] += 1
+            return None
+
+        entries.move_to_end(keys[best])
+        self.stats["hits"] += 1
+        return keys[best], entries[keys[best]][1], float(similarities[best])
+
+    def add(self, scope: str, key: str, vector, response: Any, ttl: int):
+        """Remember a response under its prompt embedding"""
+        entries = self._scopes.setdefault(scope, OrderedDict())
+        if key not in entries:
+            self._size += 1
+        entries[key] = (vector, response, time.time() + ttl)
+        entries.move_to_end(key)
+        self.stats["sets"] += 1
+
+        # Evict the least recently used entry of the largest scope until within bounds
+        while self._size > self.max_entries:
+            largest = max(self._scopes.values(), key=len)
+            largest.popitem(last=False)
+            self._size -= 1
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        self._scopes.clear()
+        self._embeddings.clear()
+        self._size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": self._size}
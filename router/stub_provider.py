@@ -0,0 +1,176 @@
+from typing import Dict, Any, Optional, List
+from dataclasses import dataclass
+import json
+import time
+import random
+import asyncio
+import logging
+from router.model_router import ModelConfig
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+@dataclass
+class StubProfile:
+    """Simulated behaviour of one stub model"""
+    latency_ms: float = 200  # Median time to first token
+    latency_sigma: float = 0.5  # Log-normal spread of the time to first token; 0 is fixed
+    tokens_per_second: float = 100  # Generation speed after the first token
+    completion_tokens: int = 64  # Tokens generated, capped by the request's max_tokens
+    error_rate: float = 0.0  # Fraction of requests answered with HTTP 500
+    rate_limit_rate: float = 0.0  # Fraction of requests answered with HTTP 429
+
+class StubProvider:
+    """Local OpenAI-compatible completion server for offline benchmarking.
+
+    Serves /v1/chat/completions (including streaming) and /v1/completions
+    (including multi-prompt batches) on localhost, so requests go through
+    LiteLLM's real OpenAI client and the shared HTTP pool. Each model name
+    can have its own StubProfile for latency, token rate and failures.
+    """
+
+    def __init__(self, profiles: Optional[Dict[str, StubProfile]] = None,
+                 default_profile: Optional[StubProfile] = None, seed: Optional[int] = None):
+        """Initialize with per-model profiles; unknown models use the default profile"""
+        if web is None:
+            raise ImportError("aiohttp is required for the stub provider")
+        self.profiles = profiles or {}
+        self.default_profile = default_profile or StubProfile()
+        self.random = random.Random(seed)
+        self.base_url: Optional[str] = None
+        self._runner = None
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _profile(self, model: str) -> StubProfile:
+        return self.profiles.get(model, self.default_profile)
+
+    def _count(self, model: str, outcome: str):
+        model_stats = self.stats.setdefault(model, {"requests": 0, "errors": 0, "rate_limited": 0})
+        model_stats["requests"] += 1
+        if outcome != "ok":
+            model_stats[outcome] += 1
+
+    def _first_token_delay(self, profile: StubProfile) -> float:
+        median = profile.latency_ms / 1000
+        if profile.latency_sigma <= 0:
+            return median
+        return self.random.lognormvariate(0, profile.latency_sigma) * median
+
+    def _failure(self, model: str, profile: StubProfile):
+        """An error response to send instead of a completion, or None"""
+        roll = self.random.random()
+        if roll < profile.rate_limit_rate:
+            self._count(model, "rate_limited")
+            return web.json_response({"error": {"message": "Rate limit exceeded", "type": "rate_limit_error"}},
+                                     status=429)
+        if roll < profile.rate_limit_rate + profile.error_rate:
+            self._count(model, "errors")
+            return web.json_response({"error": {"message": "Simulated server error", "type": "server_error"}},
+                                     status=500)
+        self._count(model, "ok")
+        return None
+
+    @staticmethod
+    def _text(prompt: Any, tokens: int) -> List[str]:
+        """Deterministic completion words for a prompt, one per token"""
+        seed = sum(str(prompt).encode()) % 997
+        return [f"w{(seed + i) % 1000}" for i in range(tokens)]
+
+    @staticmethod
+    def _usage(prompt: Any, completion_tokens: int) -> Dict[str, int]:
+        prompt_tokens = len(str(prompt)) // 4 + 1
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    async def _chat(self, request: "web.Request"):
+        body = await request.json()
+        model = body.get("model", "stub")
+        profile = self._profile(model)
+        failure = self._failure(model, profile)
+        tokens = min(profile.completion_tokens, body.get("max_tokens") or profile.completion_tokens)
+        prompt = body.get("messages", [{}])[-1].get("content", "")
+        words = self._text(prompt, tokens)
+        response_id = f"chatcmpl-stub-{int(time.time() * 1e6)}"
+
+        await asyncio.sleep(self._first_token_delay(profile))
+        if failure is not None:
+            return failure
+
+        if not body.get("stream"):
+            await asyncio.sleep(tokens / profile.tokens_per_second)
+            return web.json_response({
+                "id": response_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": self._usage(prompt, tokens)
+            })
+
+        stream = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await stream.prepare(request)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(1 / profile.tokens_per_second)
+            chunk = {
+                "id": response_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop" if i == len(words) - 1 else None,
+                             "delta": {"role": "assistant", "content": word if i == 0 else f" {word}"}}]
+            }
+            await stream.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage_chunk = {"id": response_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                           "model": model, "choices": [], "usage": self._usage(prompt, tokens)}
+            await stream.write(f"data: {json.dumps(usage_chunk)}\n\n".encode())
+        await stream.write(b"data: [DONE]\n\n")
+        await stream.write_eof()
+        return stream
+
+    async def _completions(self, request: "web.Request"):
+        body = await request.json()
+        model = body.get("model", "stub")
+        profile = self._profile(model)
+        failure = self._failure(model, profile)
+        prompts = body.get("prompt", "")
+        prompts = prompts if isinstance(prompts, list) else [prompts]
+        tokens = min(profile.completion_tokens, body.get("max_tokens") or profile.completion_tokens)
+
+        # A batch decodes its prompts in parallel, so it takes as long as one
+        await asyncio.sleep(self._first_token_delay(profile) + tokens / profile.tokens_per_second)
+        if failure is not None:
+            return failure
+
+        usage = self._usage("".join(map(str, prompts)), tokens * len(prompts))
+        return web.json_response({
+            "id": f"cmpl-stub-{int(time.time() * 1e6)}", "object": "text_completion",
+            "created": int(time.time()), "model": model,
+            "choices": [{"index": i, "finish_reason": "stop", "text": " ".join(self._text(prompt, tokens))}
+                        for i, prompt in enumerate(prompts)],
+            "usage": usage
+        })
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving on the running event loop; returns the OpenAI-style base URL"""
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self._chat)
+        app.router.add_post("/v1/completions", self._completions)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}/v1"
+        logging.info(f"Stub provider listening on {self.base_url}")
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def model_config(self, model: str, **kwargs) -> ModelConfig:
+        """ModelConfig routing a stub model name through LiteLLM's OpenAI client to this server"""
+        parameters = {"api_base": self.base_url, **kwargs.pop("parameters", {})}
+        kwargs.setdefault("stream_usage", True)  # The stub reports usage like OpenAI does
+        return ModelConfig(model_name=f"openai/{model}", provider="stub", api_key="stub-key",
+                           parameters=parameters, **kwargs)
@@ -0,0 +1,111 @@
+from typing import Dict, Any, Tuple
+import logging
+
+try:
+    from prometheus_client import Counter, Histogram
+except ImportError:
+    Counter = Histogram = None
+
+# Process-wide Prometheus series (metric names may only be registered once)
+if Counter is not None:
+    LLM_REQUESTS = Counter(
+        "openmagus_llm_requests_total", "Routed model requests by outcome and cache tier",
+        ["task_type", "model", "cache", "outcome"]
+    )
+    LLM_TOKENS = Counter(
+        "openmagus_llm_tokens_total", "Tokens sent to and generated by providers",
+        ["task_type", "model", "kind"]
+    )
+    LLM_COST = Counter(
+        "openmagus_llm_cost_usd_total", "Estimated provider spend in USD",
+        ["task_type", "model"]
+    )
+    LLM_LATENCY = Histogram(
+        "openmagus_llm_request_seconds", "Routed request latency",
+        ["task_type", "model", "cache"],
+        buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+    )
+
+class UsageTracker:
+    """Token, latency, cache and cost accounting per task type and model.
+
+    Each request is tagged with where its response came from: "miss" (a
+    provider call), "exact", "semantic" or "coalesced". Provider calls
+    count their tokens and cost; the other sources count what they saved. Everything is mirrored to Prometheus when prometheus_client is
+    installed.
+    """
+
+    def __init__(self):
+        """Start with empty counters"""
+        self._usage: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def _entry(self, task_type: str, model_name: str) -> Dict[str, float]:
+        return self._usage.setdefault((task_type, model_name), {
+            "requests": 0, "errors": 0, "cache_hits": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "saved_tokens": 0,
+            "cost_usd": 0.0, "saved_cost_usd": 0.0, "latency_seconds": 0.0
+        })
+
+    def record(self, task_type: str, model_name: str, source: str, latency: float,
+               prompt_tokens: int, completion_tokens: int, cost: float):
+        """Account one successful request"""
+        entry = self._entry(task_type, model_name)
+        entry["requests"] += 1
+        entry["latency_seconds"] += latency
+        if source == "miss":
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["cost_usd"] += cost
+        else:
+            entry["cache_hits"] += 1
+            entry["saved_tokens"] += prompt_tokens + completion_tokens
+            entry["saved_cost_usd"] += cost
+
+        if Counter is not None:
+            LLM_REQUESTS.labels(task_type, model_name, source, "success").inc()
+            LLM_LATENCY.labels(task_type, model_name, source).observe(latency)
+            if source == "miss":
+                LLM_TOKENS.labels(task_type, model_name, "prompt").inc(prompt_tokens)
+                LLM_TOKENS.labels(task_type, model_name, "completion").inc(completion_tokens)
+                LLM_COST.labels(task_type, model_name).inc(cost)
+
+    def record_error(self, task_type: str, model_name: str, latency: float):
+        """Account one failed request"""
+        entry = self._entry(task_type, model_name)
+        entry["errors"] += 1
+        if Counter is not None:
+            LLM_REQUESTS.labels(task_type, model_name, "miss", "error").inc()
+            LLM_LATENCY.labels(task_type, model_name, "miss").observe(latency)
+
+    @staticmethod
+    def _summarize(entries) -> Dict[str, Any]:
+        totals: Dict[str, float] = {}
+        for entry in entries:
+            for field, value in entry.items():
+                totals[field] = totals.get(field, 0) + value
+        requests = totals.get("requests", 0)
+        latency = totals.pop("latency_seconds", 0.0)
+        totals["avg_latency_ms"] = 1000 * latency / requests if requests else 0.0
+        totals["cache_hit_rate"] = totals.get("cache_hits", 0) / requests if requests else 0.0
+        return totals
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Totals plus breakdowns by task type, by model and by task type/model pair"""
+        by_task: Dict[str, list] = {}
+        by_model: Dict[str, list] = {}
+        for (task_type, model_name), entry in self._usage.items():
+            by_task.setdefault(task_type, []).append(entry)
+            by_model.setdefault(model_name, []).append(entry)
+        return {
+            "totals": self._summarize(self._usage.values()),
+            "by_task_type": {task: self._summarize(entries) for task, entries in by_task.items()},
+            "by_model": {model: self._summarize(entries) for model, entries in by_model.items()},
+            "by_task_and_model": {
+                f"{task_type}/{model_name}": self._summarize([entry])
+                for (task_type, model_name), entry in self._usage.items()
+            }
+        }
+
+    def reset(self):
+        self._usage.clear()
+        logging.info("Reset model usage statistics")
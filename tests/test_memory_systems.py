@@ -1,15 +1,29 @@
 import os
+import json
 import pytest
+import pytest_asyncio
+import asyncio
 import uuid
 from datetime import datetime, timedelta
-from memory.episodic_memory import EpisodicMemory, Session
+from memory.episodic_memory import (
+    AsyncEpisodicMemory, RetentionPolicy, Session, get_shared_connection_pool, close_shared_connection_pools
+)
+from memory.embedded_episodic_memory import EmbeddedEpisodicMemory
 from memory.semantic_memory import SemanticMemory, KnowledgeEntry
+from memory.embedding_cache import CachedEmbeddingFunction
 from memory.procedural_memory import ProceduralMemory, Workflow, WorkflowStep
+from memory.write_behind import WriteBehindBuffer
+
+@pytest_asyncio.fixture(autouse=True)
+async def shared_pools():
+    # Shared pools are per event loop and each test runs on its own loop
+    yield
+    await close_shared_connection_pools()
 
 @pytest.mark.asyncio
 class TestEpisodicMemory:
     async def test_full_session_lifecycle(self):
-        memory = EpisodicMemory(
+        memory = AsyncEpisodicMemory(
             host=os.getenv("REDIS_HOST", "localhost"),
             port=int(os.getenv("REDIS_PORT", 6379))
         )
@@ -45,6 +59,370 @@ class TestEpisodicMemory:
         assert len(sessions) > 0
         assert any(s.session_id == session.session_id for s in sessions)
 
+    async def test_paginated_timerange_shares_pool(self):
+        memory = AsyncEpisodicMemory(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            fetch_chunk_size=2
+        )
+        other = AsyncEpisodicMemory(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379))
+        )
+        assert memory.pool is other.pool
+        
+        # Store sessions a minute apart
+        base = datetime.utcnow() - timedelta(minutes=10)
+        session_ids = []
+        for i in range(5):
+            session = Session(
+                session_id=str(uuid.uuid4()),
+                timestamp=(base + timedelta(minutes=i)).isoformat(),
+                context={"task_type": "pagination"},
+                actions=[],
+                outcome={},
+                metadata={}
+            )
+            assert await memory.store_session(session) is True
+            session_ids.append(session.session_id)
+        
+        # Newest-first page skips the latest session and spans fetch chunks
+        page = await memory.get_sessions_by_timerange(
+            start_time=(base - timedelta(seconds=1)).isoformat(),
+            end_time=(base + timedelta(minutes=4, seconds=1)).isoformat(),
+            offset=1,
+            limit=3,
+            newest_first=True
+        )
+        assert [s.session_id for s in page] == session_ids[3:0:-1]
+
+    async def test_chunked_fetch_and_page_boundaries(self):
+        # Dedicated DB so the pages only hold this test's sessions
+        memory = AsyncEpisodicMemory(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=15,
+            fetch_chunk_size=2
+        )
+        await memory.clear_all()
+
+        base = datetime.utcnow() - timedelta(minutes=10)
+        session_ids = [f"chunked-{i}" for i in range(5)]
+        for i, session_id in enumerate(session_ids):
+            await memory.store_session(Session(
+                session_id=session_id,
+                timestamp=(base + timedelta(minutes=i)).isoformat(),
+                context={},
+                actions=[],
+                outcome={},
+                metadata={}
+            ))
+
+        # One MGET per fetch_chunk_size IDs; missing sessions are skipped
+        mget_sizes = []
+        mget = memory.redis.mget
+        async def counting_mget(keys):
+            mget_sizes.append(len(keys))
+            return await mget(keys)
+        memory.redis.mget = counting_mget
+        sessions = await memory.retrieve_sessions(session_ids + ["missing"])
+        assert [s.session_id for s in sessions] == session_ids
+        assert mget_sizes == [2, 2, 2]
+
+        # Paging oldest first visits every session once and ends with a short, then empty, page
+        window = {"start_time": (base - timedelta(minutes=1)).isoformat(), "end_time": datetime.utcnow().isoformat()}
+        pages = [
+            [s.session_id for s in await memory.get_sessions_by_timerange(**window, offset=offset, limit=2)]
+            for offset in range(0, 8, 2)
+        ]
+        assert pages == [session_ids[0:2], session_ids[2:4], session_ids[4:5], []]
+        await memory.clear_all()
+
+    async def test_shared_pool_is_per_loop_and_size(self):
+        pool = get_shared_connection_pool(max_connections=10)
+        assert get_shared_connection_pool(max_connections=10) is pool
+        assert get_shared_connection_pool(max_connections=20) is not pool
+        
+        # Another event loop gets its own pool, since connections cannot cross loops
+        async def on_new_loop():
+            return get_shared_connection_pool(max_connections=10)
+        assert await asyncio.to_thread(asyncio.run, on_new_loop()) is not pool
+        assert get_shared_connection_pool(max_connections=10) is pool
+
+    async def test_legacy_json_records_remain_readable(self):
+        memory = AsyncEpisodicMemory(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379))
+        )
+        
+        # Write a record the way older releases did
+        session_id = str(uuid.uuid4())
+        legacy = {
+            "session_id": session_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            "context": {"task_type": "legacy"},
+            "actions": [],
+            "outcome": {},
+            "metadata": {}
+        }
+        await memory.redis.set(f"session:{session_id}", json.dumps(legacy))
+        
+        retrieved = await memory.retrieve_session(session_id)
+        assert retrieved is not None
+        assert retrieved.context == {"task_type": "legacy"}
+
+    async def test_query_sessions_by_secondary_indexes(self):
+        # Dedicated DB so the category index only holds this test's session
+        memory = AsyncEpisodicMemory(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=15
+        )
+        await memory.clear_all()
+        
+        # Free-text task types are indexed by category
+        task_type = "coding"
+        session_id = str(uuid.uuid4())
+        session = Session(
+            session_id=session_id,
+            timestamp=datetime.utcnow().isoformat(),
+            context={"task_type": f"Fix the login bug {uuid.uuid4()}"},
+            actions=[],
+            outcome={},
+            metadata={"status": "executing", "error": None}
+        )
+        assert await memory.store_session(session) is True
+        
+        # Re-storing with a new status moves the session between indexes
+        session.metadata = {"status": "failed", "error": "timeout"}
+        assert await memory.store_session(session) is True
+        
+        window = {
+            "start_time": (datetime.utcnow() - timedelta(hours=1)).isoformat(),
+            "end_time": datetime.utcnow().isoformat()
+        }
+        failed = await memory.query_sessions(**window, task_type=task_type, status="failed", has_error=True)
+        assert [s.session_id for s in failed] == [session_id]
+        assert await memory.query_sessions(**window, task_type=task_type, status="executing") == []
+        
+        assert await memory.delete_session(session_id) is True
+        assert await memory.query_sessions(**window, task_type=task_type) == []
+        assert await memory.redis.keys("idx:task_type:*") == []
+
+    async def test_iter_sessions_streams_in_batches(self):
+        memory = AsyncEpisodicMemory(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379))
+        )
+        
+        # Sessions sharing a timestamp must neither repeat nor be skipped across pages
+        timestamp = (datetime.utcnow() - timedelta(days=400)).isoformat()
+        session_ids = sorted(str(uuid.uuid4()) for _ in range(7))
+        for session_id in session_ids:
+            await memory.store_session(Session(
+                session_id=session_id,
+                timestamp=timestamp,
+                context={},
+                actions=[],
+                outcome={},
+                metadata={}
+            ))
+        
+        streamed = [s.session_id async for s in memory.iter_sessions(timestamp, timestamp, batch=3)]
+        assert streamed == session_ids
+        for session_id in session_ids:
+            await memory.delete_session(session_id)
+
+    async def test_session_event_stream(self):
+        memory = AsyncEpisodicMemory(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379))
+        )
+        
+        session_id = str(uuid.uuid4())
+        await memory.append_session_event(session_id, {"status": "planning", "plan": None})
+        await memory.append_session_event(session_id, {"status": "executing", "plan": {"steps": []}})
+        
+        # Latest state merges the deltas
+        state = await memory.get_session_state(session_id)
+        assert state["status"] == "executing"
+        assert state["plan"] == {"steps": []}
+        
+        # The stream keeps the full timeline
+        events = await memory.get_session_events(session_id)
+        assert [e["changes"]["status"] for e in events] == ["planning", "executing"]
+
+    async def test_retention_archives_expired_sessions(self, tmp_path):
+        # Use a dedicated DB so count-based trimming cannot touch other tests' data
+        memory = AsyncEpisodicMemory(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=15,
+            retention=RetentionPolicy(max_sessions=2, archive_dir=str(tmp_path))
+        )
+        await memory.clear_all()
+        
+        base = datetime.utcnow() - timedelta(minutes=10)
+        for i in range(4):
+            await memory.store_session(Session(
+                session_id=f"retention-{i}",
+                timestamp=(base + timedelta(minutes=i)).isoformat(),
+                context={},
+                actions=[],
+                outcome={},
+                metadata={}
+            ))
+        
+        assert await memory.enforce_retention() == 2
+        assert await memory.get_total_sessions() == 2
+        
+        # Archived sessions are still served by time range queries
+        sessions = await memory.get_sessions_by_timerange(
+            start_time=(base - timedelta(minutes=1)).isoformat(),
+            end_time=datetime.utcnow().isoformat()
+        )
+        assert [s.session_id for s in sessions] == [f"retention-{i}" for i in range(4)]
+        await memory.clear_all()
+
+    async def test_hourly_rollups(self):
+        # Dedicated DB so the rollup window only sees this test's sessions
+        memory = AsyncEpisodicMemory(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=15
+        )
+        await memory.clear_all()
+        
+        timestamp = datetime.utcnow().replace(minute=0, second=1).isoformat()
+        for i, error in enumerate([None, None, "timeout", "timeout"]):
+            await memory.store_session(Session(
+                session_id=f"rollup-{i}",
+                timestamp=timestamp,
+                context={"task_type": "research"},
+                actions=[],
+                outcome={},
+                metadata={"status": "failed" if error else "completed", "error": error}
+            ))
+        
+        assert await memory.update_rollups() == 1
+        rollups = await memory.get_rollups(timestamp, datetime.utcnow().isoformat(), task_type="research")
+        assert len(rollups) == 1
+        assert rollups[0]["count"] == 4
+        assert rollups[0]["success_rate"] == 0.5
+        assert rollups[0]["top_errors"] == [{"error": "timeout", "count": 2}]
+        assert rollups[0]["sample_session_ids"][0] == "rollup-2"
+        await memory.clear_all()
+
+@pytest.mark.asyncio
+class TestEmbeddedEpisodicMemory:
+    async def test_sqlite_backend_matches_redis_interface(self, tmp_path):
+        memory = EmbeddedEpisodicMemory(
+            path=str(tmp_path / "episodic.db"),
+            retention=RetentionPolicy(max_sessions=2, archive_dir=str(tmp_path / "archive"))
+        )
+        
+        base = datetime.utcnow() - timedelta(minutes=10)
+        for i in range(4):
+            assert await memory.store_session(Session(
+                session_id=f"embedded-{i}",
+                timestamp=(base + timedelta(minutes=i)).isoformat(),
+                context={"task_type": "research" if i % 2 else "coding"},
+                actions=[],
+                outcome={},
+                metadata={"status": "completed", "error": None}
+            ))
+        
+        start, end = (base - timedelta(minutes=1)).isoformat(), datetime.utcnow().isoformat()
+        research = await memory.query_sessions(start, end, task_type="research")
+        assert [s.session_id for s in research] == ["embedded-1", "embedded-3"]
+        
+        await memory.append_session_event("embedded-3", {"status": "executing"})
+        await memory.append_session_event("embedded-3", {"status": "completed"})
+        assert (await memory.get_session_state("embedded-3"))["status"] == "completed"
+        assert len(await memory.get_session_events("embedded-3")) == 2
+        
+        # Trimmed sessions land in the archive and stay queryable
+        assert await memory.enforce_retention() == 2
+        assert await memory.get_total_sessions() == 2
+        sessions = await memory.get_sessions_by_timerange(start, end, newest_first=True)
+        assert [s.session_id for s in sessions] == [f"embedded-{i}" for i in reversed(range(4))]
+        streamed = [s.session_id async for s in memory.iter_sessions(start, end, batch=1)]
+        assert streamed == [f"embedded-{i}" for i in range(4)]
+        await memory.close()
+
+    async def test_archive_read_only_for_pages_live_data_cannot_fill(self, tmp_path):
+        memory = EmbeddedEpisodicMemory(
+            path=str(tmp_path / "episodic.db"),
+            retention=RetentionPolicy(max_sessions=3, archive_dir=str(tmp_path / "archive"))
+        )
+        base = datetime.utcnow() - timedelta(minutes=10)
+        for i in range(6):
+            await memory.store_session(Session(
+                session_id=f"paged-{i}",
+                timestamp=(base + timedelta(minutes=i)).isoformat(),
+                context={"task_type": "research"},
+                actions=[],
+                outcome={},
+                metadata={}
+            ))
+        assert await memory.enforce_retention() == 3  # paged-0..2 archived, paged-3..5 live
+
+        scans = []
+        read_page = memory.archive.read_page
+        def counting_read_page(*args):
+            page, seen = read_page(*args)
+            scans.append(seen)
+            return page, seen
+        memory.archive.read_page = counting_read_page
+
+        async def page(**kwargs):
+            sessions = await memory.query_sessions(
+                (base - timedelta(minutes=1)).isoformat(), datetime.utcnow().isoformat(), **kwargs
+            )
+            return [int(s.session_id.split("-")[1]) for s in sessions]
+
+        # Live sessions fill the newest page, so the archive is not opened
+        assert await page(limit=3, newest_first=True) == [5, 4, 3]
+        assert scans == []
+        assert await page(offset=2, limit=3, newest_first=True, task_type="research") == [3, 2, 1]
+        # Oldest first, the scan stops as soon as the page is full
+        assert await page(offset=1, limit=1) == [1]
+        assert scans[-1] == 2
+        assert await page(offset=2, limit=3) == [2, 3, 4]
+        await memory.close()
+
+    async def test_retention_keeps_sessions_when_archiving_fails(self, tmp_path):
+        memory = EmbeddedEpisodicMemory(
+            path=str(tmp_path / "episodic.db"),
+            retention=RetentionPolicy(max_age_seconds=3600, archive_dir=str(tmp_path / "archive"))
+        )
+        assert memory.retention.key_ttl is None  # Nothing may expire without being archived
+
+        # Naive timestamps are UTC, so only the session two hours old is past the cutoff
+        now = datetime.utcnow()
+        for i, age in enumerate([timedelta(hours=2), timedelta(minutes=30)]):
+            await memory.store_session(Session(
+                session_id=f"aged-{i}",
+                timestamp=(now - age).isoformat(),
+                context={},
+                actions=[],
+                outcome={},
+                metadata={}
+            ))
+
+        def fail(records):
+            raise OSError("disk full")
+        memory.archive.append = fail
+        assert await memory.enforce_retention() == 0
+        assert await memory.get_total_sessions() == 2
+
+        del memory.archive.append
+        assert await memory.enforce_retention() == 1
+        assert await memory.get_total_sessions() == 1
+        archived = memory.archive.read_range((now - timedelta(hours=3)).isoformat(), now.isoformat())
+        assert [record["session_id"] for record in archived] == ["aged-0"]
+        await memory.close()
+
 @pytest.mark.asyncio
 class TestSemanticMemory:
     async def test_knowledge_storage_and_retrieval(self):
@@ -84,6 +462,77 @@ class TestSemanticMemory:
         assert len(results) > 0
         assert "Redis" in results[0]["content"]
 
+    async def test_streaming_ingest_in_parallel_batches(self):
+        embedded_batches = []
+        def embed(texts):
+            embedded_batches.append(len(texts))
+            return [[float(len(text)), 1.0] for text in texts]
+        memory = SemanticMemory(
+            persist_directory="/tmp/semantic_memory_test",
+            collection_name="ingest_test",
+            embedding_function=embed
+        )
+        memory.clear_all()
+        
+        def entries():
+            for i in range(1000):
+                yield KnowledgeEntry(content=f"document {i}", metadata={"n": i}, entry_id=f"doc-{i}")
+        
+        reports = []
+        stats = memory.ingest(entries(), batch_size=64, workers=4, progress=reports.append)
+        assert stats["processed"] == 1000
+        assert stats["failed"] == 0
+        assert stats["batches"] == 16
+        assert max(embedded_batches) == 64
+        assert [report["processed"] for report in reports] == sorted(report["processed"] for report in reports)
+        assert memory.get_collection_stats()["total_entries"] == 1000
+        
+        # Stable ids make re-ingesting an upsert
+        memory.ingest(entries(), batch_size=64, workers=4)
+        assert memory.get_collection_stats()["total_entries"] == 1000
+
+    async def test_embedding_cache_persists_across_instances(self, tmp_path):
+        embedded = []
+        def embed(texts):
+            embedded.extend(texts)
+            return [[float(len(text)), float(text.count("a")), 1.0] for text in texts]
+        
+        cache = CachedEmbeddingFunction(embed, "test-model", str(tmp_path), lru_size=2)
+        first = cache(["alpha", "beta", "gamma"])
+        assert cache(["beta", "gamma"]) == first[1:]
+        assert cache(["alpha"]) == first[:1]  # Fell out of the two-entry LRU; read from disk
+        assert embedded == ["alpha", "beta", "gamma"]
+        stats = cache.get_stats()
+        assert (stats["memory_hits"], stats["disk_hits"], stats["disk_entries"]) == (2, 1, 3)
+        
+        # A new instance serves from the memory-mapped file; other models are kept apart
+        reopened = CachedEmbeddingFunction(embed, "test-model", str(tmp_path))
+        assert reopened(["gamma", "alpha", "delta"])[:2] == [first[2], first[0]]
+        assert embedded == ["alpha", "beta", "gamma", "delta"]
+        other_model = CachedEmbeddingFunction(embed, "other-model", str(tmp_path))
+        other_model(["alpha"])
+        assert embedded[-1] == "alpha"
+
+    async def test_embedding_cache_instances_share_a_directory(self, tmp_path):
+        embedded = []
+        def embed(texts):
+            embedded.extend(texts)
+            return [[float(len(text)), float(sum(map(ord, text)) % 128)] for text in texts]
+
+        # Both open an empty directory, so neither index knows the other's rows
+        first = CachedEmbeddingFunction(embed, "test-model", str(tmp_path), lru_size=1)
+        second = CachedEmbeddingFunction(embed, "test-model", str(tmp_path), lru_size=1)
+        alpha = first(["alpha"])[0]
+        zz = second(["zz"])[0]
+        second(["beta"])  # Evicts "zz" from the one-entry LRU
+        assert second(["zz"])[0] == zz  # Read back from its own row, not "alpha"'s
+
+        # Rows written by one instance are found by the other without re-embedding
+        assert first(["zz", "beta"]) == [zz, second(["beta"])[0]]
+        assert second(["alpha"])[0] == alpha
+        assert embedded == ["alpha", "zz", "beta"]
+        assert first.get_stats()["disk_entries"] == second.get_stats()["disk_entries"] == 3
+
 @pytest.mark.asyncio
 class TestProceduralMemory:
     async def test_workflow_management(self):
@@ -128,3 +577,62 @@ class TestProceduralMemory:
             pattern=["read_file", "process_content"]
         )
         assert len(similar) > 0
+
+@pytest.mark.asyncio
+class TestWriteBehindBuffer:
+    async def test_coalescing_batching_and_backpressure(self):
+        buffer = WriteBehindBuffer(max_pending=3, batch_size=2, flush_interval=60)
+        batches = []
+        
+        async def sink(items):
+            batches.append(list(items))
+            return True
+        
+        buffer.register_sink("episodic", sink)
+        buffer.start()
+        
+        # A newer write for the same key replaces the pending one
+        await buffer.submit("episodic", "task-1", "v1")
+        await buffer.submit("episodic", "task-1", "v2")
+        assert buffer.stats["coalesced"] == 1
+        
+        # Reaching max_pending blocks until the flusher frees space
+        for i in range(4):
+            await asyncio.wait_for(buffer.submit("episodic", f"other-{i}", f"w{i}"), timeout=5)
+        
+        await buffer.close()
+        flushed = [item for batch in batches for item in batch]
+        assert sorted(flushed) == ["v2", "w0", "w1", "w2", "w3"]
+        assert all(len(batch) <= 2 for batch in batches)
+        assert buffer.pending_count == 0
+
+    async def test_failed_flushes_are_retried_then_raised(self):
+        dropped = []
+        buffer = WriteBehindBuffer(batch_size=10, flush_interval=60, max_retries=2, retry_backoff=0.01,
+                                   on_failure=lambda sink, items, error: dropped.extend(items))
+        calls = {"flaky": 0}
+        flushed = []
+        
+        async def flaky(items):
+            calls["flaky"] += 1
+            if calls["flaky"] <= 2:
+                raise ConnectionError("backend down")
+            flushed.extend(items)
+        
+        async def broken(items):
+            return False
+        
+        buffer.register_sink("flaky", flaky)
+        buffer.register_sink("broken", broken)
+        await buffer.submit("flaky", "a", 1)
+        await buffer.submit("broken", "b", 2)
+        
+        # Failed writes are requeued rather than lost, and retried on close
+        await buffer.flush()
+        assert buffer.pending_count == 2
+        with pytest.raises(RuntimeError):
+            await buffer.close()
+        assert flushed == [1]
+        assert dropped == [2]
+        assert buffer.stats["failed"] == 1
+        assert buffer.pending_count == 0
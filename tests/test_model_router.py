@@ -2,7 +2,12 @@ import os
 import pytest
 import asyncio
 from datetime import datetime
-from router.model_router import ModelRouter, ModelConfig, TaskConfig
+from types import SimpleNamespace
+from litellm import ModelResponse, ModelResponseStream
+from litellm.types.utils import StreamingChoices, Delta
+import router.model_router as model_router_module
+from router.model_router import ModelRouter, ModelConfig, TaskConfig, get_shared_router, close_shared_routers
+from router.load_test import run_load_test
 
 @pytest.mark.asyncio
 class TestModelRouter:
@@ -127,3 +132,437 @@ class TestModelRouter:
         responses = await asyncio.gather(*tasks)
         assert all(response is not None for response in responses)
         assert len(set(r.choices[0].message.content for r in responses)) == 3  # Should be unique responses
+
+    async def test_response_cache_ttl_and_eviction(self, monkeypatch):
+        router = ModelRouter(cache_size=2)
+        router.add_model(ModelConfig(model_name="cached-model", provider="test", api_key="test"))
+        router.add_task_config(TaskConfig(
+            task_type="cached",
+            required_capabilities=["test"],
+            priority_models=["cached-model"],
+            fallback_models=[],
+            cache_ttl=60
+        ))
+        
+        calls = []
+        async def fake_completion(prompt, model_name, parameters, **kwargs):
+            calls.append(prompt)
+            return ModelResponse(choices=[{"message": {"role": "assistant", "content": prompt}}])
+        monkeypatch.setattr(router, "_generate_completion", fake_completion)
+        
+        # Repeated awaits of a cached prompt return the stored response
+        first = await router.route_task("cached", "prompt a")
+        second = await router.route_task("cached", "prompt a")
+        assert second is first
+        assert calls == ["prompt a"]
+        
+        # The LRU holds two entries, so a third prompt evicts the oldest
+        await router.route_task("cached", "prompt b")
+        await router.route_task("cached", "prompt c")
+        await router.route_task("cached", "prompt a")
+        assert calls == ["prompt a", "prompt b", "prompt c", "prompt a"]
+        
+        stats = router.get_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 4
+        assert stats["evictions"] == 2
+
+    async def test_concurrent_identical_requests_share_one_call(self, monkeypatch):
+        router = ModelRouter()
+        router.add_model(ModelConfig(model_name="slow-model", provider="test", api_key="test"))
+        router.add_task_config(TaskConfig(
+            task_type="coalesced",
+            required_capabilities=["test"],
+            priority_models=["slow-model"],
+            fallback_models=[],
+            cache_ttl=0  # Coalescing must not depend on the cache
+        ))
+        
+        calls = []
+        async def fake_completion(prompt, model_name, parameters, **kwargs):
+            calls.append(prompt)
+            await asyncio.sleep(0.05)
+            return ModelResponse(choices=[{"message": {"role": "assistant", "content": prompt}}])
+        monkeypatch.setattr(router, "_generate_completion", fake_completion)
+        
+        responses = await asyncio.gather(*[router.route_task("coalesced", "same prompt") for _ in range(5)])
+        assert calls == ["same prompt"]
+        assert all(response is responses[0] for response in responses)
+        assert router.get_cache_stats()["coalesced"] == 4
+        assert router.get_cache_stats()["in_flight"] == 0
+        assert router._inflight_waiters == {}
+
+    async def test_rate_limiter_caps_concurrency_and_queues_fairly(self, monkeypatch):
+        router = ModelRouter()
+        router.add_model(ModelConfig(
+            model_name="limited-model", provider="test", api_key="test",
+            max_concurrency=1, requests_per_minute=600
+        ))
+        for task_type in ("bulk", "interactive"):
+            router.add_task_config(TaskConfig(
+                task_type=task_type,
+                required_capabilities=["test"],
+                priority_models=["limited-model"],
+                fallback_models=[],
+                cache_ttl=0
+            ))
+        
+        order, active, peak = [], 0, 0
+        async def fake_acompletion(**request):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            order.append(request["messages"][0]["content"])
+            await asyncio.sleep(0.01)
+            active -= 1
+            return ModelResponse(choices=[{"message": {"role": "assistant", "content": "ok"}}])
+        monkeypatch.setattr(model_router_module, "acompletion", fake_acompletion)
+        
+        await asyncio.gather(
+            *[router.route_task("bulk", f"bulk {i}") for i in range(4)],
+            router.route_task("interactive", "interactive 0")
+        )
+        assert peak == 1
+        # The interactive request is admitted after one bulk request, not behind all of them
+        assert order == ["bulk 0", "interactive 0", "bulk 1", "bulk 2", "bulk 3"]
+        
+        stats = router.get_rate_limit_stats()["limited-model"]
+        assert stats["admitted"] == 5
+        assert stats["queue_depth"] == 0
+        assert stats["in_flight"] == 0
+
+    async def test_hedged_request_beats_slow_primary(self, monkeypatch):
+        router = ModelRouter()
+        router.hedge_default_delay = 0.05
+        for model_name in ("slow-primary", "fast-backup"):
+            router.add_model(ModelConfig(model_name=model_name, provider="test", api_key="test"))
+        router.add_task_config(TaskConfig(
+            task_type="hedged",
+            required_capabilities=["test"],
+            priority_models=["slow-primary"],
+            fallback_models=["fast-backup"],
+            hedge_percentile=0.95
+        ))
+        
+        cancelled = []
+        async def fake_completion(prompt, model_name, parameters, **kwargs):
+            try:
+                await asyncio.sleep(5 if model_name == "slow-primary" else 0.01)
+            except asyncio.CancelledError:
+                cancelled.append(model_name)
+                raise
+            return ModelResponse(choices=[{"message": {"role": "assistant", "content": model_name}}])
+        monkeypatch.setattr(router, "_generate_completion", fake_completion)
+        
+        response = await asyncio.wait_for(router.route_task("hedged", "prompt"), timeout=1)
+        assert response.choices[0].message.content == "fast-backup"
+        await asyncio.sleep(0)
+        assert cancelled == ["slow-primary"]
+        assert router.hedged_requests == 1
+
+    async def test_circuit_breaker_skips_failing_model(self, monkeypatch):
+        router = ModelRouter()
+        for model_name in ("dead-model", "backup-model"):
+            router.add_model(ModelConfig(model_name=model_name, provider="test", api_key="test"))
+        router.add_task_config(TaskConfig(
+            task_type="breaker",
+            required_capabilities=["test"],
+            priority_models=["dead-model"],
+            fallback_models=["backup-model"],
+            cache_ttl=0
+        ))
+        
+        calls = []
+        async def fake_completion(prompt, model_name, parameters, **kwargs):
+            calls.append(model_name)
+            if model_name == "dead-model":
+                raise ConnectionError("provider down")
+            return ModelResponse(choices=[{"message": {"role": "assistant", "content": prompt}}])
+        monkeypatch.setattr(router, "_generate_completion", fake_completion)
+        
+        for i in range(8):
+            assert await router.route_task("breaker", f"prompt {i}") is not None
+        
+        # After five failures the dead model is skipped instead of retried
+        assert calls.count("dead-model") == 5
+        assert calls.count("backup-model") == 8
+        status = router.get_model_status("dead-model")
+        assert status["available"] is False
+        assert status["health"]["circuit"] == "open"
+        routing = router.get_task_routing_info("breaker")
+        assert routing["priority_models"][0]["circuit"] == "open"
+        assert routing["fallback_models"][0]["available"] is True
+
+    async def test_streaming_falls_back_before_first_token_and_caches(self, monkeypatch):
+        router = ModelRouter()
+        router.add_model(ModelConfig(model_name="broken-stream", provider="test", api_key="test"))
+        router.add_model(ModelConfig(model_name="good-stream", provider="test", api_key="test",
+                                     tokens_per_minute=100000))
+        router.add_task_config(TaskConfig(
+            task_type="streamed",
+            required_capabilities=["test"],
+            priority_models=["broken-stream"],
+            fallback_models=["good-stream"]
+        ))
+        
+        calls = []
+        requests = []
+        async def fake_acompletion(model, stream=False, **request):
+            calls.append(model)
+            requests.append(request)
+            if model == "broken-stream":
+                raise ConnectionError("provider down")
+            async def chunks():
+                for text in ("Hel", "lo"):
+                    yield ModelResponseStream(choices=[
+                        StreamingChoices(index=0, delta=Delta(role="assistant", content=text))
+                    ])
+            return chunks()
+        monkeypatch.setattr(model_router_module, "acompletion", fake_acompletion)
+        
+        deltas = [delta async for delta in router.route_task_stream("streamed", "greet")]
+        assert deltas == ["Hel", "lo"]
+        assert calls == ["broken-stream", "good-stream"]
+        assert router.get_model_status("good-stream")["health"]["first_token_p50"] is not None
+        # stream_options is only sent to models flagged as accepting it; without a usage
+        # chunk the 2000-token completion reservation is settled against the streamed text
+        assert all("stream_options" not in request for request in requests)
+        assert router.get_rate_limit_stats()["good-stream"]["tokens_available"] > 100000 - 100
+        
+        # The assembled response is cached and replayed without a provider call
+        assert [delta async for delta in router.route_task_stream("streamed", "greet")] == ["Hello"]
+        assert calls == ["broken-stream", "good-stream", "broken-stream"]
+
+    async def test_micro_batching_groups_concurrent_prompts(self, monkeypatch):
+        router = ModelRouter()
+        router.add_model(ModelConfig(
+            model_name="batch-model", provider="vllm", api_key="test",
+            batch_size=4, batch_wait_ms=20
+        ))
+        router.add_task_config(TaskConfig(
+            task_type="classify",
+            required_capabilities=["test"],
+            priority_models=["batch-model"],
+            fallback_models=[],
+            cache_ttl=0
+        ))
+        
+        batches = []
+        async def fake_text_completion(prompt, **request):
+            batches.append(list(prompt))
+            # Answer out of order; choices are matched back by index
+            choices = [SimpleNamespace(index=i, text=p.upper(), finish_reason="stop") for i, p in enumerate(prompt)]
+            return SimpleNamespace(model="batch-model", usage=None, choices=list(reversed(choices)))
+        monkeypatch.setattr(model_router_module.litellm, "atext_completion", fake_text_completion)
+        
+        prompts = [f"label {i}" for i in range(5)]
+        responses = await asyncio.gather(*[router.route_task("classify", p) for p in prompts])
+        
+        assert batches == [prompts[:4], prompts[4:]]
+        assert [r.choices[0].message.content for r in responses] == [p.upper() for p in prompts]
+        assert router.get_batch_stats()["batch-model"]["batches"] == 2
+
+    async def test_shared_router_is_reused_across_agents(self, monkeypatch):
+        router = get_shared_router()
+        assert get_shared_router() is router
+        
+        # Re-registering an identical model (as each agent does) keeps its live state
+        model = ModelConfig(model_name="shared-model", provider="test", api_key="test")
+        router.add_model(model)
+        router.health["shared-model"].record_failure()
+        router.add_model(ModelConfig(model_name="shared-model", provider="test", api_key="test"))
+        assert router.health["shared-model"].consecutive_failures == 1
+        
+        # Sampling settings live on the task, so agents sharing a model keep their own
+        router.add_task_config(TaskConfig(
+            task_type="focused",
+            required_capabilities=["test"],
+            priority_models=["shared-model"],
+            fallback_models=[],
+            parameters={"temperature": 0.3}
+        ))
+        seen = []
+        async def fake_completion(prompt, model_name, parameters, **kwargs):
+            seen.append(parameters)
+            return ModelResponse(choices=[{"message": {"role": "assistant", "content": "ok"}}])
+        monkeypatch.setattr(router, "_generate_completion", fake_completion)
+        await router.route_task("focused", "prompt", {"max_tokens": 10})
+        assert seen == [{"temperature": 0.3, "max_tokens": 10}]
+        
+        await close_shared_routers()
+        assert get_shared_router() is not router
+        await close_shared_routers()
+
+    async def test_semantic_cache_matches_near_duplicate_prompts(self, monkeypatch):
+        router = ModelRouter()
+        vocabulary = ["plan", "trip", "paris", "tokyo", "budget"]
+        router.enable_semantic_cache(
+            embed=lambda texts: [[float(text.lower().split().count(word)) for word in vocabulary] for text in texts]
+        )
+        router.add_model(ModelConfig(model_name="semantic-model", provider="test", api_key="test"))
+        router.add_task_config(TaskConfig(
+            task_type="task_planning",
+            required_capabilities=["test"],
+            priority_models=["semantic-model"],
+            fallback_models=[],
+            semantic_cache_threshold=0.95
+        ))
+        
+        calls = []
+        async def fake_completion(prompt, model_name, parameters, **kwargs):
+            calls.append(prompt)
+            return ModelResponse(choices=[{"message": {"role": "assistant", "content": prompt}}])
+        monkeypatch.setattr(router, "_generate_completion", fake_completion)
+        
+        first = await router.route_task("task_planning", "Plan a trip to Paris")
+        # Differs only in whitespace and case, so the exact-hash cache misses but the semantic tier hits
+        similar = await router.route_task("task_planning", "plan  a trip   to paris ")
+        different = await router.route_task("task_planning", "Plan a trip to Tokyo")
+        
+        assert calls == ["Plan a trip to Paris", "Plan a trip to Tokyo"]
+        assert similar.choices[0].message.content == first.choices[0].message.content
+        assert similar._hidden_params["semantic_cache_key"] == router._get_cache_key(
+            "Plan a trip to Paris", "semantic-model", {}
+        )
+        assert different.choices[0].message.content == "Plan a trip to Tokyo"
+        assert router.get_cache_stats()["semantic"]["hits"] == 1
+
+    async def test_usage_stats_by_task_and_model(self, monkeypatch):
+        router = ModelRouter()
+        router.add_model(ModelConfig(model_name="priced-model", provider="test", api_key="test",
+                                     input_cost_per_1k=1.0, output_cost_per_1k=2.0))
+        router.add_task_config(TaskConfig(
+            task_type="task_planning",
+            required_capabilities=["test"],
+            priority_models=["priced-model"],
+            fallback_models=[]
+        ))
+        
+        async def fake_completion(prompt, model_name, parameters, **kwargs):
+            return ModelResponse(
+                choices=[{"message": {"role": "assistant", "content": "ok"}}],
+                usage={"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}
+            )
+        monkeypatch.setattr(router, "_generate_completion", fake_completion)
+        
+        await router.route_task("task_planning", "Plan a trip")
+        await router.route_task("task_planning", "Plan a trip")  # Served from the cache
+        
+        stats = router.get_usage_stats()
+        usage = stats["by_task_and_model"]["task_planning/priced-model"]
+        assert usage["requests"] == 2
+        assert usage["cache_hits"] == 1
+        assert usage["prompt_tokens"] == 100
+        assert usage["completion_tokens"] == 50
+        assert usage["saved_tokens"] == 150
+        assert usage["cost_usd"] == pytest.approx(0.2)
+        assert stats["by_model"]["priced-model"]["cache_hit_rate"] == 0.5
+        assert stats["totals"]["saved_cost_usd"] == pytest.approx(0.2)
+
+    async def test_context_prompt_is_compacted_and_fits_budget(self, monkeypatch):
+        router = ModelRouter()
+        router.add_model(ModelConfig(model_name="budget-model", provider="test", api_key="test"))
+        router.add_task_config(TaskConfig(
+            task_type="task_planning",
+            required_capabilities=["test"],
+            priority_models=["budget-model"],
+            fallback_models=[],
+            prompt_token_budget=200,
+            context_priority=["task", "workflow", "history"]
+        ))
+        monkeypatch.setattr(router.prompt_budgeter, "count_tokens", staticmethod(lambda model, text: len(text) // 4))
+        
+        prompts = []
+        async def fake_completion(prompt, model_name, parameters, **kwargs):
+            prompts.append(prompt)
+            return ModelResponse(choices=[{"message": {"role": "assistant", "content": "ok"}}])
+        monkeypatch.setattr(router, "_generate_completion", fake_completion)
+        
+        workflow = {"steps": ["fetch data", "clean data", "train model"], "owner": "planner"}
+        context = {
+            "task": "Train a churn model",
+            "workflow": workflow,
+            "history": [{"session": i, "workflow": workflow, "notes": "x" * 100} for i in range(20)]
+        }
+        await router.route_task("task_planning", "Plan:", context=context)
+        
+        prompt = prompts[0]
+        assert prompt.startswith("Plan:\n{")
+        assert len(prompt) // 4 <= 200
+        assert '"task":"Train a churn model"' in prompt
+        assert '"workflow":{"steps":["fetch data","clean data","train model"],"owner":"planner"}' in prompt
+        assert '{"$ref":"workflow"}' in prompt  # Repeats of the workflow are references
+        assert "more items omitted" in prompt  # Lowest-priority history was truncated
+        assert router.get_prompt_stats()["trimmed"] == 1
+        assert router.get_prompt_stats()["reduction"] > 0.5
+
+    async def test_load_test_against_stub_provider(self):
+        pytest.importorskip("aiohttp")
+        from router.stub_provider import StubProvider, StubProfile
+        provider = StubProvider({
+            "stub-slow": StubProfile(latency_ms=50, latency_sigma=0, completion_tokens=8, tokens_per_second=400)
+        }, seed=7)
+        await provider.start()
+        router = ModelRouter()
+        try:
+            router.add_model(provider.model_config("stub-slow"))
+            router.add_task_config(TaskConfig(
+                task_type="load_test",
+                required_capabilities=[],
+                priority_models=["openai/stub-slow"],
+                fallback_models=[]
+            ))
+            report = await run_load_test(router, "load_test", qps=40, duration=1, unique_prompts=5, seed=7)
+            provider_calls = provider.stats["stub-slow"]["requests"]
+            
+            # Streamed calls record the provider-reported usage too
+            completion_before = router.get_usage_stats()["totals"]["completion_tokens"]
+            assert [delta async for delta in router.route_task_stream("load_test", "stream this")]
+            assert router.get_usage_stats()["totals"]["completion_tokens"] == completion_before + 8
+        finally:
+            await router.shutdown()
+            await provider.stop()
+        
+        assert report["failed"] == 0
+        assert report["succeeded"] == report["requests"] > 10
+        assert report["latency_p50"] <= report["latency_p95"] <= report["latency_p99"]
+        # Five distinct prompts: the stub sees at most five calls, the rest hit the cache or coalesce
+        assert provider_calls <= 5
+        assert report["usage"]["cache_hits"] == report["requests"] - provider_calls
+
+    async def test_adaptive_routing_prefers_cheapest_model_within_slo(self, monkeypatch):
+        router = ModelRouter()
+        router.add_model(ModelConfig(model_name="premium", provider="test", api_key="test",
+                                     input_cost_per_1k=0.03, output_cost_per_1k=0.06))
+        router.add_model(ModelConfig(model_name="budget", provider="test", api_key="test",
+                                     input_cost_per_1k=0.001, output_cost_per_1k=0.002))
+        router.add_model(ModelConfig(model_name="cheapest", provider="test", api_key="test",
+                                     input_cost_per_1k=0.0, output_cost_per_1k=0.0,
+                                     capabilities=["chat"]))
+        router.add_task_config(TaskConfig(
+            task_type="knowledge_synthesis",
+            required_capabilities=["reasoning"],
+            priority_models=["premium"],
+            fallback_models=["budget", "cheapest"],
+            cache_ttl=0,
+            adaptive_routing=True,
+            latency_slo=1.0,
+            exploration_rate=0.0
+        ))
+        
+        calls = []
+        async def fake_completion(prompt, model_name, parameters, **kwargs):
+            calls.append(model_name)
+            return ModelResponse(choices=[{"message": {"role": "assistant", "content": model_name}}])
+        monkeypatch.setattr(router, "_generate_completion", fake_completion)
+        
+        # "cheapest" lacks the reasoning capability, so the cheaper capable model wins
+        await router.route_task("knowledge_synthesis", "q1")
+        assert calls == ["budget"]
+        
+        # Once "budget" is observed breaking the latency SLO, the premium model takes over
+        for _ in range(router.selector.min_samples):
+            router.health["budget"].record_success(5.0)
+        await router.route_task("knowledge_synthesis", "q2")
+        assert calls == ["budget", "premium"]
+        assert router.get_selection_stats()["selections"]["knowledge_synthesis"] == {"budget": 1, "premium": 1}